@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ConcurrencyLimitMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,14 +85,51 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql_pool',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER' : os.environ.get('DB_USER'),
-        'PASSWORD' : os.environ.get('DB_PASS')
+        'PASSWORD' : os.environ.get('DB_PASS'),
+        # Connections are returned to the pool at the end of each request.
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 1800)),
+            'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'CHECK_INTERVAL': int(os.environ.get('DB_POOL_CHECK_INTERVAL', 10)),
+        },
     }
 }
 
+# Comma separated hosts of read replicas, added as replica1, replica2, ...
+# Tests mirror them onto the default database.
+REPLICA_DATABASES = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+# Tests read from the primary, since a test mirror only sees committed
+# data. Tests of the routing enable it against replica1, a mirror of the
+# primary, so their reads really leave the primary connection.
+if sys.argv[1:2] == ['test']:
+    DATABASES.setdefault('replica1', {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    })
+    REPLICA_DATABASES = []
+
+DATABASE_ROUTERS = ['core.db.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -146,4 +186,144 @@ REST_FRAMEWORK = {
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST' : True,
-}
\ No newline at end of file
+    'VERSION': '1.0.0',
+}
+
+# Where `manage.py build_schema` writes the prebuilt OpenAPI schema.
+SCHEMA_ARTIFACT_DIR = os.environ.get('SCHEMA_ARTIFACT_DIR', '/vol/web/schema')
+
+# Build the schema artifact belongs to, such as the commit SHA. Without
+# one, artifacts are keyed on a hash of the application code, so a deploy
+# never serves the schema of an older build.
+SCHEMA_BUILD_ID = os.environ.get('SCHEMA_BUILD_ID', '')
+
+# Seconds that facet counts for a recipe filter stay cached. Entries are
+# also invalidated whenever the owner's recipes, tags or ingredients change.
+RECIPE_FACETS_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_FACETS_CACHE_TIMEOUT', 300)
+)
+
+# Similar recipe lookups scan at most this many through-table rows per
+# relation, rarest tags and ingredients first, and return at most
+# SIMILAR_RECIPES_MAX_LIMIT. See `manage.py benchmark_similar`.
+SIMILAR_RECIPES_POSTING_BUDGET = 2000
+SIMILAR_RECIPES_MAX_LIMIT = 50
+
+# Most recipe IDs accepted by one batch retrieve request.
+RECIPE_BATCH_MAX_IDS = 100
+
+# Counts above this many rows are estimated from planner statistics on
+# PostgreSQL instead of running an exact COUNT(*). Other backends count
+# once and cache the total for ESTIMATED_COUNT_CACHE_TIMEOUT seconds.
+ESTIMATED_COUNT_THRESHOLD = 10000
+ESTIMATED_COUNT_CACHE_TIMEOUT = int(
+    os.environ.get('ESTIMATED_COUNT_CACHE_TIMEOUT', 300)
+)
+
+# Page sizes for recipe, tag and ingredient lists requested with ?page=.
+RECIPE_PAGE_SIZE = 50
+RECIPE_MAX_PAGE_SIZE = 500
+
+# Change feed entries returned per sync request by default, and at most.
+SYNC_DEFAULT_LIMIT = 200
+SYNC_MAX_LIMIT = 1000
+
+# Account and recipe purges delete this many rows per transaction.
+# Account purges run as background jobs at PURGE_JOB_PRIORITY.
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 1000))
+PURGE_JOB_PRIORITY = -10
+
+# Background jobs (core.jobs). Failed jobs are retried with exponential
+# backoff between JOB_RETRY_BASE_DELAY and JOB_RETRY_MAX_DELAY seconds.
+# Running jobs locked longer than JOB_LOCK_TIMEOUT are requeued; a running
+# job renews its lock every JOB_HEARTBEAT_INTERVAL seconds.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_DELAY = 5
+JOB_RETRY_MAX_DELAY = 3600
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+JOB_HEARTBEAT_INTERVAL = JOB_LOCK_TIMEOUT / 4
+JOB_POLL_INTERVAL = 1.0
+
+# Adaptive concurrency limit (core.concurrency). The process starts at
+# `initial` concurrent requests and adapts between `min` and `max`,
+# backing off while requests take longer than their class's
+# `target_latency` seconds. A class may fill at most `share` of the
+# limit, so heavy routes are shed first. Routes not listed in
+# CONCURRENCY_ROUTES are reads or writes by HTTP method.
+CONCURRENCY_LIMIT_ENABLED = (
+    os.environ.get('CONCURRENCY_LIMIT_ENABLED', 'true').lower() == 'true'
+)
+CONCURRENCY_LIMIT = {
+    'initial': int(os.environ.get('CONCURRENCY_LIMIT_INITIAL', 32)),
+    'minimum': 4,
+    'maximum': int(os.environ.get('CONCURRENCY_LIMIT_MAX', 256)),
+}
+CONCURRENCY_RETRY_AFTER = 1
+CONCURRENCY_CLASSES = {
+    'read': {'target_latency': 0.1, 'share': 1.0},
+    'list': {'target_latency': 0.5, 'share': 0.75},
+    'write': {'target_latency': 0.3, 'share': 0.75},
+    'heavy': {'target_latency': 2.0, 'share': 0.25},
+}
+CONCURRENCY_ROUTES = {
+    'GET recipe:recipe-list': 'list',
+    'GET recipe:tag-list': 'list',
+    'GET recipe:ingredient-list': 'list',
+    'recipe:recipe-pantry': 'list',
+    'recipe:recipe-similar': 'list',
+    'recipe:recipe-upload-image': 'heavy',
+    'recipe:tag-bulk-delete': 'heavy',
+    'recipe:tag-bulk-rename': 'heavy',
+    'recipe:tag-merge': 'heavy',
+    'recipe:ingredient-bulk-delete': 'heavy',
+    'recipe:ingredient-bulk-rename': 'heavy',
+    'recipe:ingredient-merge': 'heavy',
+    'api-schema': 'heavy',
+}
+CONCURRENCY_EXEMPT = ('core:live', 'core:ready', 'metrics')
+
+# Identical concurrent list requests share one response (core.singleflight).
+# Waiters give up after SINGLEFLIGHT_TIMEOUT seconds and run on their own.
+SINGLEFLIGHT_ENABLED = (
+    os.environ.get('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+)
+SINGLEFLIGHT_TIMEOUT = 10
+
+# Push of change notifications to event streams served by app/asgi.py.
+# The local backend only reaches streams in the writing process; use
+# core.events.PostgresBackend when writes and streams run in different
+# processes.
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'core.events.LocalBackend')
+EVENTS_CHANNEL = 'recipe_changes'
+EVENTS_PATH = '/api/events/'
+# Notifications queued per stream before a slow client is told to resync.
+EVENTS_QUEUE_SIZE = 64
+# Writes touching more objects are announced as a resync.
+EVENTS_MAX_CHANGES = 50
+EVENTS_HEARTBEAT = 15
+EVENTS_MAX_CONNECTIONS = int(os.environ.get('EVENTS_MAX_CONNECTIONS', 10000))
+EVENTS_RETRY_AFTER = 5
+
+# Number of per-user pantry bitset indexes kept in each process.
+PANTRY_INDEX_CACHE_SIZE = 128
+
+TEST_RUNNER = 'core.testing.QueryBudgetRunner'
+# API tests in these modules are held to per-endpoint query budgets.
+QUERY_BUDGET_MODULES = ['recipe.tests', 'user.tests']
+# Keys are URL names, optionally prefixed with the HTTP method.
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+# Writes also spend about five queries recording the change feed.
+QUERY_BUDGETS = {
+    'POST recipe:recipe-list': 25,
+    'PUT recipe:recipe-detail': 20,
+    'PATCH recipe:recipe-detail': 20,
+    'DELETE recipe:recipe-detail': 20,
+    'POST recipe:tag-merge': 20,
+    'POST recipe:ingredient-merge': 20,
+    'POST recipe:tag-bulk-delete': 15,
+    'POST recipe:ingredient-bulk-delete': 15,
+    'POST recipe:tag-bulk-rename': 15,
+    'POST recipe:ingredient-bulk-rename': 15,
+}
+QUERY_BUDGET_REPORT = os.environ.get('QUERY_BUDGET_REPORT')
@@ -2,11 +2,15 @@
 Django admin customization.
 '''
 
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.utils import model_ngettext
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.template.response import TemplateResponse
 from django.utils.translation import gettext_lazy as _
 
-from core import models
+from core import changes, counters, models, pagination, purge
+from core.pagination import EstimatedCountPaginator
 
 class UserAdmin(BaseUserAdmin):
     '''Define the admin pages for users'''
@@ -32,7 +36,119 @@ class UserAdmin(BaseUserAdmin):
                     'is_staff', 'is_active', 'is_superuser'),
     }),
 
+
+class ScalableAdmin(admin.ModelAdmin):
+    '''Admin that avoids full counts, scans and per-row queries.
+
+    Search uses only indexed lookups (see `search_lookups`), and deletes
+    run as batched set-based purges, confirmed on a page that shows only
+    how many objects go.
+    '''
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['user']
+    list_select_related = ['user']
+    ordering = ['-id']
+    search_fields = ['id']
+    actions = ['purge_selected']
+    purge_selected_confirmation_template = (
+        'admin/core/purge_selected_confirmation.html'
+    )
+
+    def search_lookups(self, term):
+        '''Return filter kwargs for `term` that hit an index.'''
+        if term.isdigit():
+            return {'id': int(term)}
+        if '@' in term:
+            return {'user__email': term}
+
+        return None
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        lookups = self.search_lookups(term)
+        if lookups is None:
+            return queryset.none(), False
+
+        return queryset.filter(**lookups), False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action loads every object and its relations.
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(
+        description=_('Delete selected %(verbose_name_plural)s'),
+        permissions=['delete'],
+    )
+    def purge_selected(self, request, queryset):
+        if request.POST.get('post') == 'yes':
+            purge.purge_queryset(queryset)
+            self.message_user(
+                request, _('Deleted the selected objects.'), messages.SUCCESS,
+            )
+            return None
+
+        # Unlike the stock action, list no objects: only count them.
+        count, count_is_estimate = pagination.count_rows(queryset)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': _('Are you sure?'),
+            'opts': self.opts,
+            'objects_name': model_ngettext(self.opts, count),
+            'count': count,
+            'count_is_estimate': count_is_estimate,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across') == '1',
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'media': self.media,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(
+            request, self.purge_selected_confirmation_template, context,
+        )
+
+
+class RecipeAdmin(ScalableAdmin):
+    '''Define the admin pages for recipes.'''
+    list_display = ['id', 'title', 'user', 'time_minutes', 'price']
+    raw_id_fields = ['user', 'tags', 'ingredients']
+
+    def search_lookups(self, term):
+        return super().search_lookups(term) or {'title__startswith': term}
+
+
+class NamedObjectAdmin(ScalableAdmin):
+    '''Define the admin pages for tags and ingredients.'''
+    list_display = ['id', 'name', 'user', 'recipe_count']
+    readonly_fields = ['recipe_count']
+    actions = ['purge_selected', 'repair_recipe_counts']
+
+    def search_lookups(self, term):
+        return super().search_lookups(term) or {
+            'normalized_name__startswith': models.normalize_name(term),
+        }
+
+    def delete_model(self, request, obj):
+        # The cascade drops the recipe links without an m2m signal.
+        changes.record_linked_recipes(self.model, [obj.pk])
+        super().delete_model(request, obj)
+
+    @admin.action(
+        description=_('Recompute recipe counts'), permissions=['change'],
+    )
+    def repair_recipe_counts(self, request, queryset):
+        drift = counters.repair_counts(self.model, queryset)
+        self.message_user(
+            request, _('Corrected %d counts.') % len(drift), messages.SUCCESS,
+        )
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
\ No newline at end of file
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, NamedObjectAdmin)
+admin.site.register(models.Ingredient, NamedObjectAdmin)
@@ -0,0 +1,453 @@
+'''
+End-to-end API benchmarks.
+
+Every route under api/recipe/ and api/user/ is driven in-process through
+Django's test client by a pool of threads, each with its own database
+connection. Throughput, latency percentiles and SQL queries per request
+are recorded per scenario and can be compared against a stored baseline.
+
+Runs seed and write to the configured database and MEDIA_ROOT, so point
+them at a disposable environment. `cleanup` removes the benchmark users
+and everything they own, uploaded images included.
+'''
+import io
+import itertools
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Q
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import purge, seeding
+from core.models import Recipe, Tag, Ingredient
+
+
+# users, recipes per user
+SCALES = {
+    '1k': (10, 100),
+    '100k': (100, 1000),
+    '1m': (1000, 1000),
+}
+TAGS_PER_USER = 30
+INGREDIENTS_PER_USER = 150
+# Seconds a burst waits for all of its requests to line up.
+BARRIER_TIMEOUT = 60
+
+
+def bench_prefix(scale):
+    return f'bench-{scale}'
+
+
+def seed(scale, stdout=None):
+    '''Create the dataset for `scale` unless it already exists.
+
+    Returns the benchmark user, which owns a full share of recipes.
+    '''
+    users, recipes_per_user = SCALES[scale]
+    User = get_user_model()
+    email = f'{bench_prefix(scale)}-0@example.com'
+    existing = User.objects.filter(email=email).first()
+    if existing is not None:
+        return existing
+
+    seeding.seed(
+        users, recipes_per_user,
+        tags_per_user=TAGS_PER_USER,
+        ingredients_per_user=INGREDIENTS_PER_USER,
+        prefix=bench_prefix(scale),
+        password='benchpass',
+        stdout=stdout,
+    )
+    return User.objects.get(email=email)
+
+
+def target_description():
+    '''Describe where a run writes, for confirmation prompts.'''
+    database = settings.DATABASES[DEFAULT_DB_ALIAS]
+    host = database.get('HOST') or 'localhost'
+    return (
+        f"database \"{database['NAME']}\" on {host} "
+        f'and MEDIA_ROOT {settings.MEDIA_ROOT}'
+    )
+
+
+def cleanup(scale):
+    '''Purge the users seeded or created by benchmarks of `scale`.'''
+    users = get_user_model().objects.filter(
+        Q(email__startswith=f'{bench_prefix(scale)}-')
+        | Q(email__startswith='bench-new-')
+    )
+    for user_id in users.values_list('id', flat=True):
+        purge.purge_user(user_id)
+
+
+def _image_file():
+    image_file = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+    image_file.name = 'bench.jpg'
+    image_file.seek(0)
+    return image_file
+
+
+class Scenario:
+    '''One benchmarked request shape.'''
+
+    def __init__(self, name, method, url, data=None, format=None,
+                 setup=None, authenticated=True):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.format = format
+        self.setup = setup
+        self.authenticated = authenticated
+
+    def request(self, client, step):
+        url = self.url(step) if callable(self.url) else self.url
+        data = self.data(step) if callable(self.data) else self.data
+        return getattr(client, self.method)(url, data, format=self.format)
+
+
+def build_scenarios(user):
+    '''Return the scenarios covering every api/recipe and api/user route.'''
+    recipe = Recipe.objects.filter(user=user).order_by('id').first()
+    tags = list(Tag.objects.filter(user=user).order_by('id')[:3])
+    ingredients = list(
+        Ingredient.objects.filter(user=user).order_by('id')[:8]
+    )
+    tag_ids = ','.join(str(tag.id) for tag in tags[:2])
+    recipe_ids = Recipe.objects.filter(user=user).order_by('id').values_list(
+        'id', flat=True
+    )
+    batch_ids = ','.join(str(recipe_id) for recipe_id in recipe_ids[:30])
+    counter = itertools.count()
+
+    def new_recipe():
+        return Recipe.objects.create(
+            user=user, title='Disposable', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def new_tag():
+        return Tag.objects.create(user=user, name=f'bench-{next(counter)}')
+
+    def new_ingredient():
+        return Ingredient.objects.create(
+            user=user, name=f'bench-{next(counter)}'
+        )
+
+    def recipe_payload(step):
+        return {
+            'title': f'Bench {step}', 'time_minutes': 10, 'price': '4.50',
+            'tags': [{'name': tag.name} for tag in tags],
+            'ingredients': [{'name': i.name} for i in ingredients[:4]],
+        }
+
+    recipe_url = reverse('recipe:recipe-list')
+    detail = reverse('recipe:recipe-detail', args=[recipe.id])
+
+    return [
+        Scenario('recipe-list', 'get', recipe_url),
+        Scenario('recipe-list-filtered', 'get', recipe_url,
+                 {'tags': tag_ids}),
+        Scenario('recipe-list-facets', 'get', recipe_url,
+                 {'tags': tag_ids, 'facets': 1}),
+        Scenario('recipe-list-sparse', 'get', recipe_url,
+                 {'fields': 'id,title'}),
+        Scenario('recipe-list-range', 'get', recipe_url,
+                 {'max_time': 30, 'max_price': '10', 'ordering': 'price'}),
+        Scenario('recipe-list-page', 'get', recipe_url,
+                 {'page': 1, 'page_size': 20}),
+        Scenario('recipe-detail', 'get', detail),
+        Scenario('recipe-batch', 'get', reverse('recipe:recipe-batch'),
+                 {'ids': batch_ids}),
+        Scenario('recipe-create', 'post', recipe_url, recipe_payload,
+                 format='json'),
+        Scenario('recipe-update', 'patch', detail,
+                 {'title': 'Benchmarked'}, format='json'),
+        Scenario('recipe-delete', 'delete',
+                 lambda step: reverse('recipe:recipe-detail',
+                                      args=[step['recipe'].id]),
+                 setup=lambda: {'recipe': new_recipe()}),
+        # One upload per recipe, so no replaced image is left behind.
+        Scenario('recipe-upload-image', 'post',
+                 lambda step: reverse('recipe:recipe-upload-image',
+                                      args=[step['recipe'].id]),
+                 lambda step: {'image': _image_file()},
+                 format='multipart',
+                 setup=lambda: {'recipe': new_recipe()}),
+        Scenario('recipe-similar', 'get',
+                 reverse('recipe:recipe-similar', args=[recipe.id])),
+        Scenario('recipe-pantry', 'post',
+                 reverse('recipe:recipe-pantry'),
+                 {'ingredients': [i.id for i in ingredients]},
+                 format='json'),
+        Scenario('tag-list', 'get', reverse('recipe:tag-list')),
+        Scenario('tag-list-assigned', 'get', reverse('recipe:tag-list'),
+                 {'assigned_only': 1}),
+        Scenario('tag-update', 'patch',
+                 reverse('recipe:tag-detail', args=[tags[0].id]),
+                 {'name': tags[0].name}, format='json'),
+        Scenario('tag-delete', 'delete',
+                 lambda step: reverse('recipe:tag-detail',
+                                      args=[step['tag'].id]),
+                 setup=lambda: {'tag': new_tag()}),
+        Scenario('ingredient-list', 'get', reverse('recipe:ingredient-list')),
+        Scenario('ingredient-update', 'patch',
+                 reverse('recipe:ingredient-detail',
+                         args=[ingredients[0].id]),
+                 {'name': ingredients[0].name}, format='json'),
+        Scenario('ingredient-delete', 'delete',
+                 lambda step: reverse('recipe:ingredient-detail',
+                                      args=[step['ingredient'].id]),
+                 setup=lambda: {'ingredient': new_ingredient()}),
+        Scenario('user-create', 'post', reverse('user:create'),
+                 lambda step: {
+                     'email': f'bench-new-{time.time_ns()}-'
+                              f'{next(counter)}@example.com',
+                     'password': 'benchpass', 'name': 'Bench',
+                 },
+                 authenticated=False),
+        Scenario('user-token', 'post', reverse('user:token'),
+                 {'email': user.email, 'password': 'benchpass'},
+                 authenticated=False),
+        Scenario('user-me', 'get', reverse('user:me')),
+        Scenario('user-me-update', 'patch', reverse('user:me'),
+                 {'name': 'Bench'}, format='json'),
+    ]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, fraction):
+    '''Return the nearest-rank percentile of a sorted list.'''
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run_scenario(scenario, token, requests, concurrency, burst=1):
+    '''Run `requests` requests over `concurrency` threads.
+
+    With `burst` above one, requests instead go out in bursts of `burst`
+    identical requests sent at the same moment, one per thread.
+    '''
+    if burst > 1:
+        concurrency = burst
+        barrier = threading.Barrier(burst, timeout=BARRIER_TIMEOUT)
+        rounds = max(requests // burst, 1)
+        steps = [
+            step for step in (
+                scenario.setup() if scenario.setup else {}
+                for _ in range(rounds)
+            ) for _ in range(burst)
+        ]
+    else:
+        barrier = None
+        steps = [scenario.setup() if scenario.setup else {}
+                 for _ in range(requests)]
+    step_iter = iter(steps)
+    lock = threading.Lock()
+    latencies, queries, errors = [], [], []
+
+    def worker(threaded=True):
+        client = APIClient()
+        if scenario.authenticated:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        counter = _QueryCounter()
+        try:
+            with connection.execute_wrapper(counter):
+                while True:
+                    with lock:
+                        step = next(step_iter, None)
+                    if step is None:
+                        return
+                    if barrier is not None:
+                        barrier.wait()
+                    counter.count = 0
+                    start = time.perf_counter()
+                    response = scenario.request(client, step)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(counter.count)
+                        if response.status_code >= 400:
+                            errors.append(response.status_code)
+        except BaseException:
+            # Release the threads waiting for this one at the barrier.
+            if barrier is not None:
+                barrier.abort()
+            raise
+        finally:
+            if threaded:
+                connection.close()
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker(threaded=False)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(worker) for _ in range(concurrency)]
+            for future in futures:
+                future.result()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries_per_request': statistics.mean(queries) if queries else 0,
+    }
+
+
+def run(user, requests, concurrency, only=None, burst=1):
+    '''Run every scenario and return {name: result}.
+
+    Bursts only make sense for reads, so with `burst` above one only GET
+    scenarios run.
+    '''
+    token, _ = Token.objects.get_or_create(user=user)
+    results = {}
+    for scenario in build_scenarios(user):
+        if only and scenario.name not in only:
+            continue
+        if burst > 1 and scenario.method != 'get':
+            continue
+        results[scenario.name] = run_scenario(
+            scenario, token.key, requests, concurrency, burst,
+        )
+
+    return results
+
+
+def run_mixed(user, mix, requests, concurrency):
+    '''Run a weighted mix of scenarios at once and return {name: result}.
+
+    `mix` maps scenario names to integer weights. Requests shed with 503
+    are counted apart from errors and left out of the latency percentiles.
+    '''
+    token, _ = Token.objects.get_or_create(user=user)
+    scenarios = {
+        scenario.name: scenario for scenario in build_scenarios(user)
+        if scenario.name in mix
+    }
+    order = [name for name, weight in mix.items() for _ in range(weight)]
+    steps = [
+        (name, scenarios[name].setup() if scenarios[name].setup else {})
+        for name in itertools.islice(itertools.cycle(order), requests)
+    ]
+    step_iter = iter(steps)
+    lock = threading.Lock()
+    latencies = {name: [] for name in mix}
+    shed = dict.fromkeys(mix, 0)
+    errors = dict.fromkeys(mix, 0)
+
+    def worker(threaded=True):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        try:
+            while True:
+                with lock:
+                    name, step = next(step_iter, (None, None))
+                if name is None:
+                    return
+                start = time.perf_counter()
+                response = scenarios[name].request(client, step)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if response.status_code == 503:
+                        shed[name] += 1
+                    elif response.status_code >= 400:
+                        errors[name] += 1
+                    else:
+                        latencies[name].append(elapsed)
+        finally:
+            if threaded:
+                connection.close()
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker(threaded=False)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(worker) for _ in range(concurrency)]
+            for future in futures:
+                future.result()
+    wall = time.perf_counter() - start
+
+    results = {}
+    for name in mix:
+        served = sorted(latencies[name])
+        results[name] = {
+            'served': len(served),
+            'shed': shed[name],
+            'errors': errors[name],
+            'throughput': len(served) / wall if wall else 0.0,
+            'p50_ms': percentile(served, 0.50) * 1000,
+            'p99_ms': percentile(served, 0.99) * 1000,
+        }
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Return human readable regressions of `results` against a baseline.
+
+    Latency and throughput may drift by `threshold` (a fraction); any
+    increase in queries per request is a regression.
+    '''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p99_ms'] > base['p99_ms'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p99 {result['p99_ms']:.1f}ms > "
+                f"baseline {base['p99_ms']:.1f}ms"
+            )
+        if result['throughput'] < base['throughput'] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {result['throughput']:.1f}/s < "
+                f"baseline {base['throughput']:.1f}/s"
+            )
+        if result['queries_per_request'] > base['queries_per_request']:
+            regressions.append(
+                f"{name}: {result['queries_per_request']:.1f} queries > "
+                f"baseline {base['queries_per_request']:.1f}"
+            )
+
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
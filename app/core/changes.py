@@ -0,0 +1,199 @@
+'''
+Per-user change feed for incremental client sync.
+
+Every write to a recipe, tag or ingredient records a Change row carrying
+the next number from the user's ChangeSequence. An object keeps only its
+latest row, so the feed holds one entry per object and a deleted object
+stays in it as a tombstone. A client syncs by asking for the entries
+after the last sequence number it has seen.
+
+Sequence numbers are reserved with an UPDATE of the user's sequence row,
+which stays locked until the transaction ends. Writes of the same user
+therefore commit in sequence order, and a reader never sees a number
+before the smaller ones are visible.
+
+Saves, deletes and link changes are recorded by signal receivers in
+core.signals. Deleting a tag or ingredient also changes the recipes
+linked to it, but the cascade sends no signal for the links, so code
+deleting them calls `record_linked_recipes` first. Bulk paths that skip
+signals record their changes explicitly.
+
+Inside `batch()` changes are collected and written once at the end, so a
+request writing many objects reserves numbers once per user. Once the
+transaction commits, the new entries are pushed to the user's open event
+streams (core.events).
+'''
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from rest_framework.permissions import SAFE_METHODS
+
+from core import counters, events
+from core.models import Change, ChangeSequence, Recipe, Tag, Ingredient
+
+
+KINDS = {
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+    Recipe: Change.RECIPE,
+}
+
+# Within one write, tags and ingredients are numbered before the recipes
+# that may reference them.
+KIND_ORDER = {kind: index for index, kind in enumerate(KINDS.values())}
+
+_pending = contextvars.ContextVar('pending_changes', default=None)
+
+
+def _allocate(user_id, count):
+    '''Reserve `count` sequence numbers for a user and return the first.'''
+    sequences = ChangeSequence.objects.filter(user_id=user_id)
+    if not sequences.update(last=F('last') + count):
+        try:
+            with transaction.atomic():
+                ChangeSequence.objects.create(user_id=user_id, last=count)
+            return 1
+        except IntegrityError:
+            # Another transaction created the row first.
+            sequences.update(last=F('last') + count)
+    return sequences.values_list('last', flat=True).get() - count + 1
+
+
+def _write(pending):
+    '''Store {(user_id, kind, object_id): deleted} entries in the feed.'''
+    by_user = defaultdict(list)
+    for user_id, kind, object_id in sorted(
+            pending, key=lambda key: (key[0], KIND_ORDER[key[1]], key[2])):
+        by_user[user_id].append(
+            (kind, object_id, pending[user_id, kind, object_id])
+        )
+
+    with transaction.atomic(savepoint=False):
+        # Users are locked in id order, so concurrent writers can't
+        # deadlock on each other's sequences.
+        for user_id, entries in by_user.items():
+            first = _allocate(user_id, len(entries))
+            ids_by_kind = defaultdict(list)
+            for kind, object_id, _ in entries:
+                ids_by_kind[kind].append(object_id)
+            replaced = Q()
+            for kind, ids in ids_by_kind.items():
+                replaced |= Q(kind=kind, object_id__in=ids)
+            Change.objects.filter(replaced, user_id=user_id).delete()
+            numbered = [
+                (seq, kind, object_id, deleted)
+                for seq, (kind, object_id, deleted) in enumerate(
+                    entries, first
+                )
+            ]
+            Change.objects.bulk_create(
+                Change(user_id=user_id, seq=seq, kind=kind,
+                       object_id=object_id, deleted=deleted)
+                for seq, kind, object_id, deleted in numbered
+            )
+            transaction.on_commit(partial(
+                events.publish, user_id, numbered[-1][0], numbered,
+            ))
+
+
+def record(user_id, model, ids, deleted=False):
+    '''Record that the user's `model` objects in `ids` changed.'''
+    kind = KINDS[model]
+    entries = {(user_id, kind, object_id): deleted for object_id in ids}
+    if not entries:
+        return
+
+    pending = _pending.get()
+    if pending is None:
+        _write(entries)
+    else:
+        pending.update(entries)
+
+
+def record_linked_recipes(model, ids):
+    '''Record the recipes linked to the given tags or ingredients.'''
+    through = counters.through_model(model)
+    field = f'{counters.target_field(model)}_id'
+    recipes = defaultdict(set)
+    for user_id, recipe_id in through.objects.filter(
+            **{f'{field}__in': ids}).values_list('recipe__user_id',
+                                                 'recipe_id'):
+        recipes[user_id].add(recipe_id)
+
+    for user_id, recipe_ids in recipes.items():
+        record(user_id, Recipe, sorted(recipe_ids))
+
+
+def forget_user(user_id):
+    '''Drop the feed and pending changes of a deleted user.'''
+    pending = _pending.get()
+    if pending:
+        for key in [key for key in pending if key[0] == user_id]:
+            del pending[key]
+    Change.objects.filter(user_id=user_id)._raw_delete(Change.objects.db)
+    ChangeSequence.objects.filter(user_id=user_id).delete()
+
+
+def backfill_user(user_id, batch_size=5000):
+    '''Add a feed entry for each of a user's objects without one.'''
+    entries = []
+    for model, kind in KINDS.items():
+        entries.extend(
+            (kind, object_id) for object_id in model.objects.filter(
+                user_id=user_id
+            ).exclude(
+                id__in=Change.objects.filter(
+                    user_id=user_id, kind=kind
+                ).values('object_id')
+            ).order_by('id').values_list('id', flat=True)
+        )
+    if not entries:
+        return 0
+
+    with transaction.atomic():
+        first = _allocate(user_id, len(entries))
+        Change.objects.bulk_create(
+            (Change(user_id=user_id, seq=seq, kind=kind, object_id=object_id)
+             for seq, (kind, object_id) in enumerate(entries, first)),
+            batch_size=batch_size,
+        )
+    return len(entries)
+
+
+@contextmanager
+def batch():
+    '''Collect the changes recorded in the block and write them at its end.
+
+    Open it inside the transaction making the writes, so the feed commits
+    with them. Nothing is written if the block raises, or if it marked the
+    transaction for rollback, as DRF does when it handles an exception.
+    '''
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    connection = transaction.get_connection()
+    if pending and not (connection.in_atomic_block
+                        and connection.get_rollback()):
+        _write(pending)
+
+
+class RecordChangesMixin:
+    '''Run unsafe requests in one transaction with batched change records.'''
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic(), batch():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,165 @@
+'''
+Adaptive concurrency limit with route class priorities.
+
+Every request is put in a route class, such as cheap reads, lists, writes
+or heavy uploads. One AIMD limit covers the whole process. It grows by
+about one request per round trip while requests finish within their
+class's latency target. It shrinks by a constant factor when they do not,
+or when they fail with a server error. Requests over the limit are
+rejected at once instead of queueing behind slow ones.
+
+Each class may only fill its `share` of the limit. When the limit shrinks
+under load, heavy routes are therefore shed long before cheap reads.
+In-flight requests and latency are also tracked per class.
+
+Limits are kept per process; every worker adapts on its own.
+'''
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from core.metrics import registry
+
+
+requests_shed = registry.counter(
+    'http_requests_shed_total',
+    'Requests rejected by the concurrency limiter.', ('route_class',),
+)
+
+
+class AIMDLimiter:
+    '''Concurrency limit with additive increase, multiplicative decrease.'''
+
+    def __init__(self, initial, minimum, maximum, cooldown, backoff=0.9):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.backoff = backoff
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, share=1.0):
+        '''Take a slot if fewer than `share` of the limit are in use.'''
+        with self._lock:
+            if self.in_flight >= self.limit * share:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, congested=False):
+        '''Free a slot and adapt the limit to how the request went.'''
+        with self._lock:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if congested:
+                # A burst of slow requests counts as one congestion signal.
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif in_flight >= self.limit / 2:
+                # Only grow when the limit is actually being used.
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class ConcurrencyController:
+    '''Admission control across all route classes of one process.'''
+
+    def __init__(self, classes, initial, minimum, maximum):
+        self.classes = classes
+        self.limiter = AIMDLimiter(
+            initial, minimum, maximum,
+            cooldown=min(c['target_latency'] for c in classes.values()),
+        )
+        self.in_flight = Counter()
+        self.latency = dict.fromkeys(classes, 0.0)
+        self._lock = threading.Lock()
+
+    def acquire(self, route_class):
+        '''Admit a request of `route_class` and return whether it may run.'''
+        if not self.limiter.try_acquire(self.classes[route_class]['share']):
+            return False
+        with self._lock:
+            self.in_flight[route_class] += 1
+        return True
+
+    def release(self, route_class, latency, failed=False):
+        '''Record that an admitted request finished.'''
+        target = self.classes[route_class]['target_latency']
+        self.limiter.release(congested=failed or latency > target)
+        with self._lock:
+            self.in_flight[route_class] -= 1
+            # Exponentially weighted moving average, for monitoring.
+            self.latency[route_class] += 0.1 * (
+                latency - self.latency[route_class]
+            )
+
+
+def route_class(method, view_name):
+    '''Return the route class of a request, or None if it is exempt.'''
+    if view_name in settings.CONCURRENCY_EXEMPT:
+        return None
+    for key in (f'{method} {view_name}', view_name):
+        if key in settings.CONCURRENCY_ROUTES:
+            return settings.CONCURRENCY_ROUTES[key]
+    return 'read' if method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    '''Return this process's controller, built from settings.'''
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = ConcurrencyController(
+                    settings.CONCURRENCY_CLASSES,
+                    **settings.CONCURRENCY_LIMIT,
+                )
+    return _controller
+
+
+def reset():
+    '''Drop the controller so the next request rebuilds it.'''
+    global _controller
+    _controller = None
+
+
+@receiver(setting_changed)
+def reset_controller(setting, **kwargs):
+    if setting.startswith('CONCURRENCY_'):
+        reset()
+
+
+@registry.add_collector
+def collect_concurrency():
+    '''Expose the limit, and in-flight requests and latency per class.'''
+    controller = _controller
+    if controller is None:
+        return []
+
+    samples = [(
+        'concurrency_limit', 'Adaptive concurrency limit.',
+        {}, int(controller.limiter.limit),
+    )]
+    for name in controller.classes:
+        labels = {'route_class': name}
+        samples.append((
+            'concurrency_in_flight', 'Requests currently admitted.',
+            labels, controller.in_flight[name],
+        ))
+        samples.append((
+            'concurrency_latency_seconds',
+            'Moving average latency of admitted requests.',
+            labels, round(controller.latency[name], 6),
+        ))
+    return samples
@@ -0,0 +1,61 @@
+'''
+Denormalized recipe counters for tags and ingredients.
+'''
+from django.db.models import Count, F
+
+from core.models import Recipe, Tag, Ingredient
+
+
+# Recipe many-to-many field backing each counted model.
+COUNTED_RELATIONS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+
+
+def through_model(model):
+    '''Return the through model linking recipes to `model`.'''
+    return getattr(Recipe, COUNTED_RELATIONS[model]).through
+
+
+def target_field(model):
+    '''Return the through model field pointing at `model`.'''
+    field = Recipe._meta.get_field(COUNTED_RELATIONS[model])
+    return field.m2m_reverse_field_name()
+
+
+def linked_ids(model, recipe_ids):
+    '''Return a queryset of `model` ids linked to the given recipes.'''
+    return through_model(model).objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values_list(f'{target_field(model)}_id', flat=True)
+
+
+def adjust_counts(model, ids, delta):
+    '''Add `delta` to the recipe count of every object in `ids`.'''
+    if delta:
+        model.objects.filter(id__in=ids).update(
+            recipe_count=F('recipe_count') + delta
+        )
+
+
+def find_drift(model, queryset=None):
+    '''Return (id, stored, actual) rows whose stored count is wrong.'''
+    if queryset is None:
+        queryset = model.objects.all()
+
+    return queryset.order_by().annotate(
+        actual=Count('recipe'),
+    ).exclude(
+        recipe_count=F('actual'),
+    ).values_list('id', 'recipe_count', 'actual')
+
+
+def repair_counts(model, queryset=None):
+    '''Rewrite drifted counters and return the drifted rows.'''
+    drift = list(find_drift(model, queryset))
+    objs = [model(id=obj_id, recipe_count=actual)
+            for obj_id, _, actual in drift]
+    model.objects.bulk_update(objs, ['recipe_count'])
+
+    return drift
@@ -0,0 +1,89 @@
+'''
+PostgreSQL backend that checks connections out of a per-process pool.
+
+Configure it like the stock backend and tune the pool with a `POOL` entry:
+
+    'ENGINE': 'core.db.backends.postgresql_pool',
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_AGE': 1800,
+             'MAX_IDLE': 300, 'CHECK_INTERVAL': 10},
+
+Django "closes" the connection at the end of every request when
+CONN_MAX_AGE is 0, which here returns it to the pool instead.
+'''
+import functools
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from django.db.backends.postgresql import base, creation
+
+from core.db.pool import close_pools, get_pool
+
+
+def connect(conn_params):
+    '''Open a new psycopg2 connection configured like Django's backend.'''
+    connection = psycopg2.connect(**conn_params)
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x,
+    )
+    return connection
+
+
+def _rollback_if_needed(connection):
+    status = connection.get_transaction_status()
+    if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise psycopg2.InterfaceError('Connection is broken.')
+    if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def check(connection):
+    '''Validate a connection with a round trip before reuse.'''
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    _rollback_if_needed(connection)
+    return True
+
+
+def reset(connection):
+    '''Leave a returned connection outside any transaction.'''
+    _rollback_if_needed(connection)
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections would keep the test database open.
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(
+            self.alias,
+            conn_params,
+            self.settings_dict.get('POOL', {}),
+            functools.partial(connect, conn_params),
+            check=check,
+            reset=reset,
+        )
+        connection = self.pool.getconn()
+
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
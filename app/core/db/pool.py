@@ -0,0 +1,239 @@
+'''
+Bounded, thread-safe database connection pool.
+'''
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    '''Raised when no connection became available in time.
+
+    It is a DB-API error, so Django raises it as OperationalError like
+    any other failure to connect.
+    '''
+
+
+class _Entry:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection, now):
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    '''Pool of at most `max_size` connections made by `connect()`.
+
+    Connections older than `max_age` or idle for longer than `max_idle`
+    seconds are closed instead of reused. A connection idle for longer than
+    `check_interval` seconds is validated with `check(connection)` before
+    it is handed out. `reset(connection)` runs when a connection comes
+    back; if it raises, the connection is discarded.
+    '''
+
+    def __init__(self, connect, max_size=10, timeout=5.0, max_age=1800,
+                 max_idle=300, check_interval=10, check=None, reset=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.check = check
+        self.reset = reset
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._counters = {
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'checks_failed': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _expired(self, entry, now):
+        return (now - entry.created_at > self.max_age
+                or now - entry.last_used > self.max_idle)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard(self, entry):
+        '''Close a connection and release its slot. Call with the lock.'''
+        self._close(entry.connection)
+        self._size -= 1
+        self._cond.notify()
+
+    def getconn(self):
+        '''Check out a healthy connection, waiting up to `timeout`.'''
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = self._acquire(deadline)
+            if entry.connection is None:
+                try:
+                    entry.connection = self.connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._counters['connections_created'] += 1
+            elif not self._healthy(entry):
+                with self._cond:
+                    self._counters['checks_failed'] += 1
+                    self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.connection)] = entry
+            return entry.connection
+
+    def _acquire(self, deadline):
+        '''Take an idle entry or reserve a slot for a new connection.'''
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    # LIFO keeps a hot working set and lets extra
+                    # connections age out during quiet periods.
+                    entry = self._idle.pop()
+                    if not self._expired(entry, now):
+                        return entry
+                    self._counters['connections_recycled'] += 1
+                    self._discard(entry)
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return _Entry(None, now)
+
+                if not waited:
+                    self._counters['waits'] += 1
+                    waited = True
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No connection available within {self.timeout}s.'
+                    )
+                self._cond.wait(remaining)
+
+    def _healthy(self, entry):
+        if getattr(entry.connection, 'closed', False):
+            return False
+        idle = time.monotonic() - entry.last_used
+        if self.check is None or idle < self.check_interval:
+            return True
+        try:
+            return bool(self.check(entry.connection))
+        except Exception:
+            return False
+
+    def putconn(self, connection, discard=False):
+        '''Return a checked out connection to the pool.'''
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            self._close(connection)
+            return
+
+        if not discard and self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            now = time.monotonic()
+            if discard or getattr(connection, 'closed', False):
+                self._discard(entry)
+            elif now - entry.created_at > self.max_age:
+                self._counters['connections_recycled'] += 1
+                self._discard(entry)
+            else:
+                entry.last_used = now
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def closeall(self):
+        '''Close every idle connection. In-use ones close on return.'''
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def stats(self):
+        '''Return a snapshot of the pool gauges and counters.'''
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                **self._counters,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options, connect, **callbacks):
+    '''Return the process-wide pool for a database, creating it once.
+
+    Pools are keyed by process id so forked workers never share sockets
+    inherited from their parent.
+    '''
+    key = (
+        os.getpid(),
+        alias,
+        conn_params.get('database'),
+        repr(sorted(conn_params.items())),
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                connect,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5.0),
+                max_age=options.get('MAX_AGE', 1800),
+                max_idle=options.get('MAX_IDLE', 300),
+                check_interval=options.get('CHECK_INTERVAL', 10),
+                **callbacks,
+            )
+            _pools[key] = pool
+
+    return pool
+
+
+def _own_pools():
+    with _pools_lock:
+        return [(key, pool) for key, pool in _pools.items()
+                if key[0] == os.getpid()]
+
+
+def close_pools(database=None):
+    '''Close idle connections of this process, optionally for one database.'''
+    for (_, _, name, _), pool in _own_pools():
+        if database is None or name == database:
+            pool.closeall()
+
+
+def pool_stats():
+    '''Return stats for every pool of this process, labelled by database.'''
+    return [
+        {'alias': alias, 'database': name, **pool.stats()}
+        for (_, alias, name, _), pool in _own_pools()
+    ]
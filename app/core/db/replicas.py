@@ -0,0 +1,98 @@
+'''
+Read replica routing with read-your-writes stickiness.
+
+Views opt in with ReplicaRoutingMixin: safe reads of the actions listed in
+`replica_actions` run against a replica from REPLICA_DATABASES, everything
+else runs on the primary. After a user writes, their reads stay on the
+primary for REPLICA_PIN_SECONDS so they never read their own stale data.
+
+The pin travels with the client as a signed, timestamped cookie, so it
+holds whichever worker or host serves the next request. Clients that drop
+cookies may read from a replica right after writing.
+'''
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_COOKIE = 'primary_pin'
+PIN_SALT = 'core.db.replicas.pin'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def pin_to_primary(response, user_id):
+    '''Send the user's reads to the primary for the pin window.'''
+    response.set_signed_cookie(
+        PIN_COOKIE, str(user_id), salt=PIN_SALT,
+        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+    )
+
+
+def is_pinned(request, user_id):
+    '''Return True if the request carries the user's unexpired pin.'''
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=settings.REPLICA_PIN_SECONDS,
+    )
+    return pinned == str(user_id)
+
+
+class ReplicaRouter:
+    '''Route reads to a replica when the current view allows it.'''
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.REPLICA_DATABASES
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+class ReplicaRoutingMixin:
+    '''Run safe reads of `replica_actions` on a replica.'''
+    replica_actions = ()
+
+    def _view_action(self, request):
+        return getattr(self, 'action', None) or request.method.lower()
+
+    def dispatch(self, request, *args, **kwargs):
+        # Reset here rather than in finalize_response, which DRF skips
+        # when a view raises an exception it does not handle.
+        token = _use_replica.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication runs first, on the primary, so freshly created
+        # tokens always resolve.
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        pinned = user.is_authenticated and is_pinned(request, user.id)
+        if self._view_action(request) in self.replica_actions and not pinned:
+            _use_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS
+                and self._view_action(request) not in self.replica_actions
+                and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(response, user.id)
+
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,285 @@
+'''
+Per-user push of change notifications.
+
+When a transaction recording changes in the feed (core.changes) commits,
+a notification with the new sync cursor and the changed objects is
+published for each user. The process-wide Broker hands it to every open
+event stream of that user (see core.sse).
+
+Publishing goes through the backend named by EVENTS_BACKEND. The local
+backend delivers within the process and is meant for tests and single
+process servers. The PostgreSQL backend uses NOTIFY, so writes in any
+process reach the streams of every ASGI worker.
+
+Each stream has a bounded queue. If a slow client lets it fill up, the
+backlog is dropped and replaced by a single `resync` event telling the
+client to catch up through the sync API. Memory per connection therefore
+stays bounded and writers never wait for readers.
+'''
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from core.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+events_published = registry.counter(
+    'events_published_total', 'Change notifications published.',
+)
+events_dropped = registry.counter(
+    'events_dropped_total',
+    'Notifications dropped from the queues of slow event streams.',
+)
+
+
+def notification(cursor, entries):
+    '''Return the (event, data) pair announcing feed entries.
+
+    `entries` are (seq, kind, object_id, deleted) tuples. Writes touching
+    more than EVENTS_MAX_CHANGES objects are announced as a `resync`.
+    '''
+    if len(entries) > settings.EVENTS_MAX_CHANGES:
+        return 'resync', {'cursor': cursor}
+    return 'change', {
+        'cursor': cursor,
+        'changes': [
+            {'seq': seq, 'type': kind, 'id': object_id, 'deleted': deleted}
+            for seq, kind, object_id, deleted in entries
+        ],
+    }
+
+
+class Subscription:
+    '''Bounded queue of events for one stream, read on its event loop.'''
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def offer(self, event, data):
+        '''Queue an event from any thread without waiting.'''
+        try:
+            self.loop.call_soon_threadsafe(self._put, event, data)
+        except RuntimeError:
+            # The loop has closed; the stream is gone.
+            pass
+
+    def _put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+            return
+        except asyncio.QueueFull:
+            pass
+
+        # The client reads too slowly. Replace the backlog with one event
+        # telling it to catch up through the sync API.
+        dropped = self.queue.qsize()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        events_dropped.inc(amount=dropped)
+        self.queue.put_nowait(('resync', {'cursor': data['cursor']}))
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    '''In-process fan-out of notifications to the streams of each user.'''
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, maxsize):
+        '''Return a new subscription to the user's notifications.'''
+        subscription = Subscription(user_id, maxsize)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def deliver(self, user_id, event, data):
+        '''Pass an event to every stream of the user.'''
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.offer(event, data)
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscriptions.values())
+
+
+class LocalBackend:
+    '''Deliver notifications within this process only.'''
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, user_id, event, data):
+        self.broker.deliver(user_id, event, data)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PostgresBackend:
+    '''Publish with NOTIFY and listen on a dedicated connection.
+
+    The listener thread starts with the first stream of the process and
+    reconnects after errors. Notifications sent while it is disconnected
+    are lost, so clients resync after every reconnect of their own.
+    '''
+    # NOTIFY payloads must stay below 8000 bytes.
+    MAX_PAYLOAD = 7900
+
+    def __init__(self, broker, alias=DEFAULT_DB_ALIAS):
+        self.broker = broker
+        self.alias = alias
+        self.channel = settings.EVENTS_CHANNEL
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event, data):
+        payload = json.dumps({'user': user_id, 'event': event, 'data': data})
+        if len(payload) > self.MAX_PAYLOAD:
+            payload = json.dumps({
+                'user': user_id, 'event': 'resync',
+                'data': {'cursor': data['cursor']},
+            })
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._listen, name='events-listener', daemon=True,
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _listen(self):
+        import psycopg2
+
+        wrapper = connections[self.alias]
+        while not self._stopped.is_set():
+            try:
+                connection = psycopg2.connect(
+                    **wrapper.get_connection_params()
+                )
+            except psycopg2.Error:
+                logger.exception('Could not connect the events listener')
+                time.sleep(1)
+                continue
+            try:
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            self._dispatch(connection.notifies.pop(0))
+            except psycopg2.Error:
+                logger.exception('Events listener lost its connection')
+                time.sleep(1)
+            finally:
+                connection.close()
+
+    def _dispatch(self, notify):
+        message = json.loads(notify.payload)
+        self.broker.deliver(message['user'], message['event'],
+                            message['data'])
+
+
+_broker = None
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_broker():
+    '''Return this process's broker.'''
+    get_backend()
+    return _broker
+
+
+def get_backend():
+    '''Return this process's backend, built from EVENTS_BACKEND.'''
+    global _broker, _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _broker = Broker()
+                _backend = import_string(settings.EVENTS_BACKEND)(_broker)
+    return _backend
+
+
+def reset():
+    '''Stop the backend and drop it with the broker.'''
+    global _broker, _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.stop()
+        _broker = _backend = None
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    if setting.startswith('EVENTS_'):
+        reset()
+
+
+def publish(user_id, cursor, entries):
+    '''Publish a notification for the user's new feed entries.'''
+    event, data = notification(cursor, entries)
+    try:
+        get_backend().publish(user_id, event, data)
+    except Exception:
+        # The write has committed; clients still find it by syncing.
+        logger.exception('Could not publish change notification')
+        return
+    events_published.inc()
+
+
+@registry.add_collector
+def collect_events():
+    '''Expose the number of open event streams.'''
+    broker = _broker
+    if broker is None:
+        return []
+    return [(
+        'events_connections', 'Open event streams in this process.',
+        {}, broker.connections(),
+    )]
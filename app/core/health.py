@@ -0,0 +1,19 @@
+'''
+Lightweight database and migration probes.
+'''
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+def probe_database(alias=DEFAULT_DB_ALIAS):
+    '''Open a connection and run a trivial query, raising on failure.'''
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def pending_migrations(alias=DEFAULT_DB_ALIAS):
+    '''Return the migrations not yet applied to the database.'''
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+    return [migration for migration, backwards in plan]
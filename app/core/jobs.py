@@ -0,0 +1,272 @@
+'''
+Background job queue stored in the application database.
+
+Jobs are rows in `core.Job`. Enqueueing inside a transaction only makes
+the job visible once that transaction commits. Workers claim ready jobs
+with SELECT ... FOR UPDATE SKIP LOCKED where the backend supports it, so
+concurrent workers never wait on each other's rows. A running job renews
+its lock from a heartbeat thread, and its outcome is only written while
+the worker still holds the lock. Successful jobs are deleted; failures
+are retried with exponential backoff and kept once they run out of
+attempts.
+'''
+import logging
+import random
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.metrics import registry
+from core.models import Job
+
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+jobs_total = registry.counter(
+    'jobs_total', 'Jobs run by task and outcome.', ('task', 'outcome'),
+)
+job_duration = registry.histogram(
+    'job_duration_seconds', 'Time spent running a job.', ('task',),
+    buckets=WAIT_BUCKETS,
+)
+job_wait = registry.histogram(
+    'job_wait_seconds', 'Delay between a job becoming ready and starting.',
+    ('task',), buckets=WAIT_BUCKETS,
+)
+
+_tasks = {}
+
+
+def task(name):
+    '''Register the decorated function as the job handler for `name`.'''
+    def decorator(func):
+        _tasks[name] = func
+        return func
+
+    return decorator
+
+
+def enqueue(name, payload=None, priority=0, delay=0, max_attempts=None):
+    '''Queue a job; higher priorities run first.'''
+    if name not in _tasks:
+        raise ValueError(f'Unknown job task: {name}')
+
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim(worker_id, limit=1):
+    '''Lock up to `limit` ready jobs for `worker_id` and return them.'''
+    token = f'{worker_id}:{uuid.uuid4().hex[:12]}'
+    now = timezone.now()
+    with transaction.atomic():
+        ready = Job.objects.filter(
+            status=Job.QUEUED, run_at__lte=now,
+        ).order_by('-priority', 'run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            ready = ready.select_for_update(skip_locked=True)
+        ids = list(ready.values_list('id', flat=True)[:limit])
+        # The status condition keeps claims exclusive on backends
+        # without row locks.
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            locked_at=now,
+            locked_by=token,
+            attempts=F('attempts') + 1,
+        )
+
+    return list(
+        Job.objects.filter(locked_by=token).order_by('-priority', 'run_at')
+    )
+
+
+def backoff(attempts):
+    '''Return the retry delay in seconds after `attempts` failures.'''
+    delay = min(
+        settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def renew_lock(job):
+    '''Renew the lock on a running job; return whether it is still held.'''
+    return Job.objects.filter(
+        id=job.id, status=Job.RUNNING, locked_by=job.locked_by,
+    ).update(locked_at=timezone.now()) == 1
+
+
+@contextmanager
+def heartbeat(job, interval=None):
+    '''Renew the lock on `job` every `interval` seconds in a thread.'''
+    interval = interval or settings.JOB_HEARTBEAT_INTERVAL
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                try:
+                    if not renew_lock(job):
+                        logger.warning('Job %s lost its lock', job)
+                        return
+                except DatabaseError:
+                    logger.warning('Failed to renew the lock of job %s',
+                                   job, exc_info=True)
+        finally:
+            # The thread has its own connection.
+            connection.close()
+
+    thread = threading.Thread(
+        target=beat, name=f'job-{job.id}-heartbeat', daemon=True,
+    )
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job):
+    '''Run one claimed job and record its outcome.'''
+    started = time.monotonic()
+    job_wait.observe(
+        (job.name,), max((timezone.now() - job.run_at).total_seconds(), 0)
+    )
+    try:
+        func = _tasks[job.name]
+    except KeyError:
+        return _fail(job, f'Unknown job task: {job.name}', retry=False)
+
+    try:
+        with heartbeat(job):
+            func(**job.payload)
+    except Exception:
+        job_duration.observe((job.name,), time.monotonic() - started)
+        return _fail(job, traceback.format_exc())
+
+    job_duration.observe((job.name,), time.monotonic() - started)
+    jobs_total.inc((job.name, 'succeeded'))
+    # A job requeued after losing its lock belongs to its next worker.
+    Job.objects.filter(id=job.id, locked_by=job.locked_by).delete()
+    return True
+
+
+def _fail(job, error, retry=True):
+    owned = Job.objects.filter(id=job.id, locked_by=job.locked_by)
+    if retry and job.attempts < job.max_attempts:
+        jobs_total.inc((job.name, 'retried'))
+        owned.update(
+            status=Job.QUEUED,
+            run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)),
+            locked_at=None,
+            locked_by='',
+            last_error=error,
+        )
+    else:
+        jobs_total.inc((job.name, 'failed'))
+        logger.error('Job %s failed permanently:\n%s', job, error)
+        owned.update(
+            status=Job.FAILED, locked_at=None, last_error=error,
+        )
+
+    return False
+
+
+def reclaim_stale(timeout=None):
+    '''Requeue running jobs whose worker stopped without finishing.'''
+    timeout = timeout or settings.JOB_LOCK_TIMEOUT
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=Job.QUEUED, locked_at=None, locked_by='')
+
+
+def run_pending(worker_id='inline', batch_size=10):
+    '''Run ready jobs until none are left and return how many ran.'''
+    processed = 0
+    while True:
+        jobs = claim(worker_id, batch_size)
+        if not jobs:
+            return processed
+        for job in jobs:
+            run(job)
+            processed += 1
+
+
+def work(worker_id, stop=None, batch_size=1, poll_interval=None,
+         max_jobs=None, burst=False):
+    '''Claim and run jobs until `stop` is set or `max_jobs` have run.
+
+    Only the running job renews its lock, so jobs waiting in a claimed
+    batch go stale after JOB_LOCK_TIMEOUT and large batches only suit
+    short jobs. In burst mode the worker returns once no job is ready.
+    '''
+    poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+    processed = 0
+    next_reclaim = 0
+    while not (stop is not None and stop.is_set()):
+        limit = batch_size
+        if max_jobs is not None:
+            limit = min(limit, max_jobs - processed)
+        try:
+            if time.monotonic() >= next_reclaim:
+                reclaim_stale()
+                next_reclaim = (
+                    time.monotonic() + settings.JOB_LOCK_TIMEOUT / 2
+                )
+            jobs = claim(worker_id, limit)
+        except DatabaseError:
+            # Outlive database restarts and lock timeouts; the connection
+            # is reopened on the next query.
+            logger.warning('Worker %s failed to claim jobs', worker_id,
+                           exc_info=True)
+            connection.close()
+            time.sleep(poll_interval * random.uniform(0.5, 1.5))
+            continue
+        for job in jobs:
+            run(job)
+        processed += len(jobs)
+
+        if max_jobs is not None and processed >= max_jobs:
+            break
+        if not jobs and burst:
+            break
+        if not jobs:
+            # Jitter keeps idle workers from polling in lockstep.
+            time.sleep(poll_interval * random.uniform(0.5, 1.5))
+
+    return processed
+
+
+@registry.add_collector
+def collect_queue_depth():
+    '''Expose the number of jobs per status.'''
+    try:
+        counts = dict(
+            Job.objects.order_by().values_list('status')
+            .annotate(total=Count('id'))
+        )
+    except Exception:
+        return []
+
+    return [
+        ('job_queue_depth', 'Jobs per status.', {'status': status},
+         counts.get(status, 0))
+        for status, _ in Job.STATUS_CHOICES
+    ]
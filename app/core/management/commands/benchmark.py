@@ -0,0 +1,129 @@
+"""
+Django command to benchmark every API endpoint.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    """Seed a dataset, load every endpoint and compare with a baseline."""
+    help = 'Benchmark every api/recipe and api/user endpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--yes', action='store_true',
+            help='Confirm seeding and writing to the configured database '
+                 'and MEDIA_ROOT.',
+        )
+        parser.add_argument(
+            '--keep-data', action='store_true',
+            help='Keep the seeded users for the next run instead of '
+                 'purging them.',
+        )
+        parser.add_argument(
+            '--scale', choices=sorted(benchmark.SCALES), default='1k',
+            help='Dataset size to seed and benchmark against.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Requests per scenario.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Concurrent client threads.',
+        )
+        parser.add_argument(
+            '--burst', type=int, default=1,
+            help='Send each read as this many identical concurrent '
+                 'requests.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', default=None,
+            help='Only run this scenario (repeatable).',
+        )
+        parser.add_argument(
+            '--baseline', default=None,
+            help='Baseline JSON file (default: benchmarks/<scale>.json). '
+                 'A run without one fails unless --save-baseline is given.',
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Write the results as the new baseline.',
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed latency/throughput regression as a fraction.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError(
+                f'This seeds and writes to the '
+                f'{benchmark.target_description()}. Run it against a '
+                'disposable environment and pass --yes.'
+            )
+        scale = options['scale']
+        name = scale
+        if options['burst'] > 1:
+            name = f"{scale}-burst{options['burst']}"
+        baseline_path = options['baseline'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f'{name}.json'
+        )
+
+        if not options['save_baseline'] and not os.path.exists(
+                baseline_path):
+            raise CommandError(
+                f'No baseline at {baseline_path} to compare with. Record '
+                'one on the reference machine with --save-baseline.'
+            )
+
+        user = benchmark.seed(scale, stdout=self.stdout)
+        try:
+            # Benchmarks measure capacity, so nothing may be shed.
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'],
+                                   CONCURRENCY_LIMIT_ENABLED=False):
+                results = benchmark.run(
+                    user,
+                    options['requests'],
+                    options['concurrency'],
+                    only=options['scenario'],
+                    burst=options['burst'],
+                )
+        finally:
+            if not options['keep_data']:
+                benchmark.cleanup(scale)
+
+        self.stdout.write(
+            f"{'scenario':<24}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'queries':>10}{'errors':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24}{result['throughput']:>10.1f}"
+                f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries_per_request']:>10.1f}"
+                f"{result['errors']:>8}"
+            )
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+            benchmark.save_baseline(baseline_path, results)
+            self.stdout.write(f'Baseline written to {baseline_path}')
+            return
+
+        regressions = benchmark.compare(
+            results,
+            benchmark.load_baseline(baseline_path),
+            options['threshold'],
+        )
+        if regressions:
+            raise CommandError(
+                'Performance regressions:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
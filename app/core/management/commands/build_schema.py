@@ -0,0 +1,22 @@
+"""
+Django command to prebuild the OpenAPI schema artifact.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.schema import generate_schema, write_artifact
+
+
+class Command(BaseCommand):
+    """Generate the OpenAPI schema and write it to disk."""
+    help = 'Write the OpenAPI schema to a versioned artifact.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=None,
+            help='Write to this path instead of SCHEMA_ARTIFACT_DIR.',
+        )
+
+    def handle(self, *args, **options):
+        path = write_artifact(generate_schema(), options['file'])
+        self.stdout.write(self.style.SUCCESS(f'Schema written to {path}'))
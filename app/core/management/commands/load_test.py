@@ -0,0 +1,104 @@
+"""
+Django command to overload the API with a mix of cheap and heavy requests.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import benchmark
+
+
+DEFAULT_MIX = {
+    'recipe-detail': 6,
+    'recipe-list': 3,
+    'recipe-upload-image': 1,
+}
+
+
+def parse_mix(values):
+    '''Parse name=weight pairs into an ordered dict.'''
+    mix = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        try:
+            mix[name] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f'Invalid weight in --mix {value!r}.')
+    return mix
+
+
+class Command(BaseCommand):
+    """Compare latency under overload with and without load shedding."""
+    help = 'Run a mixed workload above capacity, with and without limits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--yes', action='store_true',
+            help='Confirm seeding and writing to the configured database '
+                 'and MEDIA_ROOT.',
+        )
+        parser.add_argument(
+            '--keep-data', action='store_true',
+            help='Keep the seeded users for the next run instead of '
+                 'purging them.',
+        )
+        parser.add_argument(
+            '--scale', choices=sorted(benchmark.SCALES), default='1k',
+            help='Dataset size to seed and load.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Total requests per run.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=64,
+            help='Concurrent client threads.',
+        )
+        parser.add_argument(
+            '--mix', action='append', default=None,
+            help='Scenario and weight as name=weight (repeatable).',
+        )
+        parser.add_argument(
+            '--limits', choices=['on', 'off', 'both'], default='both',
+            help='Run with concurrency limits on, off, or both.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError(
+                f'This seeds and writes to the '
+                f'{benchmark.target_description()}. Run it against a '
+                'disposable environment and pass --yes.'
+            )
+        mix = parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        user = benchmark.seed(options['scale'], stdout=self.stdout)
+        modes = {'on': [True], 'off': [False], 'both': [False, True]}
+
+        runs = []
+        try:
+            for enabled in modes[options['limits']]:
+                with override_settings(
+                    DEBUG=False, ALLOWED_HOSTS=['testserver'],
+                    CONCURRENCY_LIMIT_ENABLED=enabled,
+                ):
+                    runs.append((enabled, benchmark.run_mixed(
+                        user, mix, options['requests'],
+                        options['concurrency'],
+                    )))
+        finally:
+            if not options['keep_data']:
+                benchmark.cleanup(options['scale'])
+
+        self.stdout.write(
+            f"{'limits':<8}{'scenario':<24}{'served':>8}{'shed':>8}"
+            f"{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for enabled, results in runs:
+            label = 'on' if enabled else 'off'
+            for name, result in results.items():
+                self.stdout.write(
+                    f"{label:<8}{name:<24}{result['served']:>8}"
+                    f"{result['shed']:>8}{result['errors']:>8}"
+                    f"{result['throughput']:>10.1f}"
+                    f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                )
@@ -0,0 +1,51 @@
+"""
+Django command to recompute tag and ingredient recipe counters.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import counters
+
+
+class Command(BaseCommand):
+    """Recompute recipe counters in batches and report drift."""
+    help = 'Recompute Tag and Ingredient recipe counts in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of objects checked per batch.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drift without writing corrections.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in counters.COUNTED_RELATIONS:
+            checked, drifted = 0, 0
+            last_id = 0
+            while True:
+                ids = list(
+                    model.objects.filter(id__gt=last_id)
+                    .order_by('id')
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                batch = model.objects.filter(id__in=ids)
+                if options['dry_run']:
+                    drift = list(counters.find_drift(model, batch))
+                else:
+                    drift = counters.repair_counts(model, batch)
+                checked += len(ids)
+                drifted += len(drift)
+
+            name = model._meta.verbose_name_plural
+            message = f'{name}: checked {checked}, drifted {drifted}'
+            if drifted:
+                self.stdout.write(self.style.WARNING(message))
+            else:
+                self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,92 @@
+"""
+Django command to run background job workers.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+
+def _worker(worker_id, stop, processed, options):
+    '''Process entry point: run jobs until asked to stop.'''
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stop.set())
+    try:
+        count = jobs.work(
+            worker_id,
+            stop=stop,
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            max_jobs=options['max_jobs'],
+            burst=options['burst'],
+        )
+    finally:
+        connections.close_all()
+    with processed.get_lock():
+        processed.value += count
+
+
+class Command(BaseCommand):
+    """Run a pool of job worker processes."""
+    help = 'Run background job workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Number of worker processes; 1 runs in this process.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1,
+            help='Jobs claimed per poll by each worker.',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Seconds between polls of an empty queue.',
+        )
+        parser.add_argument(
+            '--max-jobs', type=int, default=None,
+            help='Exit each worker after running this many jobs.',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once the queue has no ready jobs.',
+        )
+
+    def handle(self, *args, **options):
+        ctx = multiprocessing.get_context('fork')
+        stop = ctx.Event()
+        processed = ctx.Value('l', 0)
+        started = time.monotonic()
+        hostname = os.uname().nodename
+
+        if options['processes'] == 1:
+            _worker(f'{hostname}:{os.getpid()}', stop, processed, options)
+        else:
+            # Forked children must not share the parent's connections.
+            connections.close_all()
+            workers = [
+                ctx.Process(
+                    target=_worker,
+                    args=(f'{hostname}:{os.getpid()}:{index}', stop,
+                          processed, options),
+                )
+                for index in range(options['processes'])
+            ]
+            for worker in workers:
+                worker.start()
+
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stop.set())
+            for worker in workers:
+                worker.join()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed.value} jobs in {elapsed:.1f}s '
+            f'({processed.value / elapsed if elapsed else 0:.1f}/s).'
+        ))
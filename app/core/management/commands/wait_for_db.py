@@ -2,25 +2,73 @@
 Django command to wait for the database to be available.
 """
 
+import random
 import time
 
 from psycopg2 import OperationalError as psycopgeError
 
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+from core.health import pending_migrations, probe_database
+
 
 class Command(BaseCommand):
     """Django command to wait a database"""
+    initial_delay = 0.05
+    max_delay = 2.0
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to wait for.',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Give up after this many seconds.',
+        )
+        parser.add_argument(
+            '--migrations', action='store_true',
+            help='Also fail if migrations are not applied.',
+        )
+
+    def probe(self, database):
+        """Check the database answers a trivial query."""
+        probe_database(database)
 
     def handle(self, *args, **options):
+        database = options['database']
+        deadline = time.monotonic() + options['timeout']
+        delay = self.initial_delay
+
         self.stdout.write('Waiting for the database...')
-        db_up = False
-        while not db_up:
+        while True:
             try:
-                self.check(databases=['default'])
-                db_up = True
-            except(psycopgeError, OperationalError):
-                self.stdout.write('Database unavailable, Waiting 1 second...')
-                time.sleep(1)
+                self.probe(database)
+                break
+            except (psycopgeError, OperationalError):
+                connections[database].close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database unavailable after {options['timeout']}s."
+                    )
+                # Full jitter keeps restarting containers from retrying
+                # in lockstep.
+                sleep = min(random.uniform(0, delay), remaining)
+                self.stdout.write(
+                    f'Database unavailable, waiting {sleep:.2f} seconds...'
+                )
+                time.sleep(sleep)
+                delay = min(delay * 2, self.max_delay)
+
+        self.stdout.write(self.style.SUCCESS("Database availabel!"))
 
-        self.stdout.write(self.style.SUCCESS("Database availabel!"))
\ No newline at end of file
+        if options['migrations']:
+            pending = pending_migrations(database)
+            if pending:
+                raise CommandError(
+                    f'{len(pending)} unapplied migrations, e.g. {pending[0]}.'
+                )
+            self.stdout.write(self.style.SUCCESS('Migrations applied.'))
@@ -0,0 +1,181 @@
+'''
+In-process metrics exposed in the Prometheus text format.
+'''
+import threading
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+class Counter:
+    '''Monotonic counter keyed by label values.'''
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = (
+                self._values.get(label_values, 0) + amount
+            )
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Histogram:
+    '''Cumulative histogram keyed by label values.'''
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count))
+                     for labels, (counts, total, count)
+                     in self._series.items()]
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labels, label_values,
+                                      f'le="{bound}"'),
+                       cumulative)
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Registry:
+    '''Collection of metrics plus callbacks producing gauges on scrape.'''
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def add_collector(self, collector):
+        '''Register a callable returning [(name, help, labels, value)].'''
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        '''Return every metric in the Prometheus text format.'''
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+
+        seen = set()
+        for collector in self.collectors:
+            for name, help_text, labels, value in collector():
+                if name not in seen:
+                    lines.append(f'# HELP {name} {help_text}')
+                    lines.append(f'# TYPE {name} gauge')
+                    seen.add(name)
+                lines.append(
+                    f'{name}{_format_labels(labels, labels.values())} {value}'
+                )
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LABELS = ('route', 'method')
+
+requests_total = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status.',
+    ('route', 'method', 'status'),
+)
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Total request latency.',
+    REQUEST_LABELS,
+)
+request_db_duration = registry.histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL per request.',
+    REQUEST_LABELS,
+)
+request_db_queries = registry.histogram(
+    'http_request_db_queries', 'SQL queries per request.',
+    REQUEST_LABELS, buckets=QUERY_BUCKETS,
+)
+response_render_duration = registry.histogram(
+    'http_response_render_duration_seconds',
+    'Time spent serializing (rendering) the response body.',
+    REQUEST_LABELS,
+)
+
+
+@registry.add_collector
+def collect_pool_stats():
+    '''Expose database pool gauges for the pooled backend.'''
+    from core.db.pool import pool_stats
+
+    samples = []
+    for stats in pool_stats():
+        labels = {'alias': stats['alias'], 'database': stats['database']}
+        for key, value in stats.items():
+            if key not in labels:
+                samples.append((
+                    f'db_pool_{key}', f'Connection pool {key}.',
+                    labels, value,
+                ))
+    return samples
@@ -0,0 +1,113 @@
+'''
+Request middleware.
+'''
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from core import concurrency, metrics
+
+
+def route_name(request):
+    '''Return the URL name a request resolved to, for metric labels.'''
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class _QueryTimer:
+    '''execute_wrapper counting queries and their time.'''
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    '''Record per-route latency, SQL and rendering metrics.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = _QueryTimer()
+        request._metrics_render_seconds = 0.0
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        labels = (route_name(request), request.method)
+        metrics.requests_total.inc(labels + (str(response.status_code),))
+        metrics.request_duration.observe(labels, total)
+        metrics.request_db_queries.observe(labels, timer.queries)
+        metrics.request_db_duration.observe(labels, timer.seconds)
+        metrics.response_render_duration.observe(
+            labels, request._metrics_render_seconds
+        )
+
+        return response
+
+    def process_template_response(self, request, response):
+        start = time.perf_counter()
+
+        def record_render(rendered):
+            request._metrics_render_seconds = time.perf_counter() - start
+
+        response.add_post_render_callback(record_render)
+        return response
+
+
+class ConcurrencyLimitMiddleware:
+    '''Shed requests beyond the adaptive limit of their route class.'''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        admitted = getattr(request, '_concurrency_admitted', None)
+        if admitted is not None:
+            controller, name, start = admitted
+            controller.release(
+                name, time.perf_counter() - start,
+                failed=response.status_code >= 500,
+            )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.CONCURRENCY_LIMIT_ENABLED:
+            return None
+        name = concurrency.route_class(request.method, route_name(request))
+        if name is None:
+            return None
+
+        controller = concurrency.get_controller()
+        if not controller.acquire(name):
+            concurrency.requests_shed.inc((name,))
+            response = JsonResponse(
+                {'detail': 'Server is busy, please retry.'}, status=503,
+            )
+            response['Retry-After'] = str(settings.CONCURRENCY_RETRY_AFTER)
+            return response
+
+        request._concurrency_admitted = (
+            controller, name, time.perf_counter(),
+        )
+        return None
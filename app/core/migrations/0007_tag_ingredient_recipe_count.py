@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_recipe_counts(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tag'),
+                                   ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, f'{field_name}s').through
+        counts = through.objects.filter(
+            **{f'{field_name}_id': OuterRef('pk')}
+        ).order_by().values(f'{field_name}_id').annotate(
+            total=Count('id'),
+        ).values('total')
+        model.objects.update(
+            recipe_count=Coalesce(Subquery(counts), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            backfill_recipe_counts, migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:02
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()
+
+
+BATCH_SIZE = 2000
+
+
+def fill_normalized_names(model):
+    '''Set normalized_name in id-ordered batches of BATCH_SIZE rows.'''
+    last_id = 0
+    while True:
+        batch = list(
+            model.objects.filter(id__gt=last_id).order_by('id')
+            .only('id', 'name')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        for obj in batch:
+            obj.normalized_name = normalize_name(obj.name)
+        model.objects.bulk_update(batch, ['normalized_name'])
+        last_id = batch[-1].id
+
+
+def merge_duplicates(apps, schema_editor):
+    '''Fill normalized_name and fold duplicates into the oldest row.'''
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tag', 'tag'),
+                                   ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, f'{field_name}s').through
+        field = f'{field_name}_id'
+
+        fill_normalized_names(model)
+
+        # Only duplicated names are loaded, not the whole table.
+        groups = model.objects.order_by().values(
+            'user_id', 'normalized_name',
+        ).annotate(kept_id=Min('id'), rows=Count('id')).filter(rows__gt=1)
+        duplicates = {}
+        for group in groups:
+            rows = model.objects.filter(
+                user_id=group['user_id'],
+                normalized_name=group['normalized_name'],
+            ).exclude(id=group['kept_id'])
+            for duplicate_id in rows.values_list('id', flat=True):
+                duplicates[duplicate_id] = group['kept_id']
+
+        for duplicate_id, kept_id in duplicates.items():
+            links = through.objects.filter(**{field: duplicate_id})
+            links.filter(recipe_id__in=through.objects.filter(
+                **{field: kept_id}
+            ).values('recipe_id')).delete()
+            links.update(**{field: kept_id})
+        model.objects.filter(id__in=list(duplicates)).delete()
+
+        counts = through.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('id'),
+        ).values('total')
+        model.objects.filter(id__in=set(duplicates.values())).update(
+            recipe_count=Coalesce(Subquery(counts), Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill(apps, schema_editor):
+    '''Give every existing tag, ingredient and recipe a change entry.'''
+    User = apps.get_model('core', 'User')
+    Change = apps.get_model('core', 'Change')
+    ChangeSequence = apps.get_model('core', 'ChangeSequence')
+    kinds = (('tag', 'Tag'), ('ingredient', 'Ingredient'),
+             ('recipe', 'Recipe'))
+
+    for user_id in User.objects.order_by('id').values_list('id', flat=True):
+        entries = [
+            (kind, object_id)
+            for kind, model_name in kinds
+            for object_id in apps.get_model('core', model_name).objects
+            .filter(user_id=user_id).order_by('id')
+            .values_list('id', flat=True)
+        ]
+        Change.objects.bulk_create(
+            (Change(user_id=user_id, seq=seq, kind=kind, object_id=object_id)
+             for seq, (kind, object_id) in enumerate(entries, 1)),
+            batch_size=5000,
+        )
+        ChangeSequence.objects.create(user_id=user_id, last=len(entries))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='core.user')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='change',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='unique_change_seq_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='change',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'object_id'), name='unique_change_per_object'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
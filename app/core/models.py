@@ -7,6 +7,7 @@ import os
 from django.conf import settings
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import(
     AbstractBaseUser,
     BaseUserManager,
@@ -61,7 +62,7 @@ class Recipe(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete = models.CASCADE,
     )
-    title = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
@@ -70,17 +71,87 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
+    class Meta:
+        indexes = [
+            # Range filters and ordering within one user's recipes, with
+            # id as the stable tie-breaker.
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.title
 
 
+def normalize_name(name):
+    '''Return the form of a tag or ingredient name used for uniqueness.'''
+    return ' '.join(name.split()).casefold()
+
+
+class NamedObjectManager(models.Manager):
+    '''Manager for per-user objects unique by normalized name.'''
+
+    def upsert(self, user, names):
+        '''Return the user's objects for `names`, creating missing ones.
+
+        Missing objects are created with one INSERT ... ON CONFLICT DO
+        NOTHING, so concurrent writers neither duplicate rows nor fail on
+        each other, and are recorded in the user's change feed.
+        '''
+        from core import changes
+
+        normalized = {}
+        for name in names:
+            normalized.setdefault(normalize_name(name), name)
+        if not normalized:
+            return []
+
+        found = list(self.filter(user=user, normalized_name__in=normalized))
+        missing = normalized.keys() - {obj.normalized_name for obj in found}
+        if not missing:
+            return found
+
+        self.bulk_create(
+            [self.model(user=user, name=normalized[key], normalized_name=key)
+             for key in missing],
+            ignore_conflicts=True,
+        )
+        created = list(self.filter(user=user, normalized_name__in=missing))
+        changes.record(user.id, self.model, [obj.id for obj in created])
+        return found + created
+
+
 class Tag(models.Model):
     '''Tag object.'''
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(
+        max_length=255, editable=False, db_index=True,
+    )
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedObjectManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='unique_tag_name_per_user',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -89,10 +160,114 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     '''Ingredient object.'''
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(
+        max_length=255, editable=False, db_index=True,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = NamedObjectManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='unique_ingredient_name_per_user',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+
+class ChangeSequence(models.Model):
+    '''Last change sequence number handed out for a user.'''
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    last = models.BigIntegerField(default=0)
+
+
+class Change(models.Model):
+    '''Latest change to one synced object, kept as a tombstone if deleted.'''
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KIND_CHOICES = [
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # Serves `since` lookups as an index range scan.
+            models.UniqueConstraint(
+                fields=['user', 'seq'], name='unique_change_seq_per_user',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'object_id'],
+                name='unique_change_per_object',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} @{self.seq}'
+
+
+class Job(models.Model):
+    '''Deferred unit of work run by `manage.py run_workers`.'''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=QUEUED,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True)
+    locked_by = models.CharField(max_length=64, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Claim order of ready jobs; finished jobs are deleted.
+            models.Index(
+                fields=['-priority', 'run_at', 'id'],
+                name='job_ready_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(fields=['status', 'locked_at'], name='job_lock_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f'{self.name} #{self.id}'
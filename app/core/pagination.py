@@ -0,0 +1,119 @@
+'''
+Row counts that stay cheap on very large tables.
+
+An exact COUNT(*) scans every matching row. Below ESTIMATED_COUNT_THRESHOLD
+rows the count is exact, using a query bounded by LIMIT. Above it, on
+PostgreSQL the planner's statistics stand in: pg_class.reltuples for a
+whole table, or the row estimate of EXPLAIN for a filtered queryset.
+Elsewhere an exact count is taken and, given a cache key, reused.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator,
+)
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    '''Return the planner's row estimate, or None if unavailable.'''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+            # Tables never analyzed report -1 (PostgreSQL 14+) or 0.
+            if row and row[0] > 0:
+                return row[0]
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, threshold=None, cache_key=None):
+    '''Return (count, is_estimate) for `queryset`.'''
+    if threshold is None:
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    bounded = queryset.order_by().values('pk')[:threshold + 1].count()
+    if bounded <= threshold:
+        return bounded, False
+
+    estimate = estimate_count(queryset)
+    if estimate is not None:
+        return max(estimate, bounded), True
+    if cache_key is None:
+        return queryset.count(), False
+
+    count = cache.get(cache_key)
+    if count is None:
+        count = queryset.count()
+        cache.set(cache_key, count, settings.ESTIMATED_COUNT_CACHE_TIMEOUT)
+    return count, True
+
+
+class EstimatedPage(Page):
+    '''Page that knows whether more rows follow without a count.'''
+
+    def has_next(self):
+        if self.paginator.count_is_estimate:
+            return self.has_more
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator whose count is estimated above the exact-count threshold.
+
+    An estimate can be low, so pages are never cut short by it and later
+    pages stay reachable; `has_next` looks one row ahead instead.
+    '''
+
+    def __init__(self, *args, cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def _counted(self):
+        return count_rows(self.object_list, cache_key=self.cache_key)
+
+    @property
+    def count(self):
+        return self._counted[0]
+
+    @property
+    def count_is_estimate(self):
+        return self._counted[1]
+
+    def validate_number(self, number):
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if not self.count_is_estimate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
@@ -0,0 +1,152 @@
+'''
+Chunked deletion of users and recipes, bypassing the deletion collector.
+
+The collector loads every related row into memory and deletes it all in
+one long transaction. A purge instead deletes id-ordered batches, each in
+its own short transaction, and removes image files once a batch commits.
+'''
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from rest_framework.authtoken.models import Token
+
+from core import changes, counters, jobs, seeding
+from core.models import Change, Recipe, Tag, Ingredient
+
+
+logger = logging.getLogger(__name__)
+
+
+def _id_batches(queryset, batch_size):
+    '''Yield ascending lists of ids from `queryset`.'''
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def _raw_delete(queryset):
+    '''Delete rows with one DELETE, skipping signals and the collector.'''
+    return queryset._raw_delete(queryset.db)
+
+
+def _release_counts(recipe_ids):
+    '''Decrement the counters of everything linked to the recipes.'''
+    for model in counters.COUNTED_RELATIONS:
+        by_delta = defaultdict(list)
+        for obj_id, links in Counter(
+                counters.linked_ids(model, recipe_ids)).items():
+            by_delta[links].append(obj_id)
+        for links, ids in by_delta.items():
+            counters.adjust_counts(model, ids, -links)
+
+
+def _delete_files(paths):
+    for path in paths:
+        try:
+            default_storage.delete(path)
+        except OSError:
+            logger.warning('Could not delete purged file %s', path)
+
+
+def _record_tombstones(model, rows):
+    '''Record deletions from (user_id, id) rows.'''
+    by_user = defaultdict(list)
+    for user_id, obj_id in rows:
+        by_user[user_id].append(obj_id)
+    for user_id, ids in by_user.items():
+        changes.record(user_id, model, ids, deleted=True)
+
+
+def purge_recipe_batch(recipe_ids, tombstones=True):
+    '''Delete recipes and their links in one short transaction.'''
+    with transaction.atomic(), changes.batch():
+        rows = list(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'user_id', 'id', 'image'
+        ))
+        # Seeded recipes share one placeholder, which others still use.
+        images = [path for _, _, path in rows
+                  if path and not seeding.is_placeholder(path)]
+        if tombstones:
+            _record_tombstones(
+                Recipe, [(user_id, obj_id) for user_id, obj_id, _ in rows]
+            )
+        _release_counts(recipe_ids)
+        for model in counters.COUNTED_RELATIONS:
+            _raw_delete(counters.through_model(model).objects.filter(
+                recipe_id__in=recipe_ids
+            ))
+        _raw_delete(Recipe.objects.filter(id__in=recipe_ids))
+        transaction.on_commit(lambda: _delete_files(images))
+
+
+def purge_recipes(recipe_ids, batch_size=None):
+    '''Delete the given recipes in batches.'''
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), batch_size):
+        purge_recipe_batch(recipe_ids[start:start + batch_size])
+
+
+def purge_named_batch(model, ids, tombstones=True):
+    '''Delete tags or ingredients and their links in one transaction.'''
+    through = counters.through_model(model)
+    field = f'{counters.target_field(model)}_id'
+    with transaction.atomic(), changes.batch():
+        if tombstones:
+            changes.record_linked_recipes(model, ids)
+            _record_tombstones(model, model.objects.filter(
+                id__in=ids
+            ).values_list('user_id', 'id'))
+        _raw_delete(through.objects.filter(**{f'{field}__in': ids}))
+        _raw_delete(model.objects.filter(id__in=ids))
+
+
+def purge_queryset(queryset, batch_size=None):
+    '''Delete the recipes, tags or ingredients in `queryset` in batches.'''
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    model = queryset.model
+    for ids in _id_batches(queryset, batch_size):
+        if model is Recipe:
+            purge_recipe_batch(ids)
+        else:
+            purge_named_batch(model, ids)
+
+
+def purge_user(user_id, batch_size=None):
+    '''Delete a user and everything they own in bounded batches.'''
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    for ids in _id_batches(Recipe.objects.filter(user_id=user_id),
+                           batch_size):
+        purge_recipe_batch(ids, tombstones=False)
+    for model in (Tag, Ingredient):
+        for ids in _id_batches(model.objects.filter(user_id=user_id),
+                               batch_size):
+            purge_named_batch(model, ids, tombstones=False)
+    # Nobody is left to sync the feed.
+    for ids in _id_batches(Change.objects.filter(user_id=user_id),
+                           batch_size):
+        _raw_delete(Change.objects.filter(id__in=ids))
+
+    # Only small rows are left, so the collector is cheap from here.
+    Token.objects.filter(user_id=user_id).delete()
+    get_user_model().objects.filter(id=user_id).delete()
+
+
+def schedule_user_purge(user_id):
+    '''Queue a background purge of the user.'''
+    return jobs.enqueue(
+        'core.purge_user', {'user_id': user_id},
+        priority=settings.PURGE_JOB_PRIORITY,
+    )
@@ -0,0 +1,160 @@
+'''
+Prebuilt OpenAPI schema, served from memory with ETag and gzip.
+
+`manage.py build_schema` writes the schema to a JSON artifact named after
+the API version and the build. Processes load the artifact of their own
+build once, or generate the schema once if it is missing, and keep the
+rendered and compressed bodies in memory. With DEBUG on the schema is
+generated live on every request so view changes show up immediately.
+'''
+import gzip
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import django
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+import drf_spectacular
+import rest_framework
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+
+
+@lru_cache(maxsize=None)
+def code_fingerprint():
+    '''Return a hash of the application code and the schema libraries.'''
+    digest = hashlib.sha256()
+    for library in (django, rest_framework, drf_spectacular):
+        digest.update(f'{library.__name__}={library.__version__};'.encode())
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(
+            ('.', '__pycache__')
+        ))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(root, name)
+                digest.update(
+                    os.path.relpath(path, settings.BASE_DIR).encode()
+                )
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+
+    return digest.hexdigest()[:16]
+
+
+def artifact_path():
+    '''Return the artifact path for the API version and this build.'''
+    version = spectacular_settings.VERSION or 'unversioned'
+    build = settings.SCHEMA_BUILD_ID or code_fingerprint()
+    return os.path.join(
+        settings.SCHEMA_ARTIFACT_DIR, f'openapi-{version}-{build}.json'
+    )
+
+
+def generate_schema():
+    '''Generate the public schema by introspecting every view.'''
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    return generator.get_schema(request=None, public=True)
+
+
+def write_artifact(schema, path=None):
+    '''Write the schema artifact atomically and return its path.'''
+    path = path or artifact_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(schema, f, default=str)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_artifact(path=None):
+    '''Return the schema stored in the artifact, or None if missing.'''
+    try:
+        with open(path or artifact_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class _SchemaCache:
+    '''Process-wide cache of the schema and its rendered bodies.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.schema = None
+        self.bodies = {}
+
+    def get_schema(self):
+        with self._lock:
+            if self.schema is None:
+                self.schema = load_artifact() or generate_schema()
+            return self.schema
+
+    def get_body(self, renderer):
+        '''Return (body, gzipped body, etag) for a renderer.'''
+        key = renderer.media_type
+        with self._lock:
+            cached = self.bodies.get(key)
+        if cached is None:
+            body = renderer.render(self.get_schema(), renderer_context={})
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+            cached = (body, gzip.compress(body), etag)
+            with self._lock:
+                self.bodies[key] = cached
+        return cached
+
+
+schema_cache = _SchemaCache()
+
+
+def accepts_gzip(header):
+    '''Return True if an Accept-Encoding header allows gzip.'''
+    qualities = {}
+    for coding in header.split(','):
+        name, *params = coding.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    '''SpectacularAPIView serving a prebuilt schema.'''
+
+    def _get_schema_response(self, request):
+        if settings.DEBUG or request.GET.get('lang'):
+            return super()._get_schema_response(request)
+
+        body, gzipped, etag = schema_cache.get_body(request.accepted_renderer)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        elif accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = HttpResponse(
+                gzipped, content_type=request.accepted_media_type
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(
+                body, content_type=request.accepted_media_type
+            )
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+
+        return response
@@ -0,0 +1,192 @@
+'''
+Deterministic synthetic data generation using bulk inserts.
+
+Tag and ingredient reuse follows a Zipf distribution, so a few items
+appear in most recipes while most appear rarely, as in real collections.
+'''
+import io
+import itertools
+import random
+from decimal import Decimal
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from core import changes
+from core.models import Recipe, Tag, Ingredient, normalize_name
+
+
+TAG_WORDS = [
+    'Dinner', 'Lunch', 'Breakfast', 'Vegan', 'Vegetarian', 'Quick',
+    'Dessert', 'Spicy', 'Italian', 'Indian', 'Thai', 'Mexican', 'Healthy',
+    'Comfort', 'Baking', 'Snack', 'Gluten free', 'Party', 'Summer', 'Soup',
+]
+INGREDIENT_WORDS = [
+    'Salt', 'Pepper', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Egg',
+    'Flour', 'Sugar', 'Milk', 'Tomato', 'Rice', 'Chicken', 'Lemon',
+    'Ginger', 'Basil', 'Cheese', 'Potato', 'Carrot', 'Chili', 'Beans',
+    'Honey', 'Yogurt', 'Cumin', 'Coriander', 'Pasta', 'Spinach', 'Tofu',
+]
+TITLE_WORDS = [
+    'Roast', 'Stew', 'Curry', 'Salad', 'Bake', 'Pie', 'Stir fry', 'Tacos',
+    'Risotto', 'Bowl', 'Soup', 'Pancakes', 'Noodles', 'Skewers', 'Wraps',
+]
+
+
+def zipf_weights(size, exponent):
+    '''Return cumulative Zipf weights for ranks 1..size.'''
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+def sample_distinct(rng, population, cum_weights, count):
+    '''Draw up to `count` distinct items, favouring low ranks.'''
+    count = min(count, len(population))
+    chosen = set()
+    for _ in range(count * 4):
+        chosen.update(rng.choices(population, cum_weights=cum_weights,
+                                  k=count - len(chosen)))
+        if len(chosen) >= count:
+            break
+    return chosen
+
+
+def _names(words, count):
+    '''Return `count` distinct names built from a vocabulary.'''
+    return [
+        words[i % len(words)] + (f' {i // len(words) + 1}'
+                                 if i >= len(words) else '')
+        for i in range(count)
+    ]
+
+
+PLACEHOLDER_PREFIX = 'uploads/recipe/seed-placeholder-'
+
+
+def placeholder_image(seed):
+    '''Store one placeholder image shared by every seeded recipe.'''
+    path = f'{PLACEHOLDER_PREFIX}{seed}.jpg'
+    if not default_storage.exists(path):
+        image_file = io.BytesIO()
+        Image.new('RGB', (64, 64), (200, 120, 60)).save(
+            image_file, format='JPEG'
+        )
+        path = default_storage.save(path, image_file)
+    return path
+
+
+def is_placeholder(path):
+    '''Return True for the shared placeholder, which purges must keep.'''
+    return path.startswith(PLACEHOLDER_PREFIX)
+
+
+def seed_user(user, rng, recipes, tags, ingredients, exponent=1.1,
+              image=None, batch_size=5000):
+    '''Bulk insert one user's tags, ingredients, recipes and links.'''
+    tag_ranks = list(range(tags))
+    tag_weights = zipf_weights(tags, exponent)
+    ingredient_ranks = list(range(ingredients))
+    ingredient_weights = zipf_weights(ingredients, exponent)
+
+    # Plan links first so counters can be inserted already correct.
+    plan = [
+        (sample_distinct(rng, tag_ranks, tag_weights, rng.randint(1, 4)),
+         sample_distinct(rng, ingredient_ranks, ingredient_weights,
+                         rng.randint(3, 10)))
+        for _ in range(recipes)
+    ]
+    tag_counts = [0] * tags
+    ingredient_counts = [0] * ingredients
+    for recipe_tags, recipe_ingredients in plan:
+        for rank in recipe_tags:
+            tag_counts[rank] += 1
+        for rank in recipe_ingredients:
+            ingredient_counts[rank] += 1
+
+    Tag.objects.bulk_create(
+        (Tag(user=user, name=name, normalized_name=normalize_name(name),
+             recipe_count=count)
+         for name, count in zip(_names(TAG_WORDS, tags), tag_counts)),
+        batch_size=batch_size,
+    )
+    Ingredient.objects.bulk_create(
+        (Ingredient(user=user, name=name,
+                    normalized_name=normalize_name(name), recipe_count=count)
+         for name, count in zip(_names(INGREDIENT_WORDS, ingredients),
+                                ingredient_counts)),
+        batch_size=batch_size,
+    )
+    Recipe.objects.bulk_create(
+        (Recipe(
+            user=user,
+            title=f'{rng.choice(TITLE_WORDS)} {i}',
+            description='',
+            time_minutes=rng.randint(5, 180),
+            price=Decimal(rng.randint(100, 5000)) / 100,
+            image=image,
+        ) for i in range(recipes)),
+        batch_size=batch_size,
+    )
+
+    # Re-read ids: not every backend returns them from bulk inserts.
+    tag_ids = list(Tag.objects.filter(user=user).order_by('id')
+                   .values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.filter(user=user).order_by('id')
+                          .values_list('id', flat=True))
+    recipe_ids = Recipe.objects.filter(user=user).order_by('id').values_list(
+        'id', flat=True
+    )
+    TagLink = Recipe.tags.through
+    IngredientLink = Recipe.ingredients.through
+    TagLink.objects.bulk_create(
+        (TagLink(recipe_id=recipe_id, tag_id=tag_ids[rank])
+         for recipe_id, (recipe_tags, _) in zip(recipe_ids, plan)
+         for rank in recipe_tags),
+        batch_size=batch_size,
+    )
+    IngredientLink.objects.bulk_create(
+        (IngredientLink(recipe_id=recipe_id,
+                        ingredient_id=ingredient_ids[rank])
+         for recipe_id, (_, recipe_ingredients) in zip(recipe_ids, plan)
+         for rank in recipe_ingredients),
+        batch_size=batch_size,
+    )
+    changes.backfill_user(user.id, batch_size)
+
+
+def seed(users, recipes_per_user, tags_per_user=50,
+         ingredients_per_user=200, seed=0, prefix='seed', exponent=1.1,
+         images=False, batch_size=5000, password='password', stdout=None):
+    '''Create `users` users with their recipe collections.
+
+    The same arguments always produce the same data. Returns the users.
+    '''
+    rng = random.Random(seed)
+    User = get_user_model()
+    # Hash once: per-user hashing would dominate seeding time.
+    password_hash = make_password(password)
+    User.objects.bulk_create(
+        (User(email=f'{prefix}-{i}@example.com', name=f'User {i}',
+              password=password_hash) for i in range(users)),
+        batch_size=batch_size,
+    )
+    seeded = list(
+        User.objects.filter(email__startswith=f'{prefix}-').order_by('id')
+    )
+    image = placeholder_image(seed) if images else None
+
+    for index, user in enumerate(seeded):
+        with transaction.atomic():
+            seed_user(
+                user, rng, recipes_per_user, tags_per_user,
+                ingredients_per_user, exponent, image, batch_size,
+            )
+        if stdout is not None:
+            stdout.write(f'Seeded user {index + 1}/{len(seeded)}')
+
+    return seeded
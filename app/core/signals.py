@@ -0,0 +1,96 @@
+'''
+Signal handlers keeping denormalized data in sync.
+'''
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from core import changes, counters
+from core.models import Recipe, Tag, Ingredient
+
+
+COUNTED_THROUGH = {
+    counters.through_model(model): model
+    for model in counters.COUNTED_RELATIONS
+}
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    '''Keep Tag/Ingredient recipe counts exact when links change.'''
+    model = COUNTED_THROUGH[sender]
+    target = f'{counters.target_field(model)}_id'
+
+    if action == 'post_add':
+        # pk_set only holds links that were actually inserted.
+        if reverse:
+            counters.adjust_counts(model, [instance.pk], len(pk_set))
+        else:
+            counters.adjust_counts(model, pk_set, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        # Removal and clear run in a transaction, so counting the
+        # existing links up front stays exact.
+        links = sender.objects.all()
+        if reverse:
+            links = links.filter(**{target: instance.pk})
+            if pk_set is not None:
+                links = links.filter(recipe_id__in=pk_set)
+            counters.adjust_counts(model, [instance.pk], -links.count())
+        else:
+            links = links.filter(recipe_id=instance.pk)
+            if pk_set is not None:
+                links = links.filter(**{f'{target}__in': pk_set})
+            counters.adjust_counts(
+                model, links.values_list(target, flat=True), -1
+            )
+
+
+@receiver(pre_delete, sender=Recipe)
+def release_recipe_counts(sender, instance, **kwargs):
+    '''Decrement counters for the links a deleted recipe takes with it.'''
+    for model in counters.COUNTED_RELATIONS:
+        counters.adjust_counts(
+            model, counters.linked_ids(model, [instance.pk]), -1
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def record_save(sender, instance, **kwargs):
+    changes.record(instance.user_id, sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_delete(sender, instance, **kwargs):
+    changes.record(instance.user_id, sender, [instance.pk], deleted=True)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def record_link_change(sender, instance, action, reverse, pk_set,
+                       **kwargs):
+    '''Record recipes whose tags or ingredients changed.'''
+    if action == 'pre_clear' and reverse:
+        changes.record_linked_recipes(type(instance), [instance.pk])
+    elif action == 'post_clear' and not reverse:
+        changes.record(instance.user_id, Recipe, [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        recipe_ids = pk_set if reverse else [instance.pk]
+        changes.record(instance.user_id, Recipe, recipe_ids)
+
+
+@receiver(post_delete, sender=get_user_model())
+def forget_user_changes(sender, instance, **kwargs):
+    '''Drop the feed of a deleted user.
+
+    Deleting a user deletes their objects after their feed, and recording
+    those deletions would recreate rows pointing at the gone user.
+    '''
+    changes.forget_user(instance.pk)
@@ -0,0 +1,157 @@
+'''
+In-process coalescing of identical concurrent requests.
+
+Clients often send the same list request several times at once. For
+handlers run through CoalescingMixin.coalesce, the first such request
+runs the handler and renders the body. Identical requests that arrive
+while it runs wait for it and get a copy of the same status, headers and
+body, instead of running the query and serializer again. Only requests
+that overlap in time are coalesced; nothing is cached afterwards.
+
+Requests are identical when they share the user, path, normalized query
+parameters, negotiated media type and any `coalesce_scope()` parts. A
+waiter that gives up after SINGLEFLIGHT_TIMEOUT seconds runs the view on
+its own. Errors are shared like results: API errors as the rendered
+error response, and unexpected exceptions are raised in every waiter.
+'''
+import threading
+import time
+
+from django.conf import settings
+
+from rest_framework.response import Response
+
+from core.metrics import registry
+
+
+coalesced_requests = registry.counter(
+    'singleflight_requests_total',
+    'Coalescable requests by outcome (leader, shared or timeout).',
+    ('outcome',),
+)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class Group:
+    '''Run at most one call per key at a time and share its outcome.'''
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, timeout=None):
+        '''Return (func(), outcome), joining a running call for `key`.
+
+        `outcome` is 'leader' if this caller ran `func`, 'shared' if it
+        got another caller's result, and 'timeout' if it waited longer
+        than `timeout` seconds and then ran `func` itself.
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+
+        if leader:
+            try:
+                call.result = func()
+            except BaseException as exc:
+                call.error = exc
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, 'leader'
+
+        if not call.done.wait(timeout):
+            return func(), 'timeout'
+        if call.error is not None:
+            raise call.error
+        return call.result, 'shared'
+
+    def waiters(self, key):
+        '''Return how many callers wait on the running call for `key`.'''
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call is not None else 0
+
+
+group = Group()
+
+
+def normalize_params(params):
+    '''Return query parameters in a canonical, order-insensitive form.'''
+    return tuple(
+        (name, tuple(sorted(
+            part for value in params.getlist(name)
+            for part in value.split(',')
+        )))
+        for name in sorted(params)
+    )
+
+
+class CoalescingMixin:
+    '''Let viewset handlers share work with identical concurrent requests.'''
+
+    def coalesce_scope(self):
+        '''Return extra key parts, such as a data version.'''
+        return ()
+
+    def get_coalesce_key(self):
+        request = self.request
+        return (
+            request.user.pk,
+            request.path,
+            normalize_params(request.query_params),
+            request.accepted_media_type,
+            *self.coalesce_scope(),
+        )
+
+    def coalesce(self, handler, request, *args, **kwargs):
+        '''Return handler(request, ...), run once per identical request.'''
+        if not settings.SINGLEFLIGHT_ENABLED:
+            return handler(request, *args, **kwargs)
+
+        def render():
+            try:
+                response = handler(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+            start = time.perf_counter()
+            response.render()
+            request._request._metrics_render_seconds = (
+                time.perf_counter() - start
+            )
+            return (
+                response.status_code, getattr(response, 'data', None),
+                response.content, list(response.items()),
+            )
+
+        (status, data, content, headers), outcome = group.do(
+            self.get_coalesce_key(), render, settings.SINGLEFLIGHT_TIMEOUT,
+        )
+        coalesced_requests.inc((outcome,))
+
+        # Each request gets its own response, since middleware may change
+        # it, but they all carry the body rendered once.
+        response = Response(data, status=status)
+        response.content = content
+        for name, value in headers:
+            response[name] = value
+        return response
@@ -0,0 +1,192 @@
+'''
+ASGI server-sent event stream of a user's change notifications.
+
+GET EVENTS_PATH with `Authorization: Token <key>`, or `?token=<key>` for
+browser EventSource clients, which cannot set headers. The stream starts
+with a `ready` event carrying the user's current sync cursor, followed
+by a `change` event after each committed write and a `resync` event when
+notifications were lost. Every event's id is its cursor. Comment lines
+keep idle connections open through proxies.
+
+A client pulls /api/recipe/sync/ from its own cursor whenever the stream
+announces a newer one than it has seen. It does not need to poll.
+
+Idle streams cost one small task and queue each, and no thread, so a
+worker can hold thousands of them. Slow clients are handled by the
+bounded queues of core.events and by waiting on the server to send.
+'''
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from rest_framework.authtoken.models import Token
+
+from core import events
+from core.models import ChangeSequence
+
+
+def _token(scope):
+    '''Return the token key sent in the headers or query string.'''
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            keyword, _, key = value.decode('latin-1').partition(' ')
+            if keyword == 'Token':
+                return key.strip()
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('token', [None])[0]
+
+
+def _in_thread(func):
+    '''Run database code in a thread, with Django's connection handling.'''
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+@_in_thread
+def _authenticate(key):
+    '''Return the id of the active user owning the token, or None.'''
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user_id
+
+
+@_in_thread
+def _current_cursor(user_id):
+    return ChangeSequence.objects.filter(user_id=user_id).values_list(
+        'last', flat=True
+    ).first() or 0
+
+
+def format_event(event, data):
+    '''Encode one server-sent event.'''
+    return (
+        f'id: {data["cursor"]}\nevent: {event}\n'
+        f'data: {json.dumps(data, separators=(",", ":"))}\n\n'
+    ).encode()
+
+
+async def _respond(send, status, detail, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), *headers],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': json.dumps({'detail': detail}).encode(),
+    })
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _stream(subscription, receive, send):
+    '''Send queued events and heartbeats until the client goes away.'''
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    get = None
+    try:
+        while True:
+            if get is None:
+                get = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {get, disconnect}, timeout=settings.EVENTS_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                return
+            if get in done:
+                body = format_event(*get.result())
+                get = None
+            else:
+                body = b': keepalive\n\n'
+            # Waits while the client's socket buffer is full.
+            await send({
+                'type': 'http.response.body', 'body': body, 'more_body': True,
+            })
+    finally:
+        for task in (get, disconnect):
+            if task is not None:
+                task.cancel()
+
+
+async def event_stream(scope, receive, send):
+    '''ASGI application streaming the authenticated user's notifications.'''
+    if scope['method'] != 'GET':
+        return await _respond(
+            send, 405, f'Method "{scope["method"]}" not allowed.',
+            [(b'allow', b'GET')],
+        )
+
+    key = _token(scope)
+    user_id = await _authenticate(key) if key else None
+    if user_id is None:
+        return await _respond(
+            send, 401, 'Invalid token.', [(b'www-authenticate', b'Token')],
+        )
+
+    broker = events.get_broker()
+    if broker.connections() >= settings.EVENTS_MAX_CONNECTIONS:
+        return await _respond(
+            send, 503, 'Too many open event streams.',
+            [(b'retry-after', str(settings.EVENTS_RETRY_AFTER).encode())],
+        )
+
+    events.get_backend().start()
+    # Subscribe before reading the cursor, so no write falls in between.
+    subscription = broker.subscribe(user_id, settings.EVENTS_QUEUE_SIZE)
+    try:
+        cursor = await _current_cursor(user_id)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': format_event('ready', {'cursor': cursor}),
+            'more_body': True,
+        })
+        await _stream(subscription, receive, send)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class EventStreamRouter:
+    '''Serve EVENTS_PATH as an event stream and the rest with Django.'''
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['path'] == settings.EVENTS_PATH:
+            return await event_stream(scope, receive, send)
+        return await self.application(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await sync_to_async(events.reset)()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -0,0 +1,9 @@
+'''
+Background job handlers for the core app.
+'''
+from core import jobs, purge
+
+
+@jobs.task('core.purge_user')
+def purge_user(user_id):
+    purge.purge_user(user_id)
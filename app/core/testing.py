@@ -0,0 +1,231 @@
+'''
+Test runner that enforces per-endpoint SQL query budgets.
+
+Every APIClient request made from a guarded test module is recorded.
+A test fails when a request issues more queries than its endpoint's
+budget, or repeats one query shape often enough to look like an N+1.
+'''
+import contextlib
+import json
+import re
+import sys
+import unittest
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+from rest_framework.test import APIClient
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'IN \((?:\?|%s)(?:, (?:\?|%s))*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    '''A test issued more queries than its endpoints allow.'''
+
+
+def query_shape(sql):
+    '''Return `sql` with literals and IN lists collapsed.'''
+    shape = _LITERALS.sub('?', sql)
+    shape = _IN_LISTS.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def repeated_shapes(queries, threshold):
+    '''Return SELECT shapes issued at least `threshold` times.'''
+    shapes = Counter(
+        query_shape(sql) for sql in queries
+        if sql.lstrip().upper().startswith('SELECT')
+    )
+    return {
+        shape: count for shape, count in shapes.items() if count >= threshold
+    }
+
+
+def view_name(response):
+    '''Return the URL name the response was resolved from.'''
+    try:
+        return response.resolver_match.view_name
+    except Exception:
+        return None
+
+
+class QueryGuard:
+    '''Record queries per request and check them against budgets.'''
+
+    def __init__(self, modules, budgets, default_budget, repeat_threshold):
+        self.modules = tuple(modules)
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self.repeat_threshold = repeat_threshold
+        self.test = None
+        self.requests = []
+        self.totals = defaultdict(int)
+        self.violations = defaultdict(list)
+
+    def guards(self, test):
+        return type(test).__module__.startswith(self.modules)
+
+    def start_test(self, test):
+        self.test = test if self.guards(test) else None
+
+    def stop_test(self, test):
+        self.test = None
+        return self.violations.pop(test.id(), [])
+
+    def budget(self, method, name):
+        '''Return the budget for `method` on URL `name`.'''
+        for key in (f'{method} {name}', name):
+            if key in self.budgets:
+                return self.budgets[key]
+        return self.default_budget
+
+    def record(self, method, path, response, queries):
+        '''Store one request and note any budget violation.'''
+        name = view_name(response)
+        budget = self.budget(method, name)
+        repeated = repeated_shapes(queries, self.repeat_threshold)
+        entry = {
+            'test': self.test.id(),
+            'view': name,
+            'method': method,
+            'path': path,
+            'queries': len(queries),
+            'budget': budget,
+            'repeated': [
+                {'shape': shape, 'count': count}
+                for shape, count in sorted(
+                    repeated.items(), key=lambda item: -item[1]
+                )
+            ],
+        }
+        self.requests.append(entry)
+        self.totals[self.test.id()] += len(queries)
+
+        problems = []
+        if len(queries) > budget:
+            problems.append(f'{len(queries)} queries, budget {budget}')
+        for shape, count in repeated.items():
+            problems.append(f'{count}x repeated query: {shape}')
+        if problems:
+            self.violations[self.test.id()].append(
+                f'{method} {path} ({name}): ' + '; '.join(problems)
+            )
+
+    def report(self, limit=20):
+        '''Return the worst requests and tests by query count.'''
+        worst = sorted(
+            self.requests,
+            key=lambda entry: (
+                -max([r['count'] for r in entry['repeated']], default=0),
+                -entry['queries'],
+            ),
+        )
+        return {
+            'requests': len(self.requests),
+            'worst_requests': worst[:limit],
+            'worst_tests': [
+                {'test': test, 'queries': total}
+                for test, total in sorted(
+                    self.totals.items(), key=lambda item: -item[1]
+                )[:limit]
+            ],
+        }
+
+    @contextlib.contextmanager
+    def patch_client(self):
+        '''Route APIClient requests through the recorder.'''
+        original = APIClient.request
+        guard = self
+
+        def request(client, **kwargs):
+            if guard.test is None:
+                return original(client, **kwargs)
+            queries = []
+
+            def recorder(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = original(client, **kwargs)
+            guard.record(
+                kwargs.get('REQUEST_METHOD', 'GET'),
+                kwargs.get('PATH_INFO', ''),
+                response,
+                queries,
+            )
+            return response
+
+        APIClient.request = request
+        try:
+            yield
+        finally:
+            APIClient.request = original
+
+
+def budget_result_class(base, guard):
+    '''Return a result class that fails tests with budget violations.'''
+
+    class QueryBudgetResult(base):
+
+        def startTest(self, test):
+            guard.start_test(test)
+            super().startTest(test)
+
+        def addSuccess(self, test):
+            violations = guard.stop_test(test)
+            if not violations:
+                return super().addSuccess(test)
+            try:
+                raise QueryBudgetExceeded('\n'.join(violations))
+            except QueryBudgetExceeded:
+                self.addFailure(test, sys.exc_info())
+
+        def stopTest(self, test):
+            guard.stop_test(test)
+            super().stopTest(test)
+
+    return QueryBudgetResult
+
+
+class QueryBudgetRunner(DiscoverRunner):
+    '''DiscoverRunner with query budgets on guarded API tests.'''
+
+    def __init__(self, query_report=None, **kwargs):
+        super().__init__(**kwargs)
+        self.query_report = query_report or getattr(
+            settings, 'QUERY_BUDGET_REPORT', None
+        )
+        self.guard = QueryGuard(
+            settings.QUERY_BUDGET_MODULES,
+            settings.QUERY_BUDGETS,
+            settings.QUERY_BUDGET_DEFAULT,
+            settings.QUERY_BUDGET_REPEAT_THRESHOLD,
+        )
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--query-report',
+            help='Write a JSON report of the heaviest API requests here.',
+        )
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or unittest.TextTestResult
+        return budget_result_class(base, self.guard)
+
+    def run_suite(self, suite, **kwargs):
+        with self.guard.patch_client():
+            result = super().run_suite(suite, **kwargs)
+        if self.query_report:
+            with open(self.query_report, 'w') as report:
+                json.dump(self.guard.report(), report, indent=2)
+        return result
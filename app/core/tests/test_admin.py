@@ -2,10 +2,20 @@
 Test from django admin modifications.
 '''
 
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core import pagination
+from core.models import Recipe, Tag
+
 
 class AdminSiteTest(TestCase):
     '''Tests for django admin.'''
@@ -41,4 +51,199 @@ class AdminSiteTest(TestCase):
         url = reverse('admin:core_user_add')
         res = self.client.get(url)
 
-        self.assertEqual(res.status_code, 200)
\ No newline at end of file
+        self.assertEqual(res.status_code, 200)
+
+
+class RecipeAdminTests(TestCase):
+    '''Tests for the recipe, tag and ingredient admin pages.'''
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='adminpass'
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='userpass',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipes = [self._recipe(f'Soup {i}') for i in range(3)]
+
+    def _recipe(self, title):
+        recipe = Recipe.objects.create(
+            user=self.user, title=title, time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        recipe.tags.add(self.tag)
+        return recipe
+
+    def _changelist(self, model, **params):
+        return self.client.get(
+            reverse(f'admin:core_{model}_changelist'), params
+        )
+
+    def test_changelist_queries_do_not_grow(self):
+        with CaptureQueriesContext(connection) as few:
+            self._changelist('recipe')
+        for i in range(5):
+            self._recipe(f'Stew {i}')
+        with CaptureQueriesContext(connection) as many:
+            res = self._changelist('recipe')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(many), len(few))
+
+    def test_change_pages(self):
+        for url in (
+            reverse('admin:core_recipe_change', args=[self.recipes[0].id]),
+            reverse('admin:core_tag_change', args=[self.tag.id]),
+            reverse('admin:core_ingredient_add'),
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_search_by_title_prefix(self):
+        self._recipe('Bread')
+
+        res = self._changelist('recipe', q='Bre')
+
+        self.assertEqual(res.context['cl'].result_count, 1)
+
+    def test_search_by_id_and_email(self):
+        res = self._changelist('recipe', q=str(self.recipes[1].id))
+        self.assertEqual(
+            list(res.context['cl'].queryset), [self.recipes[1]]
+        )
+
+        res = self._changelist('recipe', q='user@example.com')
+        self.assertEqual(res.context['cl'].result_count, 3)
+
+    def test_search_tag_by_normalized_prefix(self):
+        res = self._changelist('tag', q='VEG')
+
+        self.assertEqual(list(res.context['cl'].queryset), [self.tag])
+
+    def test_delete_action_asks_for_confirmation(self):
+        res = self.client.post(reverse('admin:core_recipe_changelist'), {
+            'action': 'purge_selected',
+            '_selected_action': [r.id for r in self.recipes[:2]],
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTemplateUsed(
+            res, 'admin/core/purge_selected_confirmation.html'
+        )
+        self.assertEqual(res.context['count'], 2)
+        self.assertContains(res, 'delete 2 recipes?')
+        self.assertContains(res, 'name="post" value="yes"')
+        self.assertNotContains(res, 'Soup 0')
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_delete_confirmation_keeps_select_across(self):
+        res = self.client.post(reverse('admin:core_recipe_changelist'), {
+            'action': 'purge_selected',
+            'select_across': '1',
+            '_selected_action': [self.recipes[0].id],
+        })
+
+        self.assertEqual(res.context['count'], 3)
+        self.assertContains(res, 'name="select_across" value="1"')
+
+    def test_delete_action_is_set_based(self):
+        res = self.client.post(reverse('admin:core_recipe_changelist'), {
+            'action': 'purge_selected',
+            'post': 'yes',
+            '_selected_action': [r.id for r in self.recipes[:2]],
+        })
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(Recipe.objects.all()), [self.recipes[2]])
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+
+    def test_stock_delete_action_removed(self):
+        res = self._changelist('tag')
+
+        actions = [name for name, _ in res.context['action_form']
+                   .fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)
+        self.assertIn('purge_selected', actions)
+
+
+class EstimatedCountTests(TestCase):
+    '''Tests for estimated row counts.'''
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='userpass',
+        )
+        for i in range(5):
+            Tag.objects.create(user=user, name=f'Tag {i}')
+
+    def test_exact_below_threshold(self):
+        self.assertEqual(
+            pagination.count_rows(Tag.objects.all(), threshold=10), (5, False)
+        )
+
+    def test_exact_without_planner_statistics(self):
+        self.assertEqual(
+            pagination.count_rows(Tag.objects.all(), threshold=2), (5, False)
+        )
+
+    @patch('core.pagination.estimate_count', return_value=4000)
+    def test_estimate_above_threshold(self, patched_estimate):
+        self.assertEqual(
+            pagination.count_rows(Tag.objects.all(), threshold=2),
+            (4000, True),
+        )
+
+    @patch('core.pagination.estimate_count', return_value=4000)
+    def test_paginator_uses_estimate(self, patched_estimate):
+        with self.settings(ESTIMATED_COUNT_THRESHOLD=2):
+            paginator = pagination.EstimatedCountPaginator(
+                Tag.objects.order_by('id'), 2
+            )
+
+            self.assertEqual(paginator.count, 4000)
+            self.assertEqual(len(paginator.page(1)), 2)
+
+    @patch('core.pagination.estimate_count', return_value=3)
+    def test_low_estimate_keeps_pages_whole(self, patched_estimate):
+        with self.settings(ESTIMATED_COUNT_THRESHOLD=2):
+            paginator = pagination.EstimatedCountPaginator(
+                Tag.objects.order_by('id'), 2
+            )
+            last = paginator.page(3)
+
+            self.assertEqual(paginator.count, 3)
+            self.assertEqual(len(paginator.page(2)), 2)
+            self.assertTrue(paginator.page(2).has_next())
+            self.assertEqual(len(last), 1)
+            self.assertFalse(last.has_next())
+
+    def test_cached_count_without_planner_statistics(self):
+        cache.clear()
+        queryset = Tag.objects.all()
+        self.assertEqual(
+            pagination.count_rows(queryset, threshold=2, cache_key='k'),
+            (5, True),
+        )
+        Tag.objects.filter(name='Tag 0').delete()
+
+        self.assertEqual(
+            pagination.count_rows(queryset, threshold=2, cache_key='k'),
+            (5, True),
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL.')
+    def test_planner_estimate(self):
+        estimate = pagination.estimate_count(
+            Tag.objects.filter(name__startswith='Tag')
+        )
+
+        self.assertIsInstance(estimate, int)
+
+    def test_no_estimate_without_postgresql(self):
+        if connection.vendor != 'postgresql':
+            self.assertIsNone(pagination.estimate_count(Tag.objects.all()))
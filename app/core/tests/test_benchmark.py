@@ -0,0 +1,152 @@
+'''
+Tests for the benchmark suite.
+'''
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import benchmark
+from core.models import Recipe
+
+
+def result(p99_ms=10.0, throughput=100.0, queries=3):
+    return {
+        'requests': 10, 'errors': 0, 'throughput': throughput,
+        'p50_ms': 5.0, 'p99_ms': p99_ms, 'queries_per_request': queries,
+    }
+
+
+class CompareTests(SimpleTestCase):
+    '''Tests for baseline comparison.'''
+
+    def test_within_threshold(self):
+        regressions = benchmark.compare(
+            {'list': result(p99_ms=11.0, throughput=90.0)},
+            {'list': result()},
+            threshold=0.2,
+        )
+
+        self.assertEqual(regressions, [])
+
+    def test_regressions_reported(self):
+        regressions = benchmark.compare(
+            {'list': result(p99_ms=20.0, throughput=50.0, queries=4)},
+            {'list': result()},
+            threshold=0.2,
+        )
+
+        self.assertEqual(len(regressions), 3)
+
+
+class RunScenarioTests(SimpleTestCase):
+    '''Tests for running one scenario.'''
+
+    @patch.object(benchmark, 'BARRIER_TIMEOUT', 30)
+    def test_failed_burst_request_releases_others(self):
+        calls = itertools.count()
+
+        def request(client, step):
+            if next(calls) == 0:
+                raise RuntimeError('Request failed.')
+            return HttpResponse()
+
+        scenario = benchmark.Scenario('list', 'get', '/')
+        scenario.request = request
+        start = time.monotonic()
+
+        with self.assertRaises((RuntimeError, threading.BrokenBarrierError)):
+            benchmark.run_scenario(scenario, 'token', 8, 1, burst=4)
+
+        self.assertLess(time.monotonic() - start, 5)
+
+
+@patch.dict(benchmark.SCALES, {'test': (2, 5)})
+class BenchmarkCommandTests(TestCase):
+    '''Tests for the benchmark command.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.baseline = os.path.join(self.tmpdir.name, 'baseline.json')
+
+    def _run(self, **options):
+        out = StringIO()
+        options.setdefault('yes', True)
+        call_command(
+            'benchmark', scale='test', requests=2, concurrency=1,
+            baseline=self.baseline, stdout=out, **options,
+        )
+        return out.getvalue()
+
+    def test_every_endpoint_benchmarked(self):
+        self._run(save_baseline=True, keep_data=True)
+
+        with open(self.baseline) as f:
+            results = json.load(f)
+        # Seeded, plus two each from the create and upload scenarios.
+        self.assertEqual(Recipe.objects.count(), 2 * 5 + 4)
+        self.assertEqual(
+            set(results),
+            {s.name for s in benchmark.build_scenarios(
+                benchmark.seed('test'))},
+        )
+        for name, data in results.items():
+            self.assertEqual(data['errors'], 0, name)
+
+    def test_confirmation_required(self):
+        with self.assertRaisesMessage(CommandError, '--yes'):
+            self._run(yes=False)
+
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_seeded_data_purged(self):
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._run(scenario=['recipe-upload-image', 'user-create'],
+                          save_baseline=True)
+
+            files = [name for _, _, names in os.walk(media) for name in names]
+
+        self.assertEqual(files, [])
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_missing_baseline_fails(self):
+        with self.assertRaisesMessage(CommandError, '--save-baseline'):
+            self._run(scenario=['recipe-list'])
+
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_regression_fails(self):
+        self._run(scenario=['recipe-list'], save_baseline=True)
+        with open(self.baseline) as f:
+            results = json.load(f)
+        results['recipe-list']['queries_per_request'] = 0
+        with open(self.baseline, 'w') as f:
+            json.dump(results, f)
+
+        with self.assertRaises(CommandError):
+            self._run(scenario=['recipe-list'])
+
+    @patch('core.benchmark.run_scenario', return_value=result())
+    def test_bursts_only_send_reads(self, patched_run):
+        self._run(burst=4, save_baseline=True)
+
+        scenarios = [call.args[0] for call in patched_run.call_args_list]
+        self.assertTrue(scenarios)
+        self.assertEqual({s.method for s in scenarios}, {'get'})
+        self.assertEqual(
+            {call.args[4] for call in patched_run.call_args_list}, {4}
+        )
@@ -0,0 +1,182 @@
+'''
+Tests for the per-user change feed.
+'''
+import random
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from core import changes, purge, seeding
+from core.models import Change, ChangeSequence, Recipe, Tag, Ingredient
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email, 'testpass')
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 5,
+        'price': Decimal('1.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def feed(user):
+    '''Return the user's feed as (seq, kind, object_id, deleted) tuples.'''
+    return list(Change.objects.filter(user=user).order_by('seq').values_list(
+        'seq', 'kind', 'object_id', 'deleted'
+    ))
+
+
+class ChangeFeedTests(TestCase):
+    '''Tests for recording changes.'''
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_record_numbers_per_user(self):
+        other = create_user('other@example.com')
+
+        changes.record(self.user.id, Recipe, [1, 2])
+        changes.record(other.id, Recipe, [3])
+        changes.record(self.user.id, Tag, [4])
+
+        self.assertEqual(feed(self.user), [
+            (1, 'recipe', 1, False),
+            (2, 'recipe', 2, False),
+            (3, 'tag', 4, False),
+        ])
+        self.assertEqual(feed(other), [(1, 'recipe', 3, False)])
+        self.assertEqual(
+            ChangeSequence.objects.get(user=self.user).last, 3
+        )
+
+    def test_latest_change_replaces_earlier(self):
+        changes.record(self.user.id, Recipe, [1, 2])
+
+        changes.record(self.user.id, Recipe, [1], deleted=True)
+
+        self.assertEqual(feed(self.user), [
+            (2, 'recipe', 2, False),
+            (3, 'recipe', 1, True),
+        ])
+
+    def test_batch_writes_once_at_end(self):
+        with transaction.atomic(), changes.batch():
+            changes.record(self.user.id, Recipe, [1])
+            changes.record(self.user.id, Tag, [2])
+            changes.record(self.user.id, Recipe, [1], deleted=True)
+            self.assertEqual(feed(self.user), [])
+
+        self.assertEqual(feed(self.user), [
+            (1, 'tag', 2, False),
+            (2, 'recipe', 1, True),
+        ])
+
+    def test_batch_discarded_on_error(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic(), changes.batch():
+                changes.record(self.user.id, Recipe, [1])
+                raise ValueError
+
+        self.assertEqual(feed(self.user), [])
+
+    @patch.dict(connection.settings_dict, {'ATOMIC_REQUESTS': True})
+    def test_handled_error_in_view_records_nothing(self):
+        class FailingView(changes.RecordChangesMixin, APIView):
+            def post(self, request):
+                create_recipe(request.user)
+                raise ValidationError('Rejected.')
+
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, user=self.user)
+
+        res = FailingView.as_view()(request)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(feed(self.user), [])
+
+    def test_signals_record_saves_links_and_deletes(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag)
+        self.assertEqual(feed(self.user), [
+            (1, 'tag', tag.id, False),
+            (3, 'recipe', recipe.id, False),
+        ])
+
+        recipe_id = recipe.id
+        recipe.delete()
+
+        self.assertEqual(feed(self.user)[-1], (4, 'recipe', recipe_id, True))
+
+    def test_linked_recipes_recorded(self):
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        linked = create_recipe(self.user)
+        create_recipe(self.user)
+        linked.ingredients.add(ingredient)
+
+        changes.record_linked_recipes(Ingredient, [ingredient.id])
+
+        self.assertEqual(feed(self.user)[-1][1:], ('recipe', linked.id, False))
+
+    def test_upsert_records_created_objects_only(self):
+        existing = Tag.objects.create(user=self.user, name='Vegan')
+
+        Tag.objects.upsert(self.user, ['vegan', 'Quick'])
+
+        created = Tag.objects.get(name='Quick')
+        self.assertEqual(feed(self.user), [
+            (1, 'tag', existing.id, False),
+            (2, 'tag', created.id, False),
+        ])
+
+    def test_purge_records_tombstones(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = create_recipe(self.user)
+        kept = create_recipe(self.user)
+        kept.tags.add(tag)
+
+        purge.purge_recipes([recipe.id])
+        purge.purge_queryset(Tag.objects.filter(id=tag.id))
+
+        self.assertEqual(feed(self.user)[-3:], [
+            (5, 'recipe', recipe.id, True),
+            (6, 'tag', tag.id, True),
+            (7, 'recipe', kept.id, False),
+        ])
+
+    def test_deleting_user_drops_feed(self):
+        create_recipe(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(Change.objects.exists())
+        self.assertFalse(ChangeSequence.objects.exists())
+
+    def test_purge_user_drops_feed(self):
+        create_recipe(self.user)
+
+        purge.purge_user(self.user.id)
+
+        self.assertFalse(Change.objects.exists())
+
+    def test_seeded_users_have_feed(self):
+        user = create_user('seeded@example.com')
+        seeding.seed_user(user, random.Random(0), 3, 2, 4)
+
+        self.assertEqual(Change.objects.filter(user=user).count(), 9)
+        self.assertEqual(ChangeSequence.objects.get(user=user).last, 9)
+        self.assertEqual(changes.backfill_user(user.id), 0)
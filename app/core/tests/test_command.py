@@ -2,32 +2,96 @@
 Test custom Django management commands.
 """
 
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
 
+from core.models import Recipe, Tag
 
-@patch('core.management.commands.wait_for_db.Command.check')
+
+@patch('core.management.commands.wait_for_db.Command.probe')
 class CommandTest(SimpleTestCase):
-    
-    def test_wait_for_db_ready(self, patched_check):
-        patched_check.return_value = True
-        
-        call_command('wait_for_db')
-        
-        patched_check.assert_called_once_with(databases=['default'])
-        
+
+    def test_wait_for_db_ready(self, patched_probe):
+        patched_probe.return_value = None
+
+        call_command('wait_for_db', stdout=StringIO())
+
+        patched_probe.assert_called_once_with('default')
+
+    @patch('time.sleep')
+    def test_wait_for_db_delay(self, patched_sleep, patched_probe):
+        patched_probe.side_effect = [Psycopg2Error] * 2 + \
+            [OperationalError] * 3 + [None]
+
+        call_command('wait_for_db', stdout=StringIO())
+
+        self.assertEqual(patched_probe.call_count, 6)
+        patched_probe.assert_called_with('default')
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertTrue(all(0 <= d <= 2.0 for d in delays))
+
     @patch('time.sleep')
-    def test_wait_for_db_delay(self, pathhed_sleep, patched_check):
-        patched_check.side_effect = [Psycopg2Error] * 2 + \
-            [OperationalError] * 3 + [True]
-            
-        call_command('wait_for_db')
-        
-        self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
-        
\ No newline at end of file
+    def test_wait_for_db_backoff_grows(self, patched_sleep, patched_probe):
+        patched_probe.side_effect = [OperationalError] * 8 + [None]
+
+        with patch('random.uniform', side_effect=lambda a, b: b):
+            call_command('wait_for_db', stdout=StringIO())
+
+        delays = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(delays[:3], [0.05, 0.1, 0.2])
+        self.assertEqual(max(delays), 2.0)
+
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(self, patched_sleep, patched_probe):
+        patched_probe.side_effect = OperationalError
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+    @patch('core.management.commands.wait_for_db.pending_migrations')
+    def test_wait_for_db_pending_migrations(self, patched_pending,
+                                            patched_probe):
+        patched_pending.return_value = [('core', '0001_initial')]
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', migrations=True, stdout=StringIO())
+
+
+class RepairRecipeCountsTest(TestCase):
+    '''Tests for the repair_recipe_counts command.'''
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass'
+        )
+        self.tag = Tag.objects.create(user=user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00'),
+        )
+        recipe.tags.add(self.tag)
+        Tag.objects.filter(id=self.tag.id).update(recipe_count=7)
+
+    def test_repair_fixes_drift(self):
+        out = StringIO()
+        call_command('repair_recipe_counts', batch_size=1, stdout=out)
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+        self.assertIn('tags: checked 1, drifted 1', out.getvalue())
+
+    def test_dry_run_reports_without_writing(self):
+        out = StringIO()
+        call_command('repair_recipe_counts', dry_run=True, stdout=out)
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 7)
+        self.assertIn('drifted 1', out.getvalue())
@@ -0,0 +1,175 @@
+'''
+Tests for adaptive concurrency limits and load shedding.
+'''
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import benchmark, concurrency
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+SMALL_LIMIT = {'initial': 4, 'minimum': 4, 'maximum': 4}
+
+
+class AIMDLimiterTests(SimpleTestCase):
+    '''Tests for the AIMD limiter.'''
+
+    def test_rejects_over_limit(self):
+        limiter = concurrency.AIMDLimiter(2, 1, 10, cooldown=0)
+
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+    def test_share_of_limit(self):
+        limiter = concurrency.AIMDLimiter(4, 1, 10, cooldown=0)
+        limiter.try_acquire()
+
+        self.assertFalse(limiter.try_acquire(share=0.25))
+        self.assertTrue(limiter.try_acquire())
+
+    def test_congestion_decreases_once_per_cooldown(self):
+        limiter = concurrency.AIMDLimiter(10, 1, 20, cooldown=60)
+        for _ in range(3):
+            limiter.try_acquire()
+        for _ in range(3):
+            limiter.release(congested=True)
+
+        self.assertEqual(limiter.limit, 9)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_decrease_bounded_by_minimum(self):
+        limiter = concurrency.AIMDLimiter(2, 2, 20, cooldown=0)
+        limiter.try_acquire()
+        limiter.release(congested=True)
+
+        self.assertEqual(limiter.limit, 2)
+
+    def test_increase_only_when_used(self):
+        limiter = concurrency.AIMDLimiter(4, 1, 20, cooldown=0)
+        limiter.try_acquire()
+        limiter.release()
+        self.assertEqual(limiter.limit, 4)
+
+        for _ in range(2):
+            limiter.try_acquire()
+        limiter.release()
+
+        self.assertEqual(limiter.limit, 4.25)
+
+
+class RouteClassTests(SimpleTestCase):
+    '''Tests for mapping requests to route classes.'''
+
+    def test_route_classes(self):
+        self.assertEqual(
+            concurrency.route_class('GET', 'recipe:recipe-list'), 'list'
+        )
+        self.assertEqual(
+            concurrency.route_class('POST', 'recipe:recipe-list'), 'write'
+        )
+        self.assertEqual(
+            concurrency.route_class('GET', 'recipe:recipe-detail'), 'read'
+        )
+        self.assertEqual(
+            concurrency.route_class('POST', 'recipe:recipe-upload-image'),
+            'heavy',
+        )
+        self.assertIsNone(concurrency.route_class('GET', 'core:live'))
+
+
+@override_settings(CONCURRENCY_LIMIT_ENABLED=True,
+                   CONCURRENCY_LIMIT=SMALL_LIMIT)
+class ConcurrencyLimitMiddlewareTests(TestCase):
+    '''Tests for shedding requests over the limit.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        concurrency.reset()
+        self.controller = concurrency.get_controller()
+
+    def test_admitted_requests_released(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.controller.limiter.in_flight, 0)
+        self.assertEqual(self.controller.in_flight['list'], 0)
+
+    def test_sheds_with_retry_after(self):
+        for _ in range(4):
+            self.controller.acquire('read')
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_heavy_routes_shed_before_reads(self):
+        self.controller.acquire('read')
+        url = reverse('recipe:recipe-upload-image', args=[1])
+
+        res = self.client.post(url, {}, format='multipart')
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_health_checks_never_shed(self):
+        for _ in range(4):
+            self.controller.acquire('read')
+
+        res = self.client.get(reverse('core:live'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_disabled(self):
+        for _ in range(4):
+            self.controller.acquire('read')
+
+        with self.settings(CONCURRENCY_LIMIT_ENABLED=False):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_metrics_exposed(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(reverse('metrics'))
+
+        self.assertIn(b'concurrency_limit 4', res.content)
+        self.assertIn(b'concurrency_in_flight{route_class="list"} 0',
+                      res.content)
+
+
+@patch.dict(benchmark.SCALES, {'test': (2, 5)})
+class LoadTestCommandTests(TestCase):
+    '''Tests for the load_test command.'''
+
+    def test_runs_with_and_without_limits(self):
+        out = StringIO()
+        call_command(
+            'load_test', scale='test', requests=6, concurrency=1,
+            mix=['recipe-detail=2', 'recipe-list=1'], yes=True, stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        rows = [line.split() for line in lines[-4:]]
+        self.assertEqual(
+            [row[:2] for row in rows],
+            [['off', 'recipe-detail'], ['off', 'recipe-list'],
+             ['on', 'recipe-detail'], ['on', 'recipe-list']],
+        )
+        self.assertEqual([row[2] for row in rows], ['4', '2', '4', '2'])
@@ -0,0 +1,250 @@
+'''
+Tests for pushing change notifications over server-sent events.
+'''
+import asyncio
+import json
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import events, sse
+from core.models import Tag
+
+
+def parse_events(body):
+    '''Return (event, data) pairs from a server-sent event stream.'''
+    parsed = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(
+            line.split(': ', 1) for line in block.splitlines()
+            if line and not line.startswith(':')
+        )
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+class Client:
+    '''Drive the event stream application like an ASGI server would.'''
+
+    def __init__(self, query_string=b'', headers=(), method='GET'):
+        self.scope = {
+            'type': 'http', 'method': method, 'path': '/api/events/',
+            'query_string': query_string, 'headers': list(headers),
+        }
+        self.messages = []
+        self.body = b''
+
+    async def receive(self):
+        await self.gone.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        self.messages.append(message)
+        self.body += message.get('body', b'')
+        self.received.set()
+
+    @property
+    def status(self):
+        return self.messages[0]['status']
+
+    def start(self):
+        self.received = asyncio.Event()
+        self.gone = asyncio.Event()
+        return asyncio.ensure_future(
+            sse.event_stream(self.scope, self.receive, self.send)
+        )
+
+    async def run(self):
+        '''Run the application until it responds and returns.'''
+        await self.start()
+
+    async def wait_for(self, count):
+        '''Wait until `count` events arrived.'''
+        while len(parse_events(self.body)) < count:
+            self.received.clear()
+            await asyncio.wait_for(self.received.wait(), 5)
+        return parse_events(self.body)
+
+
+class SubscriptionTests(SimpleTestCase):
+    '''Tests for per-stream queues.'''
+
+    def test_slow_consumer_gets_one_resync(self):
+        async def run():
+            broker = events.Broker()
+            subscription = broker.subscribe(1, maxsize=2)
+            for cursor in range(1, 6):
+                broker.deliver(1, 'change', {'cursor': cursor})
+            await asyncio.sleep(0)
+            return [subscription.queue.get_nowait()
+                    for _ in range(subscription.queue.qsize())]
+
+        queued = asyncio.run(run())
+
+        self.assertEqual(queued, [('resync', {'cursor': 5})])
+
+    def test_delivers_only_to_user(self):
+        async def run():
+            broker = events.Broker()
+            mine = broker.subscribe(1, maxsize=2)
+            other = broker.subscribe(2, maxsize=2)
+            broker.deliver(1, 'change', {'cursor': 1})
+            await asyncio.sleep(0)
+            broker.unsubscribe(other)
+            return mine.queue.qsize(), other.queue.qsize(), broker
+
+        mine, other, broker = asyncio.run(run())
+
+        self.assertEqual((mine, other), (1, 0))
+        self.assertEqual(broker.connections(), 1)
+
+    @override_settings(EVENTS_MAX_CHANGES=1)
+    def test_large_writes_announced_as_resync(self):
+        self.assertEqual(
+            events.notification(7, [(6, 'tag', 1, False),
+                                    (7, 'recipe', 1, False)]),
+            ('resync', {'cursor': 7}),
+        )
+
+
+class EventStreamTests(TransactionTestCase):
+    '''Tests for the event stream application.'''
+
+    def setUp(self):
+        events.reset()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = [(b'authorization', f'Token {self.token.key}'.encode())]
+
+    def tearDown(self):
+        events.reset()
+
+    def test_streams_committed_changes(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        client = Client(headers=self.auth)
+
+        async def run():
+            task = client.start()
+            await client.wait_for(1)
+            tag = await sync_to_async(Tag.objects.create)(
+                user=self.user, name='Quick',
+            )
+            received = await client.wait_for(2)
+            client.gone.set()
+            await task
+            return tag, received
+
+        tag, received = async_to_sync(run)()
+
+        self.assertEqual(client.status, 200)
+        self.assertEqual(received, [
+            ('ready', {'cursor': 1}),
+            ('change', {'cursor': 2, 'changes': [
+                {'seq': 2, 'type': 'tag', 'id': tag.id, 'deleted': False},
+            ]}),
+        ])
+        self.assertEqual(events.get_broker().connections(), 0)
+
+    def test_query_string_token(self):
+        client = Client(query_string=f'token={self.token.key}'.encode())
+
+        async def run():
+            task = client.start()
+            await client.wait_for(1)
+            client.gone.set()
+            await task
+
+        async_to_sync(run)()
+
+        self.assertEqual(client.status, 200)
+        self.assertIn((b'content-type', b'text/event-stream'),
+                      client.messages[0]['headers'])
+
+    def test_invalid_token_rejected(self):
+        client = Client(headers=[(b'authorization', b'Token nope')])
+
+        async_to_sync(client.run)()
+
+        self.assertEqual(client.status, 401)
+
+    def test_only_get_allowed(self):
+        client = Client(headers=self.auth, method='POST')
+
+        async_to_sync(client.run)()
+
+        self.assertEqual(client.status, 405)
+
+    @override_settings(EVENTS_HEARTBEAT=0.01)
+    def test_heartbeats_keep_idle_streams_open(self):
+        client = Client(headers=self.auth)
+
+        async def run():
+            task = client.start()
+            while client.body.count(b': keepalive') < 2:
+                await asyncio.sleep(0.01)
+            client.gone.set()
+            await task
+
+        async_to_sync(run)()
+
+    @override_settings(EVENTS_MAX_CONNECTIONS=1)
+    def test_sheds_streams_over_limit(self):
+        first = Client(headers=self.auth)
+        second = Client(headers=self.auth)
+
+        async def run():
+            task = first.start()
+            await first.wait_for(1)
+            await second.start()
+            first.gone.set()
+            await task
+
+        async_to_sync(run)()
+
+        self.assertEqual(second.status, 503)
+
+    def test_router_passes_other_paths_to_django(self):
+        calls = []
+
+        async def django_app(scope, receive, send):
+            calls.append(scope['path'])
+
+        router = sse.EventStreamRouter(django_app)
+        async_to_sync(router)(
+            {'type': 'http', 'path': '/api/recipe/'}, None, None,
+        )
+
+        self.assertEqual(calls, ['/api/recipe/'])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Needs PostgreSQL.')
+@override_settings(EVENTS_BACKEND='core.events.PostgresBackend')
+class PostgresBackendTests(TransactionTestCase):
+    '''Tests for delivering notifications through NOTIFY.'''
+
+    def tearDown(self):
+        events.reset()
+
+    def test_notifications_reach_listeners(self):
+        async def run():
+            broker = events.get_broker()
+            subscription = broker.subscribe(1, maxsize=4)
+            events.get_backend().start()
+            # Give the listener time to LISTEN before publishing.
+            await asyncio.sleep(0.5)
+            await sync_to_async(events.publish)(1, 3, [(3, 'tag', 9, True)])
+            return await asyncio.wait_for(subscription.get(), 5)
+
+        event, data = async_to_sync(run)()
+
+        self.assertEqual(event, 'change')
+        self.assertEqual(data['changes'][0]['deleted'], True)
@@ -0,0 +1,81 @@
+'''
+Tests for the health check endpoints.
+'''
+from unittest.mock import patch
+
+from django.db import OperationalError, connections
+from django.test import TestCase
+from django.urls import reverse
+
+from core import views
+from core.db.backends.postgresql_pool.base import DatabaseWrapper
+from core.db.pool import ConnectionPool
+
+
+LIVE_URL = reverse('core:live')
+READY_URL = reverse('core:ready')
+
+
+class HealthCheckTests(TestCase):
+    '''Tests for liveness and readiness.'''
+
+    def setUp(self):
+        views._migrations_applied = False
+
+    def test_liveness_skips_database(self):
+        with self.assertNumQueries(0):
+            res = self.client.get(LIVE_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_readiness_ok(self):
+        res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_readiness_checks_migrations_once(self):
+        self.client.get(READY_URL)
+        with patch('core.views.pending_migrations') as pending:
+            self.client.get(READY_URL)
+
+        pending.assert_not_called()
+
+    @patch('core.views.pending_migrations')
+    def test_readiness_pending_migrations(self, pending):
+        pending.return_value = [('core', '0001_initial')]
+
+        with self.assertLogs('core.views', 'WARNING'):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'status': 'unavailable'})
+
+    @patch('core.views.probe_database')
+    def test_readiness_database_down(self, probe):
+        probe.side_effect = OperationalError('password authentication failed')
+
+        with self.assertLogs('core.views', 'ERROR'):
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'status': 'unavailable'})
+
+    def test_readiness_pool_exhausted(self):
+        pool = ConnectionPool(object, max_size=1, timeout=0.01)
+        pool.getconn()
+        wrapper = DatabaseWrapper({
+            **connections.databases['default'],
+            'ENGINE': 'core.db.backends.postgresql_pool',
+            'NAME': 'recipes',
+        }, 'default')
+
+        with patch('core.db.backends.postgresql_pool.base.get_pool',
+                   return_value=pool), \
+                patch('core.health.connections', {'default': wrapper}), \
+                self.assertLogs('core.views', 'ERROR') as logs:
+            res = self.client.get(READY_URL)
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'status': 'unavailable'})
+        self.assertIn('No connection available', logs.output[0])
@@ -0,0 +1,196 @@
+'''
+Tests for the background job queue.
+'''
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('tests.explode')
+def explode():
+    raise RuntimeError('boom')
+
+
+@jobs.task('tests.record_lock')
+def record_lock(seconds):
+    time.sleep(seconds)
+    calls.append(Job.objects.get(name='tests.record_lock').locked_at)
+
+
+@override_settings(JOB_RETRY_BASE_DELAY=10, JOB_RETRY_MAX_DELAY=60)
+class JobQueueTests(TestCase):
+    '''Tests for enqueueing, claiming and running jobs.'''
+
+    def setUp(self):
+        calls.clear()
+
+    def test_unknown_task_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_run_pending_runs_and_deletes(self):
+        jobs.enqueue('tests.record', {'value': 1})
+        jobs.enqueue('tests.record', {'value': 2})
+
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(sorted(calls), [1, 2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_priority_order(self):
+        jobs.enqueue('tests.record', {'value': 'low'}, priority=-5)
+        jobs.enqueue('tests.record', {'value': 'high'}, priority=5)
+        jobs.enqueue('tests.record', {'value': 'normal'})
+
+        jobs.run_pending(batch_size=1)
+
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+
+    def test_delayed_job_not_claimed(self):
+        jobs.enqueue('tests.record', {'value': 1}, delay=60)
+
+        self.assertEqual(jobs.claim('worker'), [])
+
+    def test_claim_is_exclusive(self):
+        jobs.enqueue('tests.record', {'value': 1})
+
+        claimed = jobs.claim('a')
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claimed[0].status, Job.RUNNING)
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(jobs.claim('b'), [])
+
+    def test_failure_retried_with_backoff(self):
+        job = jobs.enqueue('tests.explode', max_attempts=2)
+
+        jobs.run(jobs.claim('worker')[0])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('boom', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at, timezone.now() + timedelta(seconds=4)
+        )
+
+    def test_failure_kept_after_last_attempt(self):
+        job = jobs.enqueue('tests.explode', max_attempts=1)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run(jobs.claim('worker')[0])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_backoff_grows_and_caps(self):
+        delays = [jobs.backoff(attempt) for attempt in range(1, 8)]
+
+        self.assertTrue(5 <= delays[0] <= 10)
+        self.assertTrue(20 <= delays[2] <= 40)
+        self.assertTrue(all(delay <= 60 for delay in delays))
+
+    def test_stale_jobs_reclaimed(self):
+        job = jobs.enqueue('tests.record', {'value': 1})
+        jobs.claim('dead-worker')
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        self.assertEqual(jobs.reclaim_stale(timeout=60), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    def _steal(self, job):
+        '''Requeue `job` as if its lock went stale and reclaim it.'''
+        Job.objects.filter(id=job.id).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+        jobs.reclaim_stale(timeout=60)
+        return jobs.claim('new-worker')[0]
+
+    def test_renew_lock_only_while_held(self):
+        jobs.enqueue('tests.record', {'value': 1})
+        job = jobs.claim('worker')[0]
+
+        self.assertTrue(jobs.renew_lock(job))
+        self._steal(job)
+        self.assertFalse(jobs.renew_lock(job))
+
+    def test_completion_leaves_reclaimed_job(self):
+        jobs.enqueue('tests.record', {'value': 1})
+        job = jobs.claim('slow-worker')[0]
+        stolen = self._steal(job)
+
+        jobs.run(job)
+
+        self.assertEqual(
+            Job.objects.get(id=job.id).locked_by, stolen.locked_by
+        )
+
+    def test_failure_leaves_reclaimed_job(self):
+        jobs.enqueue('tests.explode', max_attempts=1)
+        job = jobs.claim('slow-worker')[0]
+        self._steal(job)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run(job)
+
+        self.assertEqual(Job.objects.get(id=job.id).status, Job.RUNNING)
+
+    def test_queue_depth_collected(self):
+        jobs.enqueue('tests.record', {'value': 1})
+
+        samples = {
+            labels['status']: value
+            for _, _, labels, value in jobs.collect_queue_depth()
+        }
+        self.assertEqual(samples[Job.QUEUED], 1)
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    '''Tests for renewing the lock of a running job.'''
+
+    def setUp(self):
+        calls.clear()
+
+    @override_settings(JOB_HEARTBEAT_INTERVAL=0.05)
+    def test_running_job_renews_lock(self):
+        jobs.enqueue('tests.record_lock', {'seconds': 0.5})
+        job = jobs.claim('worker')[0]
+
+        self.assertTrue(jobs.run(job))
+
+        self.assertGreater(calls[0], job.locked_at)
+        self.assertFalse(Job.objects.exists())
+
+
+class RunWorkersCommandTests(TestCase):
+    '''Tests for the run_workers command.'''
+
+    def setUp(self):
+        calls.clear()
+
+    def test_burst_single_process(self):
+        for value in range(3):
+            jobs.enqueue('tests.record', {'value': value})
+        out = StringIO()
+
+        with patch('core.management.commands.run_workers.connections'):
+            call_command('run_workers', processes=1, burst=True, stdout=out)
+
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertIn('Processed 3 jobs', out.getvalue())
@@ -0,0 +1,100 @@
+'''
+Tests for request metrics.
+'''
+import time
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import resolve, reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.middleware import MetricsMiddleware
+
+
+METRICS_URL = reverse('metrics')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+# Maximum mean time the middleware may add to a request, in seconds.
+OVERHEAD_BUDGET = 0.0002
+
+
+class HistogramTests(SimpleTestCase):
+    '''Tests for the metric primitives.'''
+
+    def test_histogram_renders_cumulative_buckets(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram(
+            'latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1),
+        )
+        histogram.observe(('a',), 0.05)
+        histogram.observe(('a',), 0.5)
+        histogram.observe(('a',), 5)
+
+        text = registry.render()
+
+        self.assertIn('latency_seconds_bucket{route="a",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{route="a"} 3', text)
+
+
+class MetricsMiddlewareTests(TestCase):
+    '''Tests for MetricsMiddleware and the metrics endpoint.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass'
+        )
+        self.client.force_authenticate(user)
+
+    def test_request_recorded_by_route(self):
+        labels = ('recipe:recipe-list', 'GET')
+        before = metrics.request_db_queries._series.get(labels, [0, 0, 0])[2]
+
+        self.client.get(RECIPE_URL)
+
+        series = metrics.request_db_queries._series[labels]
+        self.assertEqual(series[2], before + 1)
+        self.assertGreater(series[1], 0)
+        render = metrics.response_render_duration._series[labels]
+        self.assertGreater(render[1], 0)
+
+    def test_metrics_endpoint_prometheus_text(self):
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'http_requests_total{route="recipe:recipe-list",method="GET",'
+            'status="200"}', body,
+        )
+
+    def test_overhead_within_budget(self):
+        request = RequestFactory().get(RECIPE_URL)
+        request.resolver_match = resolve(RECIPE_URL)
+        response = HttpResponse()
+
+        def view(request):
+            return response
+
+        middleware = MetricsMiddleware(view)
+        iterations = 2000
+
+        def run(handler):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                handler(request)
+            return time.perf_counter() - start
+
+        run(middleware)
+        overhead = (run(middleware) - run(view)) / iterations
+
+        self.assertLess(overhead, OVERHEAD_BUDGET)
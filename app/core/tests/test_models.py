@@ -3,8 +3,11 @@ Test for Models.
 '''
 from unittest.mock import patch
 from decimal import Decimal
+from importlib import import_module
 
-from django.test import TestCase
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -85,3 +88,181 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class RecipeCountTests(TestCase):
+    '''Tests for the denormalized recipe counters.'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.tag = models.Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = models.Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+
+    def _recipe(self):
+        return models.Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minutes=5,
+            price=Decimal('5.50'),
+        )
+
+    def _counts(self):
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        return self.tag.recipe_count, self.ingredient.recipe_count
+
+    def test_add_and_remove_update_counts(self):
+        r1 = self._recipe()
+        r2 = self._recipe()
+        r1.tags.add(self.tag)
+        r1.tags.add(self.tag)
+        r2.tags.add(self.tag)
+        r1.ingredients.add(self.ingredient)
+        self.assertEqual(self._counts(), (2, 1))
+
+        r1.tags.remove(self.tag)
+        r1.tags.remove(self.tag)
+        r2.ingredients.remove(self.ingredient)
+        self.assertEqual(self._counts(), (1, 1))
+
+    def test_clear_and_set_update_counts(self):
+        recipe = self._recipe()
+        recipe.tags.set([self.tag])
+        recipe.ingredients.set([self.ingredient])
+        self.assertEqual(self._counts(), (1, 1))
+
+        recipe.tags.clear()
+        recipe.ingredients.set([])
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_reverse_relation_updates_counts(self):
+        r1 = self._recipe()
+        r2 = self._recipe()
+        self.tag.recipe_set.add(r1, r2)
+        self.assertEqual(self._counts(), (2, 0))
+
+        self.tag.recipe_set.remove(r1)
+        self.assertEqual(self._counts(), (1, 0))
+
+        self.tag.recipe_set.clear()
+        self.assertEqual(self._counts(), (0, 0))
+
+    def test_delete_recipe_updates_counts(self):
+        r1 = self._recipe()
+        r2 = self._recipe()
+        for recipe in (r1, r2):
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+
+        r1.delete()
+        self.assertEqual(self._counts(), (1, 1))
+
+        models.Recipe.objects.all().delete()
+        self.assertEqual(self._counts(), (0, 0))
+
+
+class NamedObjectTests(TestCase):
+    '''Tests for normalized-name uniqueness and upserts.'''
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_normalized_on_save(self):
+        tag = models.Tag.objects.create(user=self.user, name='  Gluten  FREE')
+
+        self.assertEqual(tag.normalized_name, 'gluten free')
+
+    def test_duplicate_normalized_name_rejected(self):
+        models.Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=self.user, name='vegan')
+
+    def test_same_name_for_other_user_allowed(self):
+        models.Ingredient.objects.create(user=self.user, name='Salt')
+        other_user = create_user(email='other@example.com')
+
+        models.Ingredient.objects.create(user=other_user, name='Salt')
+
+    def test_upsert_reuses_existing_rows(self):
+        salt = models.Ingredient.objects.create(user=self.user, name='Salt')
+
+        objs = models.Ingredient.objects.upsert(
+            self.user, ['salt', 'Pepper', 'pepper ']
+        )
+
+        self.assertEqual(len(objs), 2)
+        self.assertIn(salt, objs)
+        self.assertEqual(
+            sorted(obj.name for obj in objs), ['Pepper', 'Salt']
+        )
+        self.assertEqual(models.Ingredient.objects.count(), 2)
+
+
+class DedupeMigrationTests(TransactionTestCase):
+    '''Tests for the migration merging duplicate names.'''
+    before = [('core', '0008_recipe_range_indexes')]
+    after = [('core', '0010_unique_normalized_name')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_merged(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        User = apps.get_model('core', 'User')
+        Recipe = apps.get_model('core', 'Recipe')
+        Tag = apps.get_model('core', 'Tag')
+
+        user = User.objects.create(email='user@example.com')
+        kept = Tag.objects.create(user=user, name='Vegan')
+        duplicate = Tag.objects.create(user=user, name=' vegan')
+        both = Recipe.objects.create(
+            user=user, title='a', time_minutes=1, price=Decimal('1'),
+        )
+        both.tags.add(kept, duplicate)
+        only_duplicate = Recipe.objects.create(
+            user=user, title='b', time_minutes=1, price=Decimal('1'),
+        )
+        only_duplicate.tags.add(duplicate)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Tag = apps.get_model('core', 'Tag')
+        Recipe = apps.get_model('core', 'Recipe')
+
+        tag = Tag.objects.get()
+        self.assertEqual(tag.id, kept.id)
+        self.assertEqual(tag.normalized_name, 'vegan')
+        self.assertEqual(tag.recipe_count, 2)
+        self.assertEqual(Recipe.tags.through.objects.count(), 2)
+
+    def test_names_normalized_in_batches(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        User = apps.get_model('core', 'User')
+        Ingredient = apps.get_model('core', 'Ingredient')
+        user = User.objects.create(email='user@example.com')
+        for name in ('Salt', ' Pepper', 'RICE', 'salt '):
+            Ingredient.objects.create(user=user, name=name)
+
+        migration = import_module(
+            'core.migrations.0009_normalized_name_dedupe'
+        )
+        with patch.object(migration, 'BATCH_SIZE', 3):
+            executor = MigrationExecutor(connection)
+            executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Ingredient = apps.get_model('core', 'Ingredient')
+
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list('normalized_name',
+                                                  flat=True)),
+            ['pepper', 'rice', 'salt'],
+        )
@@ -0,0 +1,114 @@
+'''
+Tests for the database connection pool.
+'''
+import threading
+import time
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    '''Stand-in for a DB-API connection.'''
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    '''Tests for ConnectionPool.'''
+
+    def test_connection_reused(self):
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(pool.stats()['connections_created'], 1)
+
+    def test_pool_bounded_and_times_out(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        pool.getconn()
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        stats = pool.stats()
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_waiter_gets_returned_connection(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=2)
+        conn = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=[conn]).start()
+
+        self.assertIs(pool.getconn(), conn)
+
+    def test_expired_connections_recycled(self):
+        pool = ConnectionPool(FakeConnection, max_size=1, max_idle=0)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        time.sleep(0.01)
+
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['connections_recycled'], 1)
+
+    def test_failed_health_check_discarded(self):
+        results = [False]
+        pool = ConnectionPool(
+            FakeConnection,
+            check_interval=0,
+            check=lambda conn: results.pop() if results else True,
+        )
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['checks_failed'], 1)
+
+    def test_failed_reset_discarded(self):
+        def reset(conn):
+            raise RuntimeError('broken')
+
+        pool = ConnectionPool(FakeConnection, reset=reset)
+        conn = pool.getconn()
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+POOL_ENGINE = 'core.db.backends.postgresql_pool'
+
+
+@skipUnless(
+    connection.settings_dict['ENGINE'] == POOL_ENGINE,
+    'Requires the pooled PostgreSQL backend.',
+)
+class PooledBackendTests(SimpleTestCase):
+    '''Tests for the pooled backend against a local PostgreSQL.'''
+    databases = {'default'}
+
+    def _backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_closed_connection_returns_to_pool(self):
+        wrapper = connections.create_connection('default')
+        try:
+            first = self._backend_pid(wrapper)
+            wrapper.close()
+            second = self._backend_pid(wrapper)
+        finally:
+            wrapper.close()
+
+        self.assertEqual(first, second)
@@ -0,0 +1,101 @@
+'''
+Tests for chunked purges.
+'''
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import counters, purge
+from core.models import Recipe, Tag, Ingredient
+
+
+def create_user(email='user@example.com'):
+    return get_user_model().objects.create_user(email, 'testpass')
+
+
+class PurgeTests(TestCase):
+    '''Tests for purging users and recipes.'''
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user()
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Salt'
+        )
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+            self.recipes.append(recipe)
+
+    def _attach_image(self, recipe):
+        path = default_storage.save(
+            'uploads/recipe/purge.jpg', ContentFile(b'image')
+        )
+        Recipe.objects.filter(id=recipe.id).update(image=path)
+        return os.path.join(self.media_root, path)
+
+    def test_purge_recipes_releases_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.purge_recipes(
+                [r.id for r in self.recipes[:3]], batch_size=2
+            )
+
+        self.assertEqual(Recipe.objects.count(), 2)
+        for model in counters.COUNTED_RELATIONS:
+            self.assertFalse(counters.find_drift(model).exists())
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 2)
+
+    def test_purge_removes_images_after_commit(self):
+        image = self._attach_image(self.recipes[0])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            purge.purge_recipes([self.recipes[0].id])
+        self.assertTrue(os.path.exists(image))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(image))
+
+    def test_purge_user(self):
+        other = create_user(email='other@example.com')
+        other_tag = Tag.objects.create(user=other, name='Vegan')
+        Token.objects.create(user=self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.purge_user(self.user.id, batch_size=2)
+
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(list(Tag.objects.all()), [other_tag])
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertFalse(Recipe.tags.through.objects.exists())
+        self.assertFalse(Token.objects.exists())
+
+    def test_batches_are_bounded(self):
+        batches = list(purge._id_batches(
+            Recipe.objects.filter(user=self.user), 2
+        ))
+
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
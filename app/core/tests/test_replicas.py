@@ -0,0 +1,225 @@
+'''
+Tests for read replica routing.
+'''
+import random
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.db import replicas
+from core.models import Recipe
+from recipe.views import RecipeViewSets
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+# A test mirror of the default database, set up by the settings.
+REPLICA = 'replica1'
+HAS_REPLICA = REPLICA in settings.DATABASES
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def fail_list(client):
+    '''Make the client's next recipe list fail with an unhandled error.'''
+    client.raise_request_exception = False
+    with patch.object(RecipeViewSets, 'list',
+                      side_effect=RuntimeError('Read failed.')):
+        return client.get(RECIPE_URL)
+
+
+@override_settings(REPLICA_DATABASES=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    '''Tests for ReplicaRouter.'''
+
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_reads_use_replica_when_allowed(self):
+        token = replicas._use_replica.set(True)
+        try:
+            db = self.router.db_for_read(Recipe)
+        finally:
+            replicas._use_replica.reset(token)
+
+        self.assertIn(db, ['replica1', 'replica2'])
+
+    def test_writes_always_use_primary(self):
+        token = replicas._use_replica.set(True)
+        try:
+            db = self.router.db_for_write(Recipe)
+        finally:
+            replicas._use_replica.reset(token)
+
+        self.assertEqual(db, 'default')
+
+    def test_replicas_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'core'))
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+
+
+# A mirror would not see the rows of a TestCase, which are never
+# committed, so here the default database doubles as the replica while
+# the spy shows which reads were sent to a replica.
+@override_settings(REPLICA_DATABASES=['default'])
+class ReplicaRoutingViewTests(TestCase):
+    '''Tests for ReplicaRoutingMixin on the recipe API.'''
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _list_uses_replica(self):
+        with patch('core.db.replicas.random.choice',
+                   wraps=random.choice) as choice:
+            self.client.get(RECIPE_URL)
+        return choice.called
+
+    def test_list_reads_from_replica(self):
+        self.assertTrue(self._list_uses_replica())
+
+    def _write(self):
+        payload = {
+            'title': 'Soup', 'time_minutes': 5, 'price': Decimal('1.00'),
+        }
+        return self.client.post(RECIPE_URL, payload)
+
+    def test_reads_pinned_to_primary_after_write(self):
+        self._write()
+
+        self.assertFalse(self._list_uses_replica())
+
+    def test_pin_travels_with_client(self):
+        res = self._write()
+        # A fresh client on another worker, with no server-side state,
+        # only has the cookie returned by the write.
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.cookies[replicas.PIN_COOKIE] = (
+            res.cookies[replicas.PIN_COOKIE].value
+        )
+
+        self.assertFalse(self._list_uses_replica())
+
+    def test_pin_only_applies_to_its_user(self):
+        res = self._write()
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass'
+        )
+        self.client.force_authenticate(other)
+
+        self.assertIn(replicas.PIN_COOKIE, res.cookies)
+        self.assertTrue(self._list_uses_replica())
+
+    def test_forged_pin_ignored(self):
+        self.client.cookies[replicas.PIN_COOKIE] = str(self.user.id)
+
+        self.assertTrue(self._list_uses_replica())
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        self._write()
+
+        self.assertTrue(self._list_uses_replica())
+
+    def test_failed_read_leaves_next_write_on_primary(self):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        with self.assertLogs('django.request', 'ERROR'):
+            res = fail_list(self.client)
+        self.assertEqual(res.status_code, 500)
+
+        with patch('core.db.replicas.random.choice',
+                   wraps=random.choice) as choice:
+            res = self.client.patch(detail_url(recipe.id), {'title': 'Stew'})
+
+        self.assertEqual(res.status_code, 200)
+        choice.assert_not_called()
+        self.assertFalse(replicas._use_replica.get())
+
+
+def tables(queries):
+    '''Return the SQL of captured queries that touch the recipe table.'''
+    return [q['sql'] for q in queries if '"core_recipe"' in q['sql']]
+
+
+@skipUnless(HAS_REPLICA, 'Requires a replica1 test mirror.')
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class ReplicaDatabaseTests(TransactionTestCase):
+    '''Tests that routed queries run on a second database connection.'''
+    databases = {'default', REPLICA} if HAS_REPLICA else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+
+    def _capture(self, request):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            res = request()
+        return res, tables(primary), tables(replica)
+
+    def test_list_reads_leave_primary(self):
+        res, primary, replica = self._capture(
+            lambda: self.client.get(RECIPE_URL)
+        )
+
+        self.assertEqual([item['id'] for item in res.data], [self.recipe.id])
+        self.assertTrue(replica)
+        self.assertEqual(primary, [])
+
+    def test_writes_stay_on_primary(self):
+        res, primary, replica = self._capture(
+            lambda: self.client.patch(detail_url(self.recipe.id),
+                                      {'title': 'Stew'})
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(primary)
+        self.assertEqual(replica, [])
+
+    def test_failed_read_leaves_next_write_on_primary(self):
+        with self.assertLogs('django.request', 'ERROR'):
+            fail_list(self.client)
+
+        res, primary, replica = self._capture(
+            lambda: self.client.patch(detail_url(self.recipe.id),
+                                      {'title': 'Stew'})
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(replica, [])
@@ -0,0 +1,112 @@
+'''
+Tests for the prebuilt OpenAPI schema.
+'''
+import gzip
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(SimpleTestCase):
+    '''Tests for building and serving the schema.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        settings_override = override_settings(
+            SCHEMA_ARTIFACT_DIR=self.tmpdir.name
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.tmpdir.cleanup)
+        schema.schema_cache.clear()
+        self.addCleanup(schema.schema_cache.clear)
+
+    def test_build_schema_writes_versioned_artifact(self):
+        call_command('build_schema', stdout=StringIO())
+
+        path = schema.artifact_path()
+        self.assertTrue(os.path.basename(path).startswith('openapi-1.0.0-'))
+        self.assertTrue(os.path.exists(path))
+        self.assertIn('/api/recipe/recipe/', schema.load_artifact()['paths'])
+
+    def test_schema_served_from_artifact(self):
+        schema.write_artifact({'openapi': '3.0.3', 'paths': {}})
+
+        with patch('core.schema.generate_schema') as generate:
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        generate.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'openapi': '3.0.3', 'paths': {}})
+
+    def test_artifact_keyed_on_build(self):
+        with self.settings(SCHEMA_BUILD_ID='abc123'):
+            path = schema.artifact_path()
+
+        self.assertEqual(os.path.basename(path), 'openapi-1.0.0-abc123.json')
+        self.assertRegex(
+            os.path.basename(schema.artifact_path()),
+            r'^openapi-1\.0\.0-[0-9a-f]{16}\.json$',
+        )
+
+    def test_artifact_of_other_build_ignored(self):
+        with self.settings(SCHEMA_BUILD_ID='old'):
+            schema.write_artifact({'openapi': '3.0.3', 'paths': {}})
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertIn('/api/recipe/recipe/', res.json()['paths'])
+
+    def test_schema_generated_once_without_artifact(self):
+        self.client.get(SCHEMA_URL)
+        with patch('core.schema.generate_schema') as generate:
+            res = self.client.get(SCHEMA_URL)
+
+        generate.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+
+    def test_etag_not_modified(self):
+        res = self.client.get(SCHEMA_URL)
+        etag = res['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_gzip_encoding(self):
+        plain = self.client.get(SCHEMA_URL)
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+
+    def test_gzip_refused_by_quality(self):
+        for header in ('gzip;q=0', 'br, gzip; q=0.0', '*;q=0', 'identity'):
+            res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING=header)
+
+            self.assertFalse(res.has_header('Content-Encoding'), header)
+
+    def test_gzip_accepted_by_quality(self):
+        for header in ('gzip;q=0.5', 'br, *', 'deflate;q=1, GZIP'):
+            res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING=header)
+
+            self.assertEqual(res['Content-Encoding'], 'gzip', header)
+
+    @override_settings(DEBUG=True)
+    def test_debug_generates_live(self):
+        schema.write_artifact({'openapi': '3.0.3', 'paths': {}})
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertIn('/api/recipe/recipe/', res.json()['paths'])
+        self.assertIsNone(schema.schema_cache.schema)
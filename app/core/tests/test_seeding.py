@@ -0,0 +1,112 @@
+'''
+Tests for the synthetic dataset generator.
+'''
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import counters, purge, seeding
+from core.models import Recipe, Tag, Ingredient
+
+
+class ZipfSamplingTests(SimpleTestCase):
+    '''Tests for Zipf-weighted sampling.'''
+
+    def test_low_ranks_dominate(self):
+        rng = random.Random(1)
+        population = list(range(50))
+        weights = seeding.zipf_weights(50, 1.1)
+        hits = [0] * 50
+        for _ in range(500):
+            for rank in seeding.sample_distinct(rng, population, weights, 3):
+                hits[rank] += 1
+
+        self.assertGreater(hits[0], hits[25] * 5)
+
+    def test_sample_is_distinct_and_bounded(self):
+        rng = random.Random(1)
+        sample = seeding.sample_distinct(
+            rng, [0, 1, 2], seeding.zipf_weights(3, 1.1), 5
+        )
+
+        self.assertEqual(sample, {0, 1, 2})
+
+
+class SeedDataCommandTests(TestCase):
+    '''Tests for the seed_data command.'''
+
+    def _seed(self, **options):
+        defaults = {
+            'users': 2, 'recipes_per_user': 10, 'tags_per_user': 5,
+            'ingredients_per_user': 12, 'stdout': StringIO(),
+        }
+        defaults.update(options)
+        call_command('seed_data', **defaults)
+
+    def _snapshot(self, prefix):
+        return list(
+            Recipe.objects.filter(user__email__startswith=f'{prefix}-')
+            .order_by('id')
+            .values_list('title', 'time_minutes', 'price', 'tags__name')
+        )
+
+    def test_seeds_requested_volume(self):
+        self._seed()
+
+        User = get_user_model()
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Recipe.objects.count(), 20)
+        self.assertEqual(Tag.objects.count(), 10)
+        self.assertEqual(Ingredient.objects.count(), 24)
+        self.assertTrue(
+            User.objects.first().check_password('password')
+        )
+
+    def test_counts_are_consistent(self):
+        self._seed()
+
+        for model in counters.COUNTED_RELATIONS:
+            self.assertFalse(counters.find_drift(model).exists())
+
+    def test_same_seed_same_data(self):
+        self._seed(prefix='a', seed=7)
+        self._seed(prefix='b', seed=7)
+
+        self.assertEqual(self._snapshot('a'), self._snapshot('b'))
+
+    def test_existing_prefix_rejected(self):
+        self._seed()
+
+        with self.assertRaises(CommandError):
+            self._seed()
+
+    def test_images_share_one_placeholder(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            self._seed(images=True)
+
+        images = set(Recipe.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        self.assertTrue(images.pop().startswith('uploads/recipe/'))
+
+    def test_purge_keeps_shared_placeholder(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            self._seed(images=True)
+            image = Recipe.objects.values_list('image', flat=True)[0]
+            user = get_user_model().objects.order_by('id').first()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                purge.purge_user(user.id)
+
+            self.assertTrue(Recipe.objects.filter(image=image).exists())
+            self.assertTrue(default_storage.exists(image))
@@ -0,0 +1,100 @@
+'''
+Tests for coalescing identical concurrent requests.
+'''
+import threading
+import time
+
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from core import singleflight
+
+
+def wait_for_waiters(group, key, count=1, timeout=5):
+    '''Block until `count` callers wait on the running call for `key`.'''
+    deadline = time.monotonic() + timeout
+    while group.waiters(key) < count:
+        if time.monotonic() > deadline:
+            raise AssertionError('Nobody joined the call.')
+        time.sleep(0.001)
+
+
+class GroupTests(SimpleTestCase):
+    '''Tests for the single-flight group.'''
+
+    def setUp(self):
+        self.group = singleflight.Group()
+
+    def _join(self, func, timeout=None):
+        '''Call `func` through the group from another thread.'''
+        outcome = {}
+
+        def run():
+            try:
+                outcome['value'] = self.group.do('key', func, timeout)
+            except Exception as exc:
+                outcome['error'] = exc
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, outcome
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+
+        def leader():
+            calls.append('leader')
+            thread, outcome = self._join(lambda: calls.append('follower'))
+            wait_for_waiters(self.group, 'key')
+            leader.thread, leader.outcome = thread, outcome
+            return 'result'
+
+        self.assertEqual(self.group.do('key', leader), ('result', 'leader'))
+        leader.thread.join()
+
+        self.assertEqual(leader.outcome['value'], ('result', 'shared'))
+        self.assertEqual(calls, ['leader'])
+
+    def test_sequential_calls_not_shared(self):
+        self.group.do('key', lambda: 1)
+
+        self.assertEqual(self.group.do('key', lambda: 2), (2, 'leader'))
+
+    def test_error_shared_with_waiters(self):
+        def leader():
+            leader.thread, leader.outcome = self._join(lambda: 'unused')
+            wait_for_waiters(self.group, 'key')
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            self.group.do('key', leader)
+        leader.thread.join()
+
+        self.assertIsInstance(leader.outcome['error'], ValueError)
+        self.assertEqual(self.group.waiters('key'), 0)
+
+    def test_waiter_runs_itself_after_timeout(self):
+        release = threading.Event()
+
+        def leader():
+            leader.thread, leader.outcome = self._join(
+                lambda: 'own', timeout=0.01
+            )
+            leader.thread.join()
+            release.set()
+            return 'slow'
+
+        self.group.do('key', leader)
+
+        self.assertTrue(release.is_set())
+        self.assertEqual(leader.outcome['value'], ('own', 'timeout'))
+
+    def test_normalize_params(self):
+        self.assertEqual(
+            singleflight.normalize_params(QueryDict('tags=2,1&fields=id')),
+            singleflight.normalize_params(QueryDict('fields=id&tags=1,2')),
+        )
+        self.assertNotEqual(
+            singleflight.normalize_params(QueryDict('tags=1')),
+            singleflight.normalize_params(QueryDict('tags=1&facets=1')),
+        )
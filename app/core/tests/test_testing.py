@@ -0,0 +1,117 @@
+'''
+Tests for the query budget test runner.
+'''
+import unittest
+from io import StringIO
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from core import testing
+
+
+def response(view_name):
+    return SimpleNamespace(
+        resolver_match=SimpleNamespace(view_name=view_name)
+    )
+
+
+class GuardedCase(unittest.TestCase):
+    '''Stand-in for a test in a guarded module.'''
+
+    def runTest(self):
+        pass
+
+
+GuardedCase.__module__ = 'recipe.tests.test_fake'
+
+
+class QueryShapeTests(SimpleTestCase):
+    '''Tests for SQL normalization.'''
+
+    def test_literals_and_in_lists_collapsed(self):
+        self.assertEqual(
+            testing.query_shape(
+                "SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'"
+            ),
+            testing.query_shape(
+                'SELECT * FROM t WHERE id IN (%s) AND name = 1'
+            ),
+        )
+
+    def test_repeated_selects_only(self):
+        queries = ['SELECT 1 FROM t WHERE id = 1'] * 3 + ['INSERT x'] * 3
+
+        repeated = testing.repeated_shapes(queries, 3)
+
+        self.assertEqual(list(repeated.values()), [3])
+
+
+class QueryGuardTests(SimpleTestCase):
+    '''Tests for budget checks.'''
+
+    def setUp(self):
+        self.guard = testing.QueryGuard(
+            ['recipe.tests'], {'POST a:list': 5, 'a:list': 2}, 3, 3
+        )
+        self.test = GuardedCase()
+        self.guard.start_test(self.test)
+
+    def test_budget_lookup(self):
+        self.assertEqual(self.guard.budget('POST', 'a:list'), 5)
+        self.assertEqual(self.guard.budget('GET', 'a:list'), 2)
+        self.assertEqual(self.guard.budget('GET', 'b:list'), 3)
+
+    def test_within_budget(self):
+        self.guard.record('GET', '/a/', response('a:list'), ['SELECT 1'])
+
+        self.assertEqual(self.guard.stop_test(self.test), [])
+
+    def test_over_budget(self):
+        self.guard.record('GET', '/a/', response('a:list'),
+                          ['SELECT 1', 'SELECT 2', 'SELECT 3'])
+
+        violations = self.guard.stop_test(self.test)
+        self.assertEqual(len(violations), 1)
+        self.assertIn('budget 2', violations[0])
+
+    def test_n_plus_one_flagged(self):
+        queries = [f'SELECT * FROM t WHERE id = {i}' for i in range(3)]
+        self.guard.record('POST', '/a/', response('a:list'), queries)
+
+        violations = self.guard.stop_test(self.test)
+        self.assertIn('3x repeated query', violations[0])
+
+    def test_report_orders_worst_first(self):
+        self.guard.record('GET', '/a/', response('a:list'), ['SELECT 1'])
+        self.guard.record('GET', '/b/', response('b:list'),
+                          ['SELECT 1', 'SELECT 2'])
+
+        report = self.guard.report()
+        self.assertEqual(report['requests'], 2)
+        self.assertEqual(report['worst_requests'][0]['path'], '/b/')
+        self.assertEqual(report['worst_tests'][0]['queries'], 3)
+
+    def test_unguarded_modules_ignored(self):
+        self.guard.start_test(self)
+
+        self.assertIsNone(self.guard.test)
+
+    def test_violation_fails_test(self):
+        result_class = testing.budget_result_class(
+            unittest.TextTestResult, self.guard
+        )
+        result = result_class(unittest.runner._WritelnDecorator(StringIO()),
+                              True, 0)
+        guard = self.guard
+
+        class Heavy(GuardedCase):
+            def runTest(self):
+                guard.record('GET', '/a/', response('a:list'),
+                             ['SELECT 1'] * 3)
+
+        Heavy.__module__ = GuardedCase.__module__
+        Heavy().run(result)
+
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('QueryBudgetExceeded', result.failures[0][1])
@@ -0,0 +1,14 @@
+'''
+URL mapping for health checks.
+'''
+
+from django.urls import path
+
+from core import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('live/', views.liveness, name='live'),
+    path('ready/', views.readiness, name='ready'),
+]
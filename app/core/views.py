@@ -0,0 +1,51 @@
+'''
+Health check and metrics views.
+
+These are plain Django views: they skip DRF, authentication and the
+system checks so probes and scrapes stay cheap. Failures are logged, not
+returned, since the probes are unauthenticated.
+'''
+import logging
+
+from django.db import DatabaseError
+from django.http import HttpResponse, JsonResponse
+
+from core.health import pending_migrations, probe_database
+from core.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+_migrations_applied = False
+
+
+def liveness(request):
+    '''Report that the process is up, without touching the database.'''
+    return JsonResponse({'status': 'ok'})
+
+
+def readiness(request):
+    '''Report whether the database is reachable and fully migrated.'''
+    global _migrations_applied
+    try:
+        probe_database()
+        if not _migrations_applied:
+            # Applied migrations never become unapplied under a running
+            # process, so this is only checked until it first succeeds.
+            _migrations_applied = not pending_migrations()
+    except DatabaseError:
+        logger.exception('Readiness check could not reach the database')
+        return JsonResponse({'status': 'unavailable'}, status=503)
+
+    if not _migrations_applied:
+        logger.warning('Readiness check found unapplied migrations')
+        return JsonResponse({'status': 'unavailable'}, status=503)
+
+    return JsonResponse({'status': 'ok'})
+
+
+def metrics(request):
+    '''Expose this process's metrics in the Prometheus text format.'''
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,80 @@
+'''
+Set-based bulk operations on tags and ingredients.
+'''
+from django.db import transaction
+from django.db.models import Case, CharField, F, Min, Value, When
+from django.db.models.functions import Cast, Concat
+
+from core import changes, counters
+from core.models import normalize_name
+
+
+def bulk_delete(model, user, ids):
+    '''Delete the user's objects in `ids` and return how many went.'''
+    objects = model.objects.filter(user=user, id__in=ids)
+    with transaction.atomic():
+        changes.record_linked_recipes(model, objects.values('id'))
+        _, deleted = objects.delete()
+    return deleted.get(model._meta.label, 0)
+
+
+def bulk_rename(model, user, names):
+    '''Rename the user's objects from an {id: name} mapping at once.
+
+    The unique names are first moved aside to a per-id placeholder that
+    no normalized name can take, so renames may swap names between the
+    objects without colliding halfway through the UPDATE.
+    '''
+    objects = model.objects.filter(user=user, id__in=names)
+    with transaction.atomic():
+        objects.update(normalized_name=Concat(
+            Value(' '), Cast('id', output_field=CharField()),
+        ))
+        updated = objects.update(
+            name=Case(
+                *(When(id=obj_id, then=Value(name))
+                  for obj_id, name in names.items()),
+                default=F('name'),
+            ),
+            normalized_name=Case(
+                *(When(id=obj_id, then=Value(normalize_name(name)))
+                  for obj_id, name in names.items()),
+            ),
+        )
+        changes.record(user.id, model, objects.values_list('id', flat=True))
+
+    return updated
+
+
+def merge(model, user, target, source_ids):
+    '''Fold the `source_ids` objects into `target` and delete them.
+
+    Every recipe linked to a source ends up linked to the target exactly
+    once. Links are repointed with one UPDATE after dropping the ones
+    that would duplicate an existing link.
+    '''
+    through = counters.through_model(model)
+    field = f'{counters.target_field(model)}_id'
+
+    with transaction.atomic():
+        sources = model.objects.filter(
+            user=user, id__in=source_ids
+        ).exclude(id=target.id)
+        source_links = through.objects.filter(**{f'{field}__in': sources})
+        changes.record_linked_recipes(model, sources.values('id'))
+
+        # Recipes that already have the target keep only that link.
+        source_links.filter(recipe_id__in=through.objects.filter(
+            **{field: target.id}
+        ).values('recipe_id')).delete()
+        # Recipes with several sources keep one of them.
+        source_links.exclude(id__in=source_links.values('recipe_id').annotate(
+            keep=Min('id')
+        ).values('keep')).delete()
+        source_links.update(**{field: target.id})
+
+        _, deleted = sources.delete()
+        counters.repair_counts(model, model.objects.filter(id=target.id))
+    target.refresh_from_db()
+
+    return deleted.get(model._meta.label, 0)
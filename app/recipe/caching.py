@@ -0,0 +1,30 @@
+'''
+Per-user cache versioning for derived recipe data.
+
+The version is the user's change feed cursor (core.changes). Every write
+to a recipe, tag or ingredient advances it in the same transaction, and
+it lives in the database, so all processes see a new version as soon as
+the write commits, whatever cache backend they use.
+'''
+from core.models import ChangeSequence
+
+
+def get_user_version(user_id):
+    '''Return the current data version for a user.'''
+    return ChangeSequence.objects.filter(user_id=user_id).values_list(
+        'last', flat=True
+    ).first() or 0
+
+
+def get_request_version(request):
+    '''Return the requesting user's data version, read once per request.'''
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_user_version(request.user.id)
+    return request._data_version
+
+
+def user_cache_key(prefix, request, *parts):
+    '''Build a cache key scoped to the requesting user's data version.'''
+    user_id = request.user.id
+    version = get_request_version(request)
+    return ':'.join(str(part) for part in (prefix, user_id, version, *parts))
@@ -0,0 +1,44 @@
+'''
+Facet counts for filtered recipe lists.
+'''
+from django.db.models import CharField, Count, F, Value
+
+from core import counters
+from core.models import Tag, Ingredient
+
+
+FACET_MODELS = {
+    'tags': Tag,
+    'ingredients': Ingredient,
+}
+
+
+def facet_counts(queryset):
+    '''Return per-tag and per-ingredient recipe counts for a queryset.
+
+    Both facets are computed by a single UNION ALL of grouped counts over
+    the through tables, restricted to the recipes in `queryset`.
+    '''
+    recipe_ids = queryset.order_by().values('id')
+    parts = []
+    for kind, model in FACET_MODELS.items():
+        field = counters.target_field(model)
+        parts.append(
+            counters.through_model(model).objects.filter(
+                recipe_id__in=recipe_ids,
+            ).order_by().values(
+                facet_id=F(f'{field}_id'),
+                facet_name=F(f'{field}__name'),
+            ).annotate(
+                kind=Value(kind, output_field=CharField()),
+                count=Count('recipe_id'),
+            ).values_list('kind', 'facet_id', 'facet_name', 'count')
+        )
+
+    facets = {kind: [] for kind in FACET_MODELS}
+    for kind, facet_id, name, count in parts[0].union(*parts[1:], all=True):
+        facets[kind].append({'id': facet_id, 'name': name, 'count': count})
+    for values in facets.values():
+        values.sort(key=lambda facet: (-facet['count'], facet['name']))
+
+    return facets
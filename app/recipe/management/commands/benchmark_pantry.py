@@ -0,0 +1,96 @@
+"""
+Django command to time pantry ranking on a synthetic index.
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.seeding import sample_distinct, zipf_weights
+from recipe.pantry import PantryIndex
+
+
+class Command(BaseCommand):
+    """Build an in-memory pantry index and time ranking queries on it."""
+    help = 'Time pantry ranking for one user with many recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100000,
+            help='Recipes in the index.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Distinct ingredients, reused with a Zipf distribution.',
+        )
+        parser.add_argument(
+            '--pantry', type=int, default=10,
+            help='Ingredients per query.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Recipes returned per query.',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=200,
+            help='Queries to time.',
+        )
+        parser.add_argument(
+            '--changes', type=int, default=10,
+            help='Recipes changed per timed index update.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ranks = list(range(options['ingredients']))
+        weights = zipf_weights(options['ingredients'], 1.1)
+
+        links = [
+            (recipe_id, ingredient_id)
+            for recipe_id in range(1, options['recipes'] + 1)
+            for ingredient_id in sample_distinct(
+                rng, ranks, weights, rng.randint(3, 10)
+            )
+        ]
+        started = time.perf_counter()
+        index = PantryIndex(links)
+        built = time.perf_counter() - started
+
+        timings = []
+        for _ in range(options['queries']):
+            pantry = sample_distinct(rng, ranks, weights, options['pantry'])
+            started = time.perf_counter()
+            index.rank(pantry, options['limit'])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        updates = []
+        for _ in range(20):
+            changed = rng.sample(range(1, options['recipes'] + 1),
+                                 options['changes'])
+            changed_links = [
+                (recipe_id, ingredient_id) for recipe_id in changed
+                for ingredient_id in sample_distinct(
+                    rng, ranks, weights, rng.randint(3, 10)
+                )
+            ]
+            started = time.perf_counter()
+            index.updated(dict.fromkeys(changed, False), changed_links)
+            updates.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(
+            f"{options['recipes']} recipes, {len(links)} links, "
+            f"built in {built:.2f} s"
+        )
+        self.stdout.write(f'rank {self._percentiles(timings)}')
+        self.stdout.write(
+            f"update of {options['changes']} recipes "
+            f'{self._percentiles(updates)}'
+        )
+
+    def _percentiles(self, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        return (f'p50 {statistics.median(timings):.2f} ms, '
+                f'p99 {p99:.2f} ms')
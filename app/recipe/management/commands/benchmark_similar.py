@@ -0,0 +1,115 @@
+"""
+Django command to time similar recipe queries on a seeded collection.
+"""
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import benchmark, purge, seeding
+from core.models import Recipe
+from recipe.similarity import similar_recipes
+
+
+PREFIX = 'bench-similar'
+
+
+class Command(BaseCommand):
+    """Seed one user with many recipes and time similar recipe queries."""
+    help = 'Time similar recipe queries for one user with many recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--yes', action='store_true',
+            help='Confirm seeding and writing to the configured database.',
+        )
+        parser.add_argument(
+            '--keep-data', action='store_true',
+            help='Keep the seeded user for the next run instead of '
+                 'purging it.',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=1000000,
+            help='Recipes of the seeded user.',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=200,
+            help='Distinct tags, reused with a Zipf distribution.',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Distinct ingredients, reused with a Zipf distribution.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Recipes returned per query.',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=200,
+            help='Queries to time.',
+        )
+        parser.add_argument(
+            '--budget', type=int, default=None,
+            help='Posting rows scanned per relation (default: '
+                 'SIMILAR_RECIPES_POSTING_BUDGET).',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not options['yes']:
+            raise CommandError(
+                f'This seeds and writes to the '
+                f'{benchmark.target_description()}. Run it against a '
+                'disposable environment and pass --yes.'
+            )
+
+        user = get_user_model().objects.filter(
+            email=f'{PREFIX}-0@example.com'
+        ).first()
+        try:
+            if user is None:
+                started = time.perf_counter()
+                user, = seeding.seed(
+                    1, options['recipes'], options['tags'],
+                    options['ingredients'], seed=options['seed'],
+                    prefix=PREFIX,
+                )
+                self.stdout.write(
+                    f"Seeded {options['recipes']} recipes in "
+                    f'{time.perf_counter() - started:.0f} s'
+                )
+            budget = (options['budget']
+                      or settings.SIMILAR_RECIPES_POSTING_BUDGET)
+            with override_settings(SIMILAR_RECIPES_POSTING_BUDGET=budget):
+                timings = self._time_queries(user, options)
+        finally:
+            if user is not None and not options['keep_data']:
+                purge.purge_user(user.id)
+
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'budget {budget} rows, '
+            f'similar p50 {statistics.median(timings):.2f} ms, '
+            f'p99 {p99:.2f} ms'
+        )
+
+    def _time_queries(self, user, options):
+        rng = random.Random(options['seed'])
+        recipe_ids = list(Recipe.objects.filter(user=user).order_by(
+            'id').values_list('id', flat=True))
+
+        count = min(options['queries'], len(recipe_ids))
+
+        timings = []
+        for recipe_id in rng.sample(recipe_ids, count):
+            # The view has loaded the recipe before ranking.
+            recipe = Recipe.objects.get(id=recipe_id)
+            started = time.perf_counter()
+            similar_recipes(recipe, options['limit'])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
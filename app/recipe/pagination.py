@@ -0,0 +1,119 @@
+'''
+Opt-in page number pagination with cheap totals for recipe APIs.
+'''
+from functools import partial
+
+from django.conf import settings
+
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from core.pagination import EstimatedCountPaginator
+from recipe.caching import user_cache_key
+
+
+# Parameters that change how results are presented, not which rows match.
+PRESENTATION_PARAMS = ('page', 'page_size', 'fields', 'facets', 'ordering')
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    '''Paginate only when `page` is given, estimating large totals.
+
+    Totals are exact up to ESTIMATED_COUNT_THRESHOLD rows. Above it they
+    come from planner statistics, or from a cached count on backends
+    without them, and `count_is_estimate` is true.
+    '''
+    page_size = settings.RECIPE_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+
+    def count_cache_key(self, request):
+        '''Return the cache key for the total of this filtered list.'''
+        params = request.query_params
+        signature = '&'.join(
+            f"{name}={','.join(sorted(params.getlist(name)))}"
+            for name in sorted(params) if name not in PRESENTATION_PARAMS
+        )
+        return user_cache_key(
+            'page-count', request, request.path, signature
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_query_param not in request.query_params:
+            return None
+
+        self.django_paginator_class = partial(
+            EstimatedCountPaginator,
+            cache_key=self.count_cache_key(request),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_estimate': self.page.paginator.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_schema(self, schema):
+        '''Return the schema of one page of `schema` items.'''
+        paginated = super().get_paginated_response_schema(schema)
+        paginated['properties']['count_is_estimate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        paginated['required'] = ['count', 'results']
+        return paginated
+
+    def get_paginated_response_schema(self, schema):
+        # Without `page` the list stays a bare array.
+        return {
+            'oneOf': [schema, self.get_page_schema(schema)],
+            'description': 'The results array, or a page of them when '
+                           '`page` is given.',
+        }
+
+
+FACETS_SCHEMA = {
+    'type': 'object',
+    'description': 'Number of listed recipes per tag and ingredient.',
+    'properties': {
+        kind: {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'integer'},
+                    'name': {'type': 'string'},
+                    'count': {'type': 'integer'},
+                },
+            },
+        }
+        for kind in ('tags', 'ingredients')
+    },
+}
+
+
+class FacetedPagination(EstimatedCountPagination):
+    '''Paginate recipe lists, which may carry facet counts.'''
+
+    def get_page_schema(self, schema):
+        paginated = super().get_page_schema(schema)
+        paginated['properties']['facets'] = FACETS_SCHEMA
+        return paginated
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        # With `facets` and without `page`, the array moves into an object.
+        response['oneOf'].append({
+            'type': 'object',
+            'properties': {'results': schema, 'facets': FACETS_SCHEMA},
+            'required': ['results', 'facets'],
+            'additionalProperties': False,
+        })
+        response['description'] += (
+            ' With `facets`, the results come with their facet counts.'
+        )
+        return response
@@ -0,0 +1,286 @@
+'''
+Pantry matching over a per-user, column-wise bitset index.
+
+Recipes get bit positions in id order, and every ingredient a column:
+one integer with the bits of the recipes using it. Per-recipe counts are
+stored bit-sliced, as one integer per binary digit. A query is then a
+few dozen operations on whole columns, each covering every recipe at
+once, instead of a Python loop over the recipes.
+
+When the user's data changes, the recipes changed since the cached
+version are read from the change feed (core.changes) and only their bits
+are replaced; new recipes take the next positions. A full rebuild, which
+reads every link of the user, happens only when many recipes changed or
+many positions were vacated by deletes.
+'''
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+
+from core.models import Change, Recipe
+from recipe.caching import get_user_version
+
+
+def _bitset(positions, size):
+    '''Return an integer with the given bit positions set.'''
+    data = bytearray((size + 7) // 8)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, 'little')
+
+
+def _add(planes, column):
+    '''Add one to the bit-sliced counters `planes` wherever `column` is set.'''
+    carry = column
+    for digit, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[digit] = plane ^ carry
+        carry &= plane
+    if carry:
+        planes.append(carry)
+
+
+def _subtract(minuend, subtrahend):
+    '''Return the bit-sliced difference of counters, never negative.'''
+    difference = []
+    borrow = 0
+    for digit, left in enumerate(minuend):
+        right = subtrahend[digit] if digit < len(subtrahend) else 0
+        difference.append(left ^ right ^ borrow)
+        borrow = (right | borrow) & ~left | right & borrow & left
+    return difference
+
+
+def _extreme(planes, among, largest):
+    '''Return the smallest or largest counter among `among` and where.'''
+    value = 0
+    for digit in reversed(range(len(planes))):
+        if largest:
+            preferred = among & planes[digit]
+        else:
+            preferred = among & ~planes[digit]
+        if preferred:
+            among = preferred
+        if bool(preferred) == largest:
+            value |= 1 << digit
+    return value, among
+
+
+class PantryIndex:
+    '''Compact index from a user's recipes to their ingredient sets.'''
+
+    def __init__(self, links, recipe_ids=()):
+        ingredients_by_recipe = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in links:
+            ingredients_by_recipe.setdefault(recipe_id, []).append(
+                ingredient_id
+            )
+        self.recipe_ids = sorted(ingredients_by_recipe)
+        # Positions of deleted recipes, left empty until a rebuild.
+        self.vacant = frozenset()
+        # The ingredients at each position are links[starts[p]:ends[p]],
+        # so an update knows which columns to clear.
+        self.links = array('q')
+        self.starts = array('q', [0]) * len(self.recipe_ids)
+        self.ends = array('q', [0]) * len(self.recipe_ids)
+        self.live_links = 0
+        self.columns = {}
+        self.sizes = []
+        self._set(ingredients_by_recipe)
+
+    @classmethod
+    def build(cls, user_id):
+        '''Build the index from the user's recipe/ingredient links.'''
+        links = Recipe.ingredients.through.objects.filter(
+            recipe__user_id=user_id,
+        ).values_list('recipe_id', 'ingredient_id')
+        recipe_ids = Recipe.objects.filter(
+            user_id=user_id,
+        ).values_list('id', flat=True)
+
+        return cls(links.iterator(), recipe_ids.iterator())
+
+    def _position(self, recipe_id):
+        '''Return the recipe's bit position, or None if it has none.'''
+        position = bisect_left(self.recipe_ids, recipe_id)
+        if (position == len(self.recipe_ids)
+                or self.recipe_ids[position] != recipe_id
+                or position in self.vacant):
+            return None
+        return position
+
+    def _set(self, ingredients_by_recipe):
+        '''Set the bits of recipes that have none set yet.'''
+        size = len(self.recipe_ids)
+        positions = {}
+        sizes = {}
+        links = []
+        for recipe_id, ingredient_ids in ingredients_by_recipe.items():
+            position = self._position(recipe_id)
+            self.starts[position] = len(self.links) + len(links)
+            links.extend(ingredient_ids)
+            self.ends[position] = len(self.links) + len(links)
+            for ingredient_id in ingredient_ids:
+                positions.setdefault(ingredient_id, []).append(position)
+            sizes.setdefault(len(ingredient_ids), []).append(position)
+        self.links.extend(links)
+        self.live_links += len(links)
+
+        for ingredient_id, column in positions.items():
+            self.columns[ingredient_id] = (
+                self.columns.get(ingredient_id, 0) | _bitset(column, size)
+            )
+        for count, column in sizes.items():
+            column = _bitset(column, size)
+            for digit in range(count.bit_length()):
+                if count >> digit & 1:
+                    while len(self.sizes) <= digit:
+                        self.sizes.append(0)
+                    self.sizes[digit] |= column
+
+    def updated(self, changes, links):
+        '''Return a copy with the changed recipes re-indexed.
+
+        `changes` maps each changed recipe id to whether it was deleted,
+        and `links` are the current links of those that were not. Returns
+        None when a rebuild is due instead: new recipes would not be the
+        newest, or deletes and updates left most of the index unused.
+        '''
+        positions = {
+            recipe_id: self._position(recipe_id) for recipe_id in changes
+        }
+        added = sorted(
+            recipe_id for recipe_id, deleted in changes.items()
+            if not deleted and positions[recipe_id] is None
+        )
+        if added and self.recipe_ids and added[0] <= self.recipe_ids[-1]:
+            return None
+        changed = [
+            position for position in positions.values()
+            if position is not None
+        ]
+        vacant = self.vacant.union(
+            positions[recipe_id] for recipe_id, deleted in changes.items()
+            if deleted and positions[recipe_id] is not None
+        )
+        if (len(vacant) * 2 > len(self.recipe_ids) + len(added)
+                or len(self.links) > 2 * self.live_links + 1000):
+            return None
+
+        index = PantryIndex.__new__(PantryIndex)
+        index.recipe_ids = self.recipe_ids + added
+        index.vacant = vacant
+        index.links = self.links[:]
+        index.starts = self.starts + array('q', [0]) * len(added)
+        index.ends = self.ends + array('q', [0]) * len(added)
+        index.live_links = self.live_links
+
+        # Clear the changed recipes, then set the bits of those left.
+        size = len(self.recipe_ids)
+        cleared = {}
+        for position in changed:
+            start, end = self.starts[position], self.ends[position]
+            for ingredient_id in self.links[start:end]:
+                cleared.setdefault(ingredient_id, []).append(position)
+            index.ends[position] = start
+            index.live_links -= end - start
+        index.columns = dict(self.columns)
+        for ingredient_id, positions in cleared.items():
+            column = index.columns[ingredient_id] & ~_bitset(positions, size)
+            if column:
+                index.columns[ingredient_id] = column
+            else:
+                del index.columns[ingredient_id]
+        mask = ~_bitset(changed, size)
+        index.sizes = [plane & mask for plane in self.sizes]
+
+        ingredients_by_recipe = {
+            recipe_id: [] for recipe_id, deleted in changes.items()
+            if not deleted
+        }
+        for recipe_id, ingredient_id in links:
+            # Recipes changed since `changes` was read are left for the
+            # next update.
+            if recipe_id in ingredients_by_recipe:
+                ingredients_by_recipe[recipe_id].append(ingredient_id)
+        index._set(ingredients_by_recipe)
+        return index
+
+    def rank(self, ingredient_ids, limit):
+        '''Return [(recipe_id, missing, matched)] best matches first.
+
+        Recipes are ordered by fewest missing ingredients, then by most
+        matched ingredients, then newest first. Recipes matching nothing
+        are left out.
+        '''
+        matched = []
+        remaining = 0
+        for ingredient_id in set(ingredient_ids):
+            column = self.columns.get(ingredient_id)
+            if column is not None:
+                _add(matched, column)
+                remaining |= column
+        missing = _subtract(self.sizes, matched)
+
+        ranked = []
+        while remaining and len(ranked) < limit:
+            fewest, level = _extreme(missing, remaining, largest=False)
+            remaining ^= level
+            while level and len(ranked) < limit:
+                most, group = _extreme(matched, level, largest=True)
+                level ^= group
+                while group and len(ranked) < limit:
+                    newest = group.bit_length() - 1
+                    group ^= 1 << newest
+                    ranked.append((self.recipe_ids[newest], fewest, most))
+
+        return ranked
+
+
+# Above this share of recipes changed, rebuilding is cheaper than updating.
+UPDATE_FRACTION = 0.25
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _update(user_id, since, index):
+    '''Return `index` updated with the recipe changes after `since`.'''
+    changed = Change.objects.filter(
+        user_id=user_id, kind=Change.RECIPE, seq__gt=since,
+    )
+    changes = dict(changed.values_list('object_id', 'deleted'))
+    if len(changes) > len(index.recipe_ids) * UPDATE_FRACTION:
+        return None
+
+    links = Recipe.ingredients.through.objects.filter(
+        recipe_id__in=changed.filter(deleted=False).values('object_id'),
+    ).values_list('recipe_id', 'ingredient_id')
+    return index.updated(changes, links)
+
+
+def get_pantry_index(user_id):
+    '''Return the user's index, updated when their data changed.'''
+    version = get_user_version(user_id)
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(user_id)
+            return cached[1]
+
+    index = None
+    if cached is not None and cached[0] < version:
+        index = _update(user_id, *cached)
+    if index is None:
+        index = PantryIndex.build(user_id)
+    with _indexes_lock:
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > settings.PANTRY_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+
+    return index
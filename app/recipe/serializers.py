@@ -1,30 +1,61 @@
 '''
 Serializers for recipe APIs
 '''
+from django.conf import settings
+
 from rest_framework import serializers
 
-from core.models import Recipe, Tag, Ingredient
+from core.models import Change, Recipe, Tag, Ingredient, normalize_name
+
+
+class NamedObjectSerializerMixin:
+    '''Reject renames that collide with another of the user's names.'''
+
+    def validate_name(self, value):
+        if self.instance is not None:
+            model = type(self.instance)
+            if model.objects.filter(
+                user=self.instance.user_id,
+                normalized_name=normalize_name(value),
+            ).exclude(id=self.instance.id).exists():
+                raise serializers.ValidationError(
+                    f'A {model._meta.verbose_name} with this name '
+                    'already exists.'
+                )
+
+        return value
 
 
-class TagSerializers(serializers.ModelSerializer):
+class TagSerializers(NamedObjectSerializerMixin, serializers.ModelSerializer):
     '''Serializer for tag model.'''
 
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(NamedObjectSerializerMixin,
+                           serializers.ModelSerializer):
     '''Serializer for ingredient model.'''
 
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
 
-class RecipeSerializers(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    '''Keep only the fields named by the `fields` keyword argument.'''
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RecipeSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     '''Serializers for recipe model'''
     tags = TagSerializers(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -38,22 +69,18 @@ class RecipeSerializers(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def _get_or_create_tags(self, tags, recipe):
+        '''Link the recipe to exactly the given tags in one bulk set.'''
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = Tag.objects.upsert(auth_user, [tag['name'] for tag in tags])
+        recipe.tags.set(tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
+        '''Link the recipe to exactly the given ingredients in one bulk set.'''
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj,  created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = Ingredient.objects.upsert(
+            auth_user, [ingredient['name'] for ingredient in ingredients]
+        )
+        recipe.ingredients.set(ingredient_objs)
 
     def create(self, validated_data):
         '''Creata a recipe.'''
@@ -69,11 +96,9 @@ class RecipeSerializers(serializers.ModelSerializer):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
             self._get_or_create_tags(tags, instance)
 
         if ingredients is not None:
-            instance.ingredients.clear()
             self._get_or_create_ingredients(ingredients, instance)
 
         for attr, value in validated_data.items():
@@ -98,3 +123,199 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
         read_only_fields = ['id']
         extra_kwargs = {'image' : {'required' : 'True'}}
+
+
+class PantrySerializer(serializers.Serializer):
+    '''Serializer for pantry matching requests.'''
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000,
+    )
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    '''Serializer for recipe list range filters, ordering and facets.'''
+    ORDERING_FIELDS = ['time_minutes', 'price']
+
+    min_time = serializers.IntegerField(required=False, min_value=0)
+    max_time = serializers.IntegerField(required=False, min_value=0)
+    min_price = serializers.DecimalField(
+        required=False, max_digits=5, decimal_places=2, min_value=0,
+    )
+    max_price = serializers.DecimalField(
+        required=False, max_digits=5, decimal_places=2, min_value=0,
+    )
+    ordering = serializers.ChoiceField(
+        required=False,
+        choices=ORDERING_FIELDS + [f'-{name}' for name in ORDERING_FIELDS],
+    )
+    facets = serializers.BooleanField(required=False, default=False)
+
+    def order_by(self):
+        '''Return order_by arguments with an id tie-breaker.'''
+        ordering = self.validated_data.get('ordering')
+        if ordering is None:
+            return ['-id']
+        descending = ordering.startswith('-')
+        return [ordering, '-id' if descending else 'id']
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    '''Serializer for similar recipes query parameters.'''
+    limit = serializers.IntegerField(
+        default=10,
+        min_value=1,
+        max_value=settings.SIMILAR_RECIPES_MAX_LIMIT,
+    )
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    '''Serializer for batch retrieve query parameters.'''
+    ids = serializers.CharField()
+
+    def validate_ids(self, value):
+        '''Return the unique IDs in request order.'''
+        try:
+            ids = [int(recipe_id) for recipe_id in value.split(',')]
+        except ValueError:
+            raise serializers.ValidationError(
+                'Expected a comma separated list of integers.'
+            )
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.RECIPE_BATCH_MAX_IDS:
+            raise serializers.ValidationError(
+                f'At most {settings.RECIPE_BATCH_MAX_IDS} IDs per request.'
+            )
+
+        return ids
+
+
+class RecipeBatchResultSerializer(serializers.Serializer):
+    '''Serializer describing batch retrieve responses.'''
+    results = RecipeDetailSerializer(many=True)
+    missing = serializers.ListField(child=serializers.IntegerField())
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    '''Serializer for bulk deleting tags or ingredients.'''
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
+class BulkDeleteResultSerializer(serializers.Serializer):
+    '''Serializer describing bulk delete responses.'''
+    deleted = serializers.IntegerField()
+
+
+class RenameSerializer(serializers.Serializer):
+    '''Serializer for one entry of a bulk rename.'''
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=255)
+
+
+class BulkRenameSerializer(serializers.Serializer):
+    '''Serializer for bulk renaming tags or ingredients.'''
+    items = serializers.ListField(
+        child=RenameSerializer(),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+    def validate_items(self, value):
+        '''Return the renames as an {id: name} mapping.'''
+        names = {item['id']: item['name'] for item in value}
+        if len(names) != len(value):
+            raise serializers.ValidationError('Each id may appear only once.')
+
+        # Check the names as they stand after every rename, so swaps pass.
+        normalized = {normalize_name(name) for name in names.values()}
+        model = self.context['view'].queryset.model
+        if len(normalized) != len(names) or model.objects.filter(
+            user=self.context['request'].user,
+            normalized_name__in=normalized,
+        ).exclude(id__in=names).exists():
+            raise serializers.ValidationError(
+                'Names must stay unique per user.'
+            )
+
+        return names
+
+
+class MergeSerializer(serializers.Serializer):
+    '''Serializer for merging tags or ingredients into a target.'''
+    target = serializers.IntegerField()
+    sources = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+    def validate(self, attrs):
+        if attrs['target'] in attrs['sources']:
+            raise serializers.ValidationError(
+                'The target cannot also be a source.'
+            )
+
+        return attrs
+
+
+class SyncRecipeSerializer(serializers.ModelSerializer):
+    '''Serializer for recipes in the change feed, with related IDs.'''
+    tags = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    ingredients = serializers.PrimaryKeyRelatedField(
+        many=True, read_only=True,
+    )
+
+    class Meta:
+        model = Recipe
+        fields = RecipeDetailSerializer.Meta.fields
+        read_only_fields = fields
+
+
+class SyncTagSerializer(serializers.ModelSerializer):
+    '''Serializer for tags in the change feed.'''
+
+    class Meta:
+        model = Tag
+        fields = ['id', 'name']
+        read_only_fields = fields
+
+
+class SyncIngredientSerializer(serializers.ModelSerializer):
+    '''Serializer for ingredients in the change feed.'''
+
+    class Meta:
+        model = Ingredient
+        fields = ['id', 'name']
+        read_only_fields = fields
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    '''Serializer for change feed query parameters.'''
+    since = serializers.IntegerField(default=0, min_value=0)
+    limit = serializers.IntegerField(
+        default=settings.SYNC_DEFAULT_LIMIT,
+        min_value=1,
+        max_value=settings.SYNC_MAX_LIMIT,
+    )
+
+
+class SyncChangeSerializer(serializers.Serializer):
+    '''Serializer describing one change feed entry.'''
+    seq = serializers.IntegerField()
+    type = serializers.ChoiceField(choices=Change.KIND_CHOICES)
+    id = serializers.IntegerField()
+    deleted = serializers.BooleanField()
+    data = serializers.DictField(allow_null=True)
+
+
+class SyncResultSerializer(serializers.Serializer):
+    '''Serializer describing change feed responses.'''
+    changes = SyncChangeSerializer(many=True)
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
@@ -0,0 +1,81 @@
+'''
+Similar recipe lookup over the tag and ingredient posting lists.
+
+The Recipe.tags and Recipe.ingredients through tables, indexed on the tag
+and ingredient columns, act as an inverted index from feature to recipes.
+It is maintained incrementally by every link change. The recipe counters
+give each posting list's length, so common features such as "salt" can be
+skipped and the rows scanned per query stay bounded. A feature over the
+budget on its own is still used, but only through the first `budget` rows
+of its posting list. The selected posting lists are counted and ranked in
+one query, so only the best matches leave the database.
+'''
+from django.conf import settings
+from django.db import connections
+
+from core import counters
+from core.models import Recipe
+
+
+def _select_features(features, budget):
+    '''Pick the rarest features whose posting lists fit in the budget.'''
+    selected = []
+    scanned = 0
+    for feature_id, recipe_count in sorted(features, key=lambda f: f[1]):
+        if selected and scanned + recipe_count > budget:
+            break
+        selected.append(feature_id)
+        scanned += recipe_count
+
+    return selected, scanned
+
+
+def similar_recipes(recipe, limit):
+    '''Return [(recipe, shared)] for the recipes most similar to `recipe`.
+
+    Similarity is the number of shared tags and ingredients.
+    '''
+    budget = settings.SIMILAR_RECIPES_POSTING_BUDGET
+    postings = []
+    for model, relation in counters.COUNTED_RELATIONS.items():
+        features = getattr(recipe, relation).values_list('id', 'recipe_count')
+        feature_ids, scanned = _select_features(features, budget)
+        if not feature_ids:
+            continue
+
+        target = f'{counters.target_field(model)}_id'
+        posting = counters.through_model(model).objects.filter(
+            **{f'{target}__in': feature_ids},
+        ).exclude(
+            recipe_id=recipe.id,
+        ).order_by().values('recipe_id')
+        if scanned > budget:
+            posting = posting[:budget]
+        postings.append(posting)
+    if not postings:
+        return []
+
+    queries = [posting.query.sql_with_params() for posting in postings]
+    # Each list is wrapped, as SQLite allows no LIMIT inside a UNION.
+    union = ' UNION ALL '.join(
+        f'SELECT recipe_id FROM ({sql}) posting_{index}'
+        for index, (sql, _) in enumerate(queries)
+    )
+    params = [param for _, query_params in queries
+              for param in query_params]
+    with connections[postings[0].db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT recipe_id, COUNT(*) AS shared FROM ({union}) postings '
+            'GROUP BY recipe_id ORDER BY shared DESC, recipe_id DESC '
+            'LIMIT %s',
+            [*params, limit],
+        )
+        top = cursor.fetchall()
+
+    recipes = Recipe.objects.filter(
+        user_id=recipe.user_id,
+        id__in=[recipe_id for recipe_id, _ in top],
+    ).prefetch_related('tags', 'ingredients').in_bulk()
+
+    return [(recipes[recipe_id], shared) for recipe_id, shared in top
+            if recipe_id in recipes]
@@ -16,6 +16,7 @@ from recipe.serializers import IngredientSerializer
 
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+MERGE_URL = reverse('recipe:ingredient-merge')
 
 def detail_url(ingredient_id):
     '''Create and return ingredient detail URL'''
@@ -99,6 +100,7 @@ class PrivateIngredientAPITest(TestCase):
         )
 
         recipe.ingredients.add(ing1)
+        ing1.refresh_from_db()
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only' : 1})
         s1 = IngredientSerializer(ing1)
@@ -127,3 +129,30 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only' : 1})
         self.assertEqual(len(res.data), 1)
+
+
+class MergeIngredientsAPITest(TestCase):
+    '''Test merging ingredients.'''
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_merge_ingredients(self):
+        target = Ingredient.objects.create(user=self.user, name='Tomato')
+        source = Ingredient.objects.create(user=self.user, name='tomatoes')
+        recipe = Recipe.objects.create(
+            title='Salad', time_minutes=5, price=Decimal('2.00'),
+            user=self.user,
+        )
+        recipe.ingredients.add(source)
+
+        res = self.client.post(
+            MERGE_URL, {'target': target.id, 'sources': [source.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 1)
+        self.assertEqual(list(recipe.ingredients.all()), [target])
+        self.assertFalse(Ingredient.objects.filter(id=source.id).exists())
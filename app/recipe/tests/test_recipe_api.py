@@ -2,36 +2,71 @@
 Test for recipe APIs.
 '''
 from decimal import Decimal
+from io import StringIO
+import random
 import tempfile
+import threading
+import time
 import os
+from unittest.mock import patch
 
 from  PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import singleflight
+from core.schema import generate_schema
 from core.models import Recipe, Tag, Ingredient
 
+from recipe import pantry as pantry_module
+from recipe.pantry import PantryIndex
+from recipe.views import RecipeViewSets
 from recipe.serializers import (
     RecipeSerializers,
     RecipeDetailSerializer,
 )
 
 RECIPE_URL = reverse('recipe:recipe-list')
+PANTRY_URL = reverse('recipe:recipe-pantry')
+BATCH_URL = reverse('recipe:recipe-batch')
 
 def detail_url(recipe_id):
     '''Create and return recipe detail URL.'''
     return reverse(f'recipe:recipe-detail', args=[recipe_id])
 
+
+def similar_url(recipe_id):
+    '''Create and return similar recipes URL.'''
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
 def upload_image_url(recipe_id):
     '''Create and return recipe detail URL'''
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
 
+def worker_cache(location):
+    '''Give the test the local cache of another worker process.'''
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': location,
+    }})
+
+
 def create_recipe(user, **params):
     '''Create and return a sample recipe'''
     default = {
@@ -269,6 +304,28 @@ class PrivateRecipeAPITest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_recipe_count_follows_tag_updates(self):
+        tag_breakfast = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag_breakfast)
+
+        payload = {'tags': [{'name': 'Breakfast'}, {'name': 'Lunch'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        tag_breakfast.refresh_from_db()
+        tag_lunch = Tag.objects.get(user=self.user, name='Lunch')
+        self.assertEqual(tag_breakfast.recipe_count, 1)
+        self.assertEqual(tag_lunch.recipe_count, 1)
+
+        res = self.client.patch(
+            detail_url(recipe.id), {'tags': []}, format='json'
+        )
+        tag_breakfast.refresh_from_db()
+        tag_lunch.refresh_from_db()
+        self.assertEqual(tag_breakfast.recipe_count, 0)
+        self.assertEqual(tag_lunch.recipe_count, 0)
+
     def test_create_recipe_with_new_ingredient(self):
         payload = {
             'title' : 'Pie',
@@ -393,6 +450,651 @@ class PrivateRecipeAPITest(TestCase):
         self.assertNotIn(s3.data, res.data)
 
 
+class RecipeRangeFilterAPITests(TestCase):
+    '''Tests for range filters and ordering on the recipe list.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+        self.quick = create_recipe(
+            user=self.user, time_minutes=10, price=Decimal('12.00')
+        )
+        self.cheap = create_recipe(
+            user=self.user, time_minutes=45, price=Decimal('4.50')
+        )
+        self.slow = create_recipe(
+            user=self.user, time_minutes=90, price=Decimal('9.99')
+        )
+
+    def _ids(self, params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_filter_by_time(self):
+        self.assertEqual(
+            self._ids({'max_time': 45}), [self.cheap.id, self.quick.id]
+        )
+        self.assertEqual(
+            self._ids({'min_time': 45, 'max_time': 60}), [self.cheap.id]
+        )
+
+    def test_filter_by_price(self):
+        self.assertEqual(
+            self._ids({'max_price': '10'}), [self.slow.id, self.cheap.id]
+        )
+        self.assertEqual(self._ids({'min_price': '10'}), [self.quick.id])
+
+    def test_ordering(self):
+        self.assertEqual(
+            self._ids({'ordering': 'price'}),
+            [self.cheap.id, self.slow.id, self.quick.id],
+        )
+        self.assertEqual(
+            self._ids({'ordering': '-time_minutes'}),
+            [self.slow.id, self.cheap.id, self.quick.id],
+        )
+
+    def test_ordering_ties_broken_by_id(self):
+        twin = create_recipe(
+            user=self.user, time_minutes=10, price=Decimal('1.00')
+        )
+
+        self.assertEqual(
+            self._ids({'ordering': 'time_minutes'})[:2],
+            [self.quick.id, twin.id],
+        )
+        self.assertEqual(
+            self._ids({'ordering': '-time_minutes'})[-2:],
+            [twin.id, self.quick.id],
+        )
+
+    def test_invalid_params_rejected(self):
+        for params in ({'max_time': 'soon'}, {'min_price': '-1'},
+                       {'ordering': 'title'}):
+            res = self.client.get(RECIPE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_params_ignored_by_detail_actions(self):
+        url = f'{detail_url(self.quick.id)}?ordering=bogus&max_time=soon'
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.patch(url, {'title': 'Renamed'}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.delete(url)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class SparseFieldsAPITests(TestCase):
+    '''Tests for the fields parameter.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+    def test_list_only_requested_fields(self):
+        res = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, [{'id': self.recipe.id, 'title': self.recipe.title}]
+        )
+
+    def test_unrequested_relations_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('core_tag', sql)
+        self.assertNotIn('"core_recipe"."description"', sql)
+
+    def test_requested_relation_included(self):
+        res = self.client.get(RECIPE_URL, {'fields': 'title,tags'})
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+        self.assertNotIn('ingredients', res.data[0])
+
+    def test_detail_fields(self):
+        res = self.client.get(
+            detail_url(self.recipe.id), {'fields': 'description'}
+        )
+
+        self.assertEqual(res.data, {'description': self.recipe.description})
+
+    def test_unknown_field_rejected(self):
+        res = self.client.get(RECIPE_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', str(res.data['fields']))
+
+
+class BatchRetrieveAPITests(TestCase):
+    '''Tests for the batch retrieve action.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            create_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(3)
+        ]
+        for recipe in self.recipes:
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=recipe.title)
+            )
+
+    def _ids(self, ids):
+        return ','.join(str(recipe_id) for recipe_id in ids)
+
+    def test_order_preserved(self):
+        ids = [self.recipes[2].id, self.recipes[0].id]
+        res = self.client.get(BATCH_URL, {'ids': self._ids(ids)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']], ids)
+        self.assertEqual(
+            res.data['results'][0],
+            RecipeDetailSerializer(self.recipes[2]).data,
+        )
+        self.assertEqual(res.data['missing'], [])
+
+    def test_missing_and_foreign_ids_reported(self):
+        other = create_user(email='other@example.com', password='test123')
+        foreign = create_recipe(user=other)
+        ids = [self.recipes[0].id, foreign.id, 999999]
+        res = self.client.get(BATCH_URL, {'ids': self._ids(ids)})
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [self.recipes[0].id],
+        )
+        self.assertEqual(res.data['missing'], [foreign.id, 999999])
+
+    def test_fixed_number_of_queries(self):
+        more = [create_recipe(user=self.user) for _ in range(5)]
+        ids = self._ids(recipe.id for recipe in self.recipes + more)
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(BATCH_URL, {'ids': self._ids(
+                [self.recipes[0].id]
+            )})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(BATCH_URL, {'ids': ids})
+
+        self.assertEqual(len(large), len(small))
+
+    @override_settings(RECIPE_BATCH_MAX_IDS=2)
+    def test_too_many_ids_rejected(self):
+        res = self.client.get(BATCH_URL, {'ids': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_ids_rejected(self):
+        for ids in ('', '1,x'):
+            res = self.client.get(BATCH_URL, {'ids': ids})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeFacetsAPITests(TestCase):
+    '''Tests for facet counts on the recipe list.'''
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        r1 = create_recipe(user=self.user, title='Salad')
+        r2 = create_recipe(user=self.user, title='Soup')
+        r3 = create_recipe(user=self.user, title='Steak')
+        r1.tags.add(self.vegan, self.quick)
+        r2.tags.add(self.vegan)
+        r3.tags.add(self.quick)
+        r1.ingredients.add(self.salt)
+
+    def test_list_without_facets_unchanged(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(res.data, list)
+
+    def test_facets_for_filtered_recipes(self):
+        params = {'tags': f'{self.vegan.id}', 'facets': 1}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(res.data['facets']['tags'], [
+            {'id': self.vegan.id, 'name': 'Vegan', 'count': 2},
+            {'id': self.quick.id, 'name': 'Quick', 'count': 1},
+        ])
+        self.assertEqual(res.data['facets']['ingredients'], [
+            {'id': self.salt.id, 'name': 'Salt', 'count': 1},
+        ])
+
+    def test_facets_cached_until_recipes_change(self):
+        params = {'facets': 1}
+        self.client.get(RECIPE_URL, params)
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPE_URL, params)
+        self.assertFalse(
+            any('UNION' in query['sql'] for query in queries.captured_queries)
+        )
+        self.assertEqual(res.data['facets']['tags'][0]['count'], 2)
+
+        recipe = create_recipe(user=self.user, title='Tofu')
+        recipe.tags.add(self.quick)
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.data['facets']['tags'][0], {
+            'id': self.quick.id, 'name': 'Quick', 'count': 3,
+        })
+
+    def test_facets_refreshed_after_write_by_other_worker(self):
+        params = {'facets': 'true'}
+        with worker_cache('facets-first'):
+            self.client.get(RECIPE_URL, params)
+        with worker_cache('facets-second'):
+            recipe = create_recipe(user=self.user, title='Tofu')
+            recipe.tags.add(self.quick)
+        with worker_cache('facets-first'):
+            res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.data['facets']['tags'][0]['count'], 3)
+
+    def test_facets_flag_accepts_booleans(self):
+        for value in ('true', 'yes', 'on'):
+            res = self.client.get(RECIPE_URL, {'facets': value})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIn('facets', res.data)
+
+        res = self.client.get(RECIPE_URL, {'facets': 'false'})
+
+        self.assertIsInstance(res.data, list)
+
+    def test_invalid_facets_flag_rejected(self):
+        res = self.client.get(RECIPE_URL, {'facets': 'maybe'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schema_documents_facets(self):
+        component = generate_schema()['components']['schemas'][
+            'PaginatedRecipeSerializersList'
+        ]
+
+        bare, paged, faceted = component['oneOf']
+        self.assertIn('facets', paged['properties'])
+        self.assertEqual(faceted['required'], ['results', 'facets'])
+
+
+class RecipePaginationAPITests(TestCase):
+    '''Tests for page number pagination of the recipe list.'''
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            if i % 2 == 0:
+                recipe.tags.add(self.vegan)
+
+    def test_exact_count_below_threshold(self):
+        res = self.client.get(RECIPE_URL, {'page': 1, 'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 5)
+        self.assertFalse(res.data['count_is_estimate'])
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+    def test_cached_count_above_threshold(self):
+        params = {'page': 3, 'page_size': 2, 'fields': 'id'}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertTrue(res.data['count_is_estimate'])
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIsNone(res.data['next'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPE_URL, {**params, 'page': 1})
+        self.assertFalse(any(
+            query['sql'].startswith('SELECT COUNT(*) AS "__count"')
+            for query in queries.captured_queries
+        ))
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+    def test_cached_count_per_filter(self):
+        self.client.get(RECIPE_URL, {'page': 1})
+        res = self.client.get(RECIPE_URL, {
+            'page': 1, 'tags': f'{self.vegan.id}',
+        })
+
+        self.assertEqual(res.data['count'], 3)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=2)
+    def test_cached_count_refreshed_after_change(self):
+        self.client.get(RECIPE_URL, {'page': 1})
+        create_recipe(user=self.user, title='Another')
+        res = self.client.get(RECIPE_URL, {'page': 1})
+
+        self.assertEqual(res.data['count'], 6)
+
+    def test_paginated_facets(self):
+        res = self.client.get(RECIPE_URL, {'page': 1, 'facets': 1})
+
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual(res.data['facets']['tags'][0]['count'], 3)
+
+    def test_list_without_page_unchanged(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertIsInstance(res.data, list)
+        self.assertEqual(len(res.data), 5)
+
+    def test_invalid_page(self):
+        res = self.client.get(RECIPE_URL, {'page': 9})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_schema_documents_bare_and_paged_lists(self):
+        components = generate_schema()['components']['schemas']
+
+        for name in ('PaginatedRecipeSerializersList',
+                     'PaginatedTagSerializersList'):
+            bare, paged = components[name]['oneOf'][:2]
+            self.assertEqual(bare['type'], 'array')
+            self.assertIn('count_is_estimate', paged['properties'])
+
+
+class SimilarRecipesAPITests(TestCase):
+    '''Tests for the similar recipes action.'''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        self.egg = Ingredient.objects.create(user=self.user, name='Egg')
+        self.asian = Tag.objects.create(user=self.user, name='Asian')
+
+        self.recipe = create_recipe(user=self.user, title='Fried rice')
+        self.recipe.ingredients.add(self.salt, self.rice, self.egg)
+        self.recipe.tags.add(self.asian)
+
+    def test_similar_ranked_by_shared_features(self):
+        close = create_recipe(user=self.user, title='Egg rice bowl')
+        close.ingredients.add(self.rice, self.egg)
+        close.tags.add(self.asian)
+        far = create_recipe(user=self.user, title='Boiled egg')
+        far.ingredients.add(self.egg)
+        create_recipe(user=self.user, title='Unrelated')
+
+        res = self.client.get(similar_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [close.id, far.id])
+        self.assertEqual([item['shared'] for item in res.data], [3, 1])
+
+    def test_similar_respects_limit(self):
+        for i in range(3):
+            create_recipe(user=self.user).ingredients.add(self.rice)
+
+        res = self.client.get(similar_url(self.recipe.id), {'limit': 2})
+
+        self.assertEqual(len(res.data), 2)
+
+    def test_invalid_limit_rejected(self):
+        for limit in ('abc', 0, -1, 51):
+            res = self.client.get(similar_url(self.recipe.id),
+                                  {'limit': limit})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(SIMILAR_RECIPES_POSTING_BUDGET=3)
+    def test_common_features_skipped_over_budget(self):
+        for i in range(3):
+            create_recipe(user=self.user).ingredients.add(self.salt)
+        match = create_recipe(user=self.user, title='Omelette')
+        match.ingredients.add(self.egg)
+
+        res = self.client.get(similar_url(self.recipe.id))
+
+        self.assertEqual([item['id'] for item in res.data], [match.id])
+
+    @override_settings(SIMILAR_RECIPES_POSTING_BUDGET=2)
+    def test_feature_over_budget_scanned_up_to_budget(self):
+        recipe = create_recipe(user=self.user, title='Salted water')
+        recipe.ingredients.add(self.salt)
+        for i in range(3):
+            create_recipe(user=self.user).ingredients.add(self.salt)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual({item['shared'] for item in res.data}, {1})
+
+    def test_similar_other_user_recipe_not_found(self):
+        other_user = create_user(email='other@example.com', password='test123')
+        recipe = create_recipe(user=other_user)
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SimilarBenchmarkCommandTests(TestCase):
+    '''Tests for the similar recipes benchmark command.'''
+
+    def test_confirmation_required(self):
+        with self.assertRaisesMessage(CommandError, '--yes'):
+            call_command('benchmark_similar', recipes=10, stdout=StringIO())
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_timed_and_purged(self):
+        out = StringIO()
+
+        call_command('benchmark_similar', yes=True, recipes=20, tags=3,
+                     ingredients=5, queries=5, stdout=out)
+
+        self.assertIn('similar p50', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class PantryAPITests(TestCase):
+    '''Tests for the pantry matching action.'''
+
+    def setUp(self):
+        cache.clear()
+        # User ids are reused between tests.
+        pantry_module._indexes.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+        self.egg = Ingredient.objects.create(user=self.user, name='Egg')
+        self.milk = Ingredient.objects.create(user=self.user, name='Milk')
+        self.flour = Ingredient.objects.create(user=self.user, name='Flour')
+        self.omelette = create_recipe(user=self.user, title='Omelette')
+        self.omelette.ingredients.add(self.egg, self.milk)
+        self.pancake = create_recipe(user=self.user, title='Pancake')
+        self.pancake.ingredients.add(self.egg, self.milk, self.flour)
+        self.bread = create_recipe(user=self.user, title='Bread')
+        self.bread.ingredients.add(self.flour)
+
+    def test_ranked_by_fewest_missing(self):
+        payload = {'ingredients': [self.egg.id, self.milk.id]}
+        res = self.client.post(PANTRY_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['missing'], item['matched'])
+             for item in res.data],
+            [(self.omelette.id, 0, 2), (self.pancake.id, 1, 2)],
+        )
+
+    def test_index_follows_recipe_changes(self):
+        payload = {'ingredients': [self.flour.id]}
+        self.client.post(PANTRY_URL, payload, format='json')
+
+        self.bread.ingredients.add(self.egg)
+        res = self.client.post(PANTRY_URL, payload, format='json')
+
+        self.assertEqual(
+            [(item['id'], item['missing']) for item in res.data],
+            [(self.bread.id, 1), (self.pancake.id, 2)],
+        )
+
+    def test_index_follows_writes_by_other_worker(self):
+        payload = {'ingredients': [self.flour.id]}
+        with worker_cache('pantry-first'):
+            self.client.post(PANTRY_URL, payload, format='json')
+        with worker_cache('pantry-second'):
+            self.omelette.ingredients.add(self.flour)
+        with worker_cache('pantry-first'):
+            res = self.client.post(PANTRY_URL, payload, format='json')
+
+        self.assertIn(self.omelette.id, [item['id'] for item in res.data])
+
+    @patch.object(pantry_module, 'UPDATE_FRACTION', 1)
+    def test_index_updated_without_rebuild(self):
+        payload = {'ingredients': [self.flour.id]}
+        self.client.post(PANTRY_URL, payload, format='json')
+
+        self.bread.delete()
+        scone = create_recipe(user=self.user, title='Scone')
+        scone.ingredients.add(self.flour, self.milk)
+        self.omelette.ingredients.add(self.flour)
+        with patch.object(PantryIndex, 'build') as build:
+            res = self.client.post(PANTRY_URL, payload, format='json')
+
+        build.assert_not_called()
+        self.assertEqual(
+            [(item['id'], item['missing']) for item in res.data],
+            [(scone.id, 1), (self.pancake.id, 2), (self.omelette.id, 2)],
+        )
+
+    def test_other_user_recipes_excluded(self):
+        other_user = create_user(email='other@example.com', password='test123')
+        other_egg = Ingredient.objects.create(user=other_user, name='Egg')
+        create_recipe(user=other_user).ingredients.add(other_egg)
+
+        payload = {'ingredients': [other_egg.id]}
+        res = self.client.post(PANTRY_URL, payload, format='json')
+
+        self.assertEqual(res.data, [])
+
+    def test_empty_pantry_bad_request(self):
+        res = self.client.post(PANTRY_URL, {'ingredients': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PantryIndexTests(SimpleTestCase):
+    '''Tests for ranking over the pantry index.'''
+
+    def brute_force(self, links, ingredient_ids, limit):
+        recipes = {}
+        for recipe_id, ingredient_id in links:
+            recipes.setdefault(recipe_id, set()).add(ingredient_id)
+        pantry = set(ingredient_ids)
+        ranked = sorted(
+            (len(ingredients - pantry), -len(ingredients & pantry),
+             -recipe_id)
+            for recipe_id, ingredients in recipes.items()
+            if ingredients & pantry
+        )
+        return [(-recipe_id, missing, -matched)
+                for missing, matched, recipe_id in ranked[:limit]]
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        for _ in range(200):
+            links = [
+                (recipe_id, ingredient_id)
+                for recipe_id in rng.sample(range(1, 1000), rng.randint(1, 80))
+                for ingredient_id in rng.sample(range(30), rng.randint(1, 12))
+            ]
+            index = PantryIndex(links)
+            pantry = [rng.randrange(40) for _ in range(rng.randint(1, 15))]
+            limit = rng.randint(1, 40)
+
+            self.assertEqual(index.rank(pantry, limit),
+                             self.brute_force(links, pantry, limit))
+
+    def test_updates_match_brute_force(self):
+        rng = random.Random(8)
+        recipes = {
+            recipe_id: rng.sample(range(30), rng.randint(1, 12))
+            for recipe_id in range(1, 200)
+        }
+        index = PantryIndex(
+            (recipe_id, ingredient_id)
+            for recipe_id, ingredient_ids in recipes.items()
+            for ingredient_id in ingredient_ids
+        )
+        next_id = 200
+        for _ in range(30):
+            changes = {}
+            for recipe_id in rng.sample(sorted(recipes), 5):
+                changes[recipe_id] = rng.random() < 0.3
+                if changes[recipe_id]:
+                    del recipes[recipe_id]
+                else:
+                    recipes[recipe_id] = rng.sample(range(30),
+                                                    rng.randint(0, 12))
+            for recipe_id in range(next_id, next_id + 3):
+                changes[recipe_id] = False
+                recipes[recipe_id] = rng.sample(range(30), rng.randint(1, 12))
+            next_id += 3
+            links = [
+                (recipe_id, ingredient_id)
+                for recipe_id, ingredient_ids in recipes.items()
+                for ingredient_id in ingredient_ids
+            ]
+
+            index = index.updated(changes, [
+                link for link in links if link[0] in changes
+            ]) or PantryIndex(links)
+            pantry = [rng.randrange(40) for _ in range(rng.randint(1, 15))]
+            limit = rng.randint(1, 40)
+
+            self.assertEqual(index.rank(pantry, limit),
+                             self.brute_force(links, pantry, limit))
+
+    def test_older_new_recipe_needs_rebuild(self):
+        index = PantryIndex([(5, 10)])
+
+        self.assertIsNone(index.updated({3: False}, [(3, 10)]))
+
+    def test_unknown_ingredients_match_nothing(self):
+        index = PantryIndex([(1, 10), (2, 11)])
+
+        self.assertEqual(index.rank([99], 5), [])
+
+
 class ImageUploadTests(TestCase):
     '''Tests for image upload API.'''
 
@@ -428,3 +1130,90 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def wait_for_waiters(key, timeout=5):
+    '''Block until another request waits on the running call for `key`.'''
+    deadline = time.monotonic() + timeout
+    while not singleflight.group.waiters(key):
+        if time.monotonic() > deadline:
+            raise AssertionError('No request joined the call.')
+        time.sleep(0.001)
+
+
+class CoalescedListTests(TransactionTestCase):
+    '''Tests for coalescing recipe list requests.'''
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price='1.00',
+        )
+
+    def test_identical_requests_share_response(self):
+        original = RecipeViewSets._list
+        runs = []
+        follower = {}
+
+        def get():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            follower['response'] = client.get(
+                RECIPE_URL, {'fields': 'title,id'}
+            )
+
+        def slow_list(view, request, *args, **kwargs):
+            runs.append(request)
+            thread = threading.Thread(target=get)
+            thread.start()
+            slow_list.thread = thread
+            wait_for_waiters(view.get_coalesce_key())
+            return original(view, request, *args, **kwargs)
+
+        with patch.object(RecipeViewSets, '_list', slow_list):
+            res = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+        slow_list.thread.join()
+
+        shared = follower['response']
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(shared.status_code, status.HTTP_200_OK)
+        self.assertEqual(shared.content, res.content)
+        self.assertEqual(shared.data, res.data)
+        self.assertIsNot(shared, res)
+
+    def test_errors_rendered_once(self):
+        res = self.client.get(RECIPE_URL, {'fields': 'nope'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_writes_start_a_new_flight(self):
+        keys = []
+
+        def capture(view, request, *args, **kwargs):
+            keys.append(view.get_coalesce_key())
+            return original(view, request, *args, **kwargs)
+
+        original = RecipeViewSets._list
+        with patch.object(RecipeViewSets, '_list', capture):
+            self.client.get(RECIPE_URL)
+            Recipe.objects.create(
+                user=self.user, title='Stew', time_minutes=5, price='1.00',
+            )
+            self.client.get(RECIPE_URL)
+
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEqual(keys[0][:4], keys[1][:4])
+
+    def test_disabled(self):
+        with self.settings(SINGLEFLIGHT_ENABLED=False), \
+                patch.object(singleflight.group, 'do') as patched_do:
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_do.assert_not_called()
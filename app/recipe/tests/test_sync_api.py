@@ -0,0 +1,145 @@
+'''
+Tests for the change feed sync API.
+'''
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+SYNC_URL = reverse('recipe:sync')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_user(email='user@example.com', password='testpass'):
+    return get_user_model().objects.create_user(email, password)
+
+
+class PublicSyncAPITests(TestCase):
+    '''Tests for unauthenticated sync requests.'''
+
+    def test_auth_required(self):
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncAPITests(TestCase):
+    '''Tests for authenticated sync requests.'''
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_recipe(self):
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': Decimal('5.50'),
+            'tags': [{'name': 'Dinner'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        return Recipe.objects.get(id=res.data['id'])
+
+    def test_full_sync_returns_current_data(self):
+        recipe = self._create_recipe()
+        tag = Tag.objects.get(user=self.user)
+        ingredient = Ingredient.objects.get(user=self.user)
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(c['type'], c['id']) for c in res.data['changes']],
+            [('tag', tag.id), ('ingredient', ingredient.id),
+             ('recipe', recipe.id)],
+        )
+        self.assertEqual(res.data['changes'][0]['data'],
+                         {'id': tag.id, 'name': 'Dinner'})
+        recipe_data = res.data['changes'][2]['data']
+        self.assertEqual(recipe_data['tags'], [tag.id])
+        self.assertEqual(recipe_data['ingredients'], [ingredient.id])
+        self.assertEqual(res.data['cursor'], 3)
+        self.assertFalse(res.data['has_more'])
+
+    def test_since_returns_only_newer_changes(self):
+        recipe = self._create_recipe()
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'title': 'Green curry'}, format='json',
+        )
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(len(res.data['changes']), 1)
+        self.assertEqual(res.data['changes'][0]['data']['title'],
+                         'Green curry')
+
+    def test_deleted_objects_become_tombstones(self):
+        recipe = self._create_recipe()
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(res.data['changes'], [{
+            'seq': cursor + 1, 'type': 'recipe', 'id': recipe.id,
+            'deleted': True, 'data': None,
+        }])
+
+    def test_deleting_tag_updates_linked_recipes(self):
+        recipe = self._create_recipe()
+        tag = Tag.objects.get(user=self.user)
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        res = self.client.get(SYNC_URL, {'since': cursor})
+
+        changes = {(c['type'], c['id']): c for c in res.data['changes']}
+        self.assertTrue(changes['tag', tag.id]['deleted'])
+        self.assertEqual(changes['recipe', recipe.id]['data']['tags'], [])
+
+    def test_paged_by_limit(self):
+        self._create_recipe()
+
+        first = self.client.get(SYNC_URL, {'limit': 2})
+        rest = self.client.get(
+            SYNC_URL, {'since': first.data['cursor'], 'limit': 2}
+        )
+
+        self.assertEqual(len(first.data['changes']), 2)
+        self.assertTrue(first.data['has_more'])
+        self.assertEqual(len(rest.data['changes']), 1)
+        self.assertFalse(rest.data['has_more'])
+
+    def test_empty_sync_is_one_query(self):
+        self._create_recipe()
+        cursor = self.client.get(SYNC_URL).data['cursor']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SYNC_URL, {'since': cursor})
+
+        self.assertEqual(res.data,
+                         {'changes': [], 'cursor': cursor, 'has_more': False})
+
+    def test_other_users_changes_hidden(self):
+        other = create_user('other@example.com')
+        Tag.objects.create(user=other, name='Private')
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.data['changes'], [])
+
+    def test_invalid_since_rejected(self):
+        res = self.client.get(SYNC_URL, {'since': -1})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
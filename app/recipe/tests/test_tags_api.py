@@ -15,6 +15,9 @@ from core.models import Tag, Recipe
 from recipe.serializers import TagSerializers
 
 TAGS_URL = reverse('recipe:tag-list')
+BULK_DELETE_URL = reverse('recipe:tag-bulk-delete')
+BULK_RENAME_URL = reverse('recipe:tag-bulk-rename')
+MERGE_URL = reverse('recipe:tag-merge')
 
 def detail_url(tag_id):
     '''Create and return a tag deatil url.'''
@@ -102,6 +105,7 @@ class PrivateTagsAPITest(TestCase):
         )
 
         recipe.tags.add(t1)
+        t1.refresh_from_db()
 
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
         s1 = TagSerializers(t1)
@@ -129,4 +133,192 @@ class PrivateTagsAPITest(TestCase):
         recipe2.tags.add(tag)
 
         res = self.client.get(TAGS_URL, {'assigned_only' : 1})
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_tags_paginated(self):
+        for name in ('Vegan', 'Dessert', 'Quick'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page': 2, 'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        self.assertFalse(res.data['count_is_estimate'])
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['Dessert'])
+
+
+class BulkTagsAPITest(TestCase):
+    '''Tests for bulk tag operations.'''
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _recipe(self, *tags):
+        recipe = Recipe.objects.create(
+            title='Sample', time_minutes=10, price=Decimal('1.00'),
+            user=self.user,
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def test_bulk_delete(self):
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        other_tag = Tag.objects.create(
+            user=create_user(email='other@example.com'), name='Other'
+        )
+
+        res = self.client.post(
+            BULK_DELETE_URL,
+            {'ids': [tags[0].id, tags[1].id, other_tag.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'deleted': 2})
+        self.assertEqual(
+            list(Tag.objects.values_list('id', flat=True).order_by('id')),
+            [tags[2].id, other_tag.id],
+        )
+
+    def test_bulk_rename(self):
+        t1 = Tag.objects.create(user=self.user, name='tomato')
+        t2 = Tag.objects.create(user=self.user, name='basil')
+        payload = {'items': [
+            {'id': t1.id, 'name': 'Tomato'},
+            {'id': t2.id, 'name': 'Basil'},
+        ]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(item['name'] for item in res.data), ['Basil', 'Tomato']
+        )
+        t1.refresh_from_db()
+        self.assertEqual(t1.name, 'Tomato')
+
+    def test_bulk_rename_duplicate_ids_rejected(self):
+        tag = Tag.objects.create(user=self.user, name='tomato')
+        payload = {'items': [
+            {'id': tag.id, 'name': 'A'}, {'id': tag.id, 'name': 'B'},
+        ]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_merge_repoints_and_dedupes(self):
+        target = Tag.objects.create(user=self.user, name='Tomato')
+        s1 = Tag.objects.create(user=self.user, name='Tomatoes')
+        s2 = Tag.objects.create(user=self.user, name='Cherry tomato')
+        keep = Tag.objects.create(user=self.user, name='Basil')
+        r1 = self._recipe(target, s1)
+        r2 = self._recipe(s1, s2, keep)
+        r3 = self._recipe(s2)
+
+        res = self.client.post(
+            MERGE_URL, {'target': target.id, 'sources': [s1.id, s2.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertFalse(Tag.objects.filter(id__in=[s1.id, s2.id]).exists())
+        for recipe in (r1, r3):
+            self.assertEqual(list(recipe.tags.all()), [target])
+        self.assertEqual(
+            set(r2.tags.all()), {target, keep}
+        )
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(tag=target).count(), 3
+        )
+
+    def test_merge_ignores_other_users_sources(self):
+        target = Tag.objects.create(user=self.user, name='Tomato')
+        other_tag = Tag.objects.create(
+            user=create_user(email='other@example.com'), name='tomato'
+        )
+
+        res = self.client.post(
+            MERGE_URL, {'target': target.id, 'sources': [other_tag.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(Tag.objects.filter(id=other_tag.id).exists())
+
+    def test_merge_into_other_users_target_not_found(self):
+        other_tag = Tag.objects.create(
+            user=create_user(email='other@example.com'), name='tomato'
+        )
+        source = Tag.objects.create(user=self.user, name='Tomato')
+
+        res = self.client.post(
+            MERGE_URL, {'target': other_tag.id, 'sources': [source.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Tag.objects.filter(id=source.id).exists())
+
+    def test_merge_target_in_sources_rejected(self):
+        tag = Tag.objects.create(user=self.user, name='Tomato')
+
+        res = self.client.post(
+            MERGE_URL, {'target': tag.id, 'sources': [tag.id]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_rename_conflict_rejected(self):
+        Tag.objects.create(user=self.user, name='Tomato')
+        tag = Tag.objects.create(user=self.user, name='Tomatoes')
+        payload = {'items': [{'id': tag.id, 'name': 'tomato'}]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Tomatoes')
+
+    def test_bulk_rename_swaps_names(self):
+        t1 = Tag.objects.create(user=self.user, name='Tomato')
+        t2 = Tag.objects.create(user=self.user, name='Basil')
+        payload = {'items': [
+            {'id': t1.id, 'name': 'basil'},
+            {'id': t2.id, 'name': 'tomato'},
+        ]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        t1.refresh_from_db()
+        t2.refresh_from_db()
+        self.assertEqual((t1.name, t1.normalized_name), ('basil', 'basil'))
+        self.assertEqual((t2.name, t2.normalized_name), ('tomato', 'tomato'))
+
+    def test_bulk_rename_to_same_name_rejected(self):
+        t1 = Tag.objects.create(user=self.user, name='Tomato')
+        t2 = Tag.objects.create(user=self.user, name='Basil')
+        payload = {'items': [
+            {'id': t1.id, 'name': 'Thyme'},
+            {'id': t2.id, 'name': ' thyme'},
+        ]}
+
+        res = self.client.post(BULK_RENAME_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        t1.refresh_from_db()
+        self.assertEqual(t1.name, 'Tomato')
+
+    def test_rename_conflict_rejected(self):
+        Tag.objects.create(user=self.user, name='Tomato')
+        tag = Tag.objects.create(user=self.user, name='Tomatoes')
+
+        res = self.client.patch(detail_url(tag.id), {'name': ' TOMATO '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -16,5 +16,6 @@ router.register('ingredients', views.IngredinetViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('', include(router.urls)),
 ]
@@ -7,14 +7,40 @@ from drf_spectacular.utils import(
     OpenApiParameter,
     OpenApiTypes,
 )
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core import changes, purge
+from core.db.replicas import ReplicaRoutingMixin
+from core.singleflight import CoalescingMixin
+from core.models import Change, Recipe, Tag, Ingredient
+from recipe import bulk, serializers
+from recipe.caching import get_request_version, user_cache_key
+from recipe.facets import facet_counts
+from recipe.pagination import EstimatedCountPagination, FacetedPagination
+from recipe.pantry import get_pantry_index
+from recipe.similarity import similar_recipes
+
+
+class UserDataCoalescingMixin(CoalescingMixin):
+    '''Coalesce only requests made against the same user data version.
+
+    A request sent after a write must not join a read that started
+    before it, so the version advanced by every write is part of the key.
+    '''
+
+    def coalesce_scope(self):
+        return (get_request_version(self.request),)
 
 
 @extend_schema_view(
@@ -30,15 +56,106 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredeint IDs to filter.'
             ),
+            OpenApiParameter(
+                'min_time',
+                OpenApiTypes.INT,
+                description='Only recipes taking at least this many minutes.'
+            ),
+            OpenApiParameter(
+                'max_time',
+                OpenApiTypes.INT,
+                description='Only recipes taking at most this many minutes.'
+            ),
+            OpenApiParameter(
+                'min_price',
+                OpenApiTypes.DECIMAL,
+                description='Only recipes costing at least this much.'
+            ),
+            OpenApiParameter(
+                'max_price',
+                OpenApiTypes.DECIMAL,
+                description='Only recipes costing at most this much.'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['time_minutes', '-time_minutes', 'price', '-price'],
+                description='Sort field; prefix with - for descending. '
+                            'Ties are broken by id.'
+            ),
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of fields to return.'
+            ),
+            OpenApiParameter(
+                'facets',
+                OpenApiTypes.BOOL,
+                description='Include tag and ingredient counts for the '
+                            'filtered recipes.'
+            ),
             ]
-    )
+    ),
+    retrieve=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of fields to return.'
+            ),
+        ]
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Maximum number of similar recipes to return, '
+                            f'from 1 to {settings.SIMILAR_RECIPES_MAX_LIMIT}.'
+            ),
+        ]
+    ),
+    pantry=extend_schema(
+        request=serializers.PantrySerializer,
+        responses=serializers.RecipeSerializers(many=True),
+    ),
+    batch=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'ids',
+                OpenApiTypes.STR,
+                required=True,
+                description='Comma separated list of recipe IDs to return.'
+            ),
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of fields to return.'
+            ),
+        ],
+        responses=serializers.RecipeBatchResultSerializer,
+    ),
 )
-class RecipeViewSets(viewsets.ModelViewSet):
+class RecipeViewSets(changes.RecordChangesMixin,
+                     UserDataCoalescingMixin,
+                     ReplicaRoutingMixin,
+                     viewsets.ModelViewSet):
     '''View for manage recipe APIs.'''
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = FacetedPagination
+    replica_actions = ('list', 'retrieve', 'similar', 'pantry', 'batch')
+    range_filters = {
+        'min_time': 'time_minutes__gte',
+        'max_time': 'time_minutes__lte',
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+    }
+    filter_params = ['tags', 'ingredients', *range_filters]
+    relations = ['tags', 'ingredients']
+    sparse_actions = ('list', 'retrieve', 'batch')
 
     def _params_to_ints(self, qs):
         '''Convert a list of string to intgers.'''
@@ -56,14 +173,108 @@ class RecipeViewSets(viewsets.ModelViewSet):
             ingredients_id  = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredients_id)
 
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+        # Range filters and ordering only shape the list, so other actions
+        # ignore the parameters instead of rejecting them.
+        ordering = ['-id']
+        if self.action == 'list':
+            params = self._filter_params()
+            for param, lookup in self.range_filters.items():
+                if param in params.validated_data:
+                    queryset = queryset.filter(
+                        **{lookup: params.validated_data[param]}
+                    )
+            ordering = params.order_by()
+
+        relations = self.relations
+        fields = self._sparse_fields()
+        if fields is not None:
+            relations = [name for name in relations if name in fields]
+            queryset = queryset.only(
+                'id', *(name for name in fields if name not in self.relations)
+            )
+
+        return queryset.filter(
+            user=self.request.user
+        ).order_by(*ordering).distinct().prefetch_related(*relations)
+
+    def _filter_params(self):
+        '''Return the validated list filters of the request.'''
+        if not hasattr(self, '_filters'):
+            self._filters = serializers.RecipeFilterSerializer(
+                data=self.request.query_params
+            )
+            self._filters.is_valid(raise_exception=True)
+
+        return self._filters
+
+    def _sparse_fields(self):
+        '''Return the fields named by `fields`, or None for all of them.'''
+        value = self.request.query_params.get('fields')
+        if not value or self.action not in self.sparse_actions:
+            return None
+
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = set(fields) - set(self.get_serializer_class().Meta.fields)
+        if unknown:
+            raise ValidationError(
+                {'fields': [f"Unknown fields: {', '.join(sorted(unknown))}."]}
+            )
+
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        '''Return a serializer limited to the requested fields.'''
+        fields = self._sparse_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+
+        return super().get_serializer(*args, **kwargs)
+
+    def _filter_signature(self):
+        '''Return a normalized signature of the list filters.'''
+        params = self.request.query_params
+        return '&'.join(
+            f"{name}={','.join(sorted(params.get(name, '').split(',')))}"
+            for name in self.filter_params
+        )
+
+    def _get_facets(self, queryset):
+        '''Return facet counts for the filtered queryset, cached.'''
+        key = user_cache_key(
+            'recipe-facets', self.request, self._filter_signature()
+        )
+        facets = cache.get(key)
+        if facets is None:
+            facets = facet_counts(queryset)
+            cache.set(key, facets, settings.RECIPE_FACETS_CACHE_TIMEOUT)
+
+        return facets
+
+    def list(self, request, *args, **kwargs):
+        '''List recipes, optionally with facet counts.'''
+        return self.coalesce(self._list, request, *args, **kwargs)
+
+    def _list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self._filter_params().validated_data['facets']:
+            facets = self._get_facets(
+                self.filter_queryset(self.get_queryset())
+            )
+            if self.paginator.page_query_param in request.query_params:
+                response.data['facets'] = facets
+            else:
+                response.data = {'results': response.data, 'facets': facets}
+
+        return response
 
     def get_serializer_class(self):
         '''Return serializer class for request.'''
-        if self.action == 'list':
+        if self.action in ('list', 'similar'):
             return serializers.RecipeSerializers
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'pantry':
+            return serializers.PantrySerializer
 
         return self.serializer_class
 
@@ -71,6 +282,10 @@ class RecipeViewSets(viewsets.ModelViewSet):
         '''Create a new recipe.'''
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        '''Delete the recipe without loading its related rows.'''
+        purge.purge_recipes([instance.id])
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         '''Upload an image to recipe'''
@@ -83,6 +298,73 @@ class RecipeViewSets(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        '''List the recipes sharing the most tags and ingredients.'''
+        params = serializers.SimilarQuerySerializer(
+            data=request.query_params
+        )
+        params.is_valid(raise_exception=True)
+        recipe = self.get_object()
+        matches = similar_recipes(recipe, params.validated_data['limit'])
+        serializer = self.get_serializer(
+            [match for match, _ in matches], many=True
+        )
+        data = serializer.data
+        for item, (_, shared) in zip(data, matches):
+            item['shared'] = shared
+
+        return Response(data)
+
+    @action(methods=['POST'], detail=False, pagination_class=None)
+    def pantry(self, request):
+        '''List recipes ranked by how well the given ingredients cover them.'''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        index = get_pantry_index(request.user.id)
+        ranked = index.rank(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['limit'],
+        )
+        recipes = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe_id for recipe_id, _, _ in ranked],
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        data = []
+        for recipe_id, missing, matched in ranked:
+            if recipe_id in recipes:
+                item = serializers.RecipeSerializers(recipes[recipe_id]).data
+                item['missing'] = missing
+                item['matched'] = matched
+                data.append(item)
+
+        return Response(data)
+
+    @action(methods=['GET'], detail=False)
+    def batch(self, request):
+        '''Retrieve many recipes by ID, in request order.'''
+        params = serializers.RecipeBatchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data['ids']
+
+        recipes = {
+            recipe.id: recipe
+            for recipe in self.get_queryset().filter(id__in=ids)
+        }
+        found = [
+            recipes[recipe_id] for recipe_id in ids if recipe_id in recipes
+        ]
+        serializer = self.get_serializer(found, many=True)
+
+        return Response({
+            'results': serializer.data,
+            'missing': [
+                recipe_id for recipe_id in ids if recipe_id not in recipes
+            ],
+        })
+
 @extend_schema_view(
     list = extend_schema(
         parameters=[
@@ -94,13 +376,18 @@ class RecipeViewSets(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
-                 mixins.ListModelMixin,
-                 mixins.DestroyModelMixin,
-                 viewsets.GenericViewSet):
+class BaseRecipeAttrViewSet(changes.RecordChangesMixin,
+                            UserDataCoalescingMixin,
+                            ReplicaRoutingMixin,
+                            mixins.UpdateModelMixin,
+                            mixins.ListModelMixin,
+                            mixins.DestroyModelMixin,
+                            viewsets.GenericViewSet):
     '''Base viewset for recipe attributes.'''
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = EstimatedCountPagination
+    replica_actions = ('list',)
 
     def get_queryset(self):
         '''Filter query user for authenticated user.'''
@@ -109,19 +396,169 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
+
+        return queryset.filter(
+            user=self.request.user
+        ).order_by('-name').distinct()
+
+    def list(self, request, *args, **kwargs):
+        '''List objects, sharing work with identical concurrent requests.'''
+        return self.coalesce(super().list, request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        '''Delete the object, recording the recipes that lose it.'''
+        changes.record_linked_recipes(type(instance), [instance.pk])
+        instance.delete()
+
+    def get_serializer_class(self):
+        '''Return serializer class for request.'''
+        if self.action == 'bulk_delete':
+            return serializers.BulkDeleteSerializer
+        elif self.action == 'bulk_rename':
+            return serializers.BulkRenameSerializer
+        elif self.action == 'merge':
+            return serializers.MergeSerializer
 
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        return self.serializer_class
+
+    @extend_schema(responses=serializers.BulkDeleteResultSerializer)
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    def bulk_delete(self, request):
+        '''Delete many objects at once.'''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted = bulk.bulk_delete(
+            self.queryset.model, request.user,
+            serializer.validated_data['ids'],
+        )
+
+        return Response({'deleted': deleted})
+
+    @action(methods=['POST'], detail=False, url_path='bulk-rename',
+            pagination_class=None)
+    def bulk_rename(self, request):
+        '''Rename many objects with a single UPDATE.'''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = serializer.validated_data['items']
+        try:
+            bulk.bulk_rename(self.queryset.model, request.user, names)
+        except IntegrityError:
+            raise ValidationError(
+                {'items': ['Names must stay unique per user.']}
+            )
+
+        renamed = self.get_queryset().filter(id__in=names)
+        return Response(self.serializer_class(renamed, many=True).data)
+
+    @action(methods=['POST'], detail=False)
+    def merge(self, request):
+        '''Merge the source objects into the target object.'''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = get_object_or_404(
+            self.get_queryset(), id=serializer.validated_data['target']
+        )
+        bulk.merge(
+            self.queryset.model, request.user, target,
+            serializer.validated_data['sources'],
+        )
+
+        return Response(self.serializer_class(target).data)
 
 
+@extend_schema_view(
+    bulk_rename=extend_schema(
+        responses=serializers.TagSerializers(many=True)
+    ),
+    merge=extend_schema(responses=serializers.TagSerializers),
+)
 class TagViewSet(BaseRecipeAttrViewSet):
     '''Manage tags in the datatbase.'''
     serializer_class = serializers.TagSerializers
     queryset = Tag.objects.all()
 
 
+@extend_schema_view(
+    bulk_rename=extend_schema(
+        responses=serializers.IngredientSerializer(many=True)
+    ),
+    merge=extend_schema(responses=serializers.IngredientSerializer),
+)
 class IngredinetViewSet(BaseRecipeAttrViewSet):
     '''Manage ingredients in the database'''
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
 
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[serializers.SyncQuerySerializer],
+        responses=serializers.SyncResultSerializer,
+    ),
+)
+class SyncView(ReplicaRoutingMixin, APIView):
+    '''List recipe, tag and ingredient changes after a sync cursor.
+
+    Each changed object appears once, at its latest change, with its
+    current data or as a tombstone. Clients pass the returned `cursor` as
+    `since` until `has_more` is false.
+    '''
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    replica_actions = ('get',)
+    kinds = {
+        Change.RECIPE: (
+            Recipe.objects.prefetch_related('tags', 'ingredients'),
+            serializers.SyncRecipeSerializer,
+        ),
+        Change.TAG: (Tag.objects.all(), serializers.SyncTagSerializer),
+        Change.INGREDIENT: (
+            Ingredient.objects.all(), serializers.SyncIngredientSerializer,
+        ),
+    }
+
+    def get(self, request):
+        params = serializers.SyncQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data['since']
+        limit = params.validated_data['limit']
+
+        entries = list(
+            Change.objects.filter(user=request.user, seq__gt=since)
+            .order_by('seq')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        ids_by_kind = {}
+        for entry in entries:
+            if not entry.deleted:
+                ids_by_kind.setdefault(entry.kind, []).append(entry.object_id)
+        data = {}
+        for kind, ids in ids_by_kind.items():
+            queryset, serializer_class = self.kinds[kind]
+            for obj in queryset.filter(user=request.user, id__in=ids):
+                data[kind, obj.id] = serializer_class(
+                    obj, context={'request': request}
+                ).data
+
+        items = []
+        for entry in entries:
+            item = data.get((entry.kind, entry.object_id))
+            items.append({
+                'seq': entry.seq,
+                'type': entry.kind,
+                'id': entry.object_id,
+                # Deleted after the page was read, with its tombstone
+                # still to come.
+                'deleted': item is None,
+                'data': item,
+            })
+
+        return Response({
+            'changes': items,
+            'cursor': entries[-1].seq if entries else since,
+            'has_more': has_more,
+        })
@@ -2,28 +2,46 @@
 Views for user API
 '''
 
+from django.db import transaction
+
 from rest_framework import generics, authentication, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core import purge
+from core.db.replicas import ReplicaRoutingMixin
+
 from user.serializers import (
     UserSerializers,
     AuthTokenSerializer,)
 
+
 class CreateUserView(generics.CreateAPIView):
     '''Create a new user in the system'''
     serializer_class = UserSerializers
 
+
 class CreateTokenView(ObtainAuthToken):
     '''Create a new auth token for user'''
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(ReplicaRoutingMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     '''Manage the authenticated user.'''
     serializer_class = UserSerializers
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
\ No newline at end of file
+        return self.request.user
+
+    def perform_destroy(self, instance):
+        '''Deactivate the account now and purge its data in background.'''
+        with transaction.atomic():
+            instance.is_active = False
+            instance.save(update_fields=['is_active'])
+            Token.objects.filter(user=instance).delete()
+            purge.schedule_user_purge(instance.id)